@@ -3,14 +3,16 @@ import struct
 import time
 import logging
 
-import mysql.connector
-
 from modules.core.sfp_i2c_bus import SFP_I2C_Bus
+from modules.core.sfp_eeprom_cache import SFP_EEPROM_Cache
 
 from modules.network.non_qt_udp_client import UDPSocket, UDPSocketState
 from modules.network.non_qt_tcp_client import TCPSocket, TCPSocketState
 from modules.network.message import Message, MessageCode, ReadRegisterMessage, bytesToReadRegisterMessage, unpackMeasurementMessageBytes, unpackRawBytes
+from modules.network.codec import decode_tagged_frame
+from modules.network.dock_commands import *
 from modules.network.db_utility import *
+from modules.network.clone_journal import CloneJournal, WriteBehindCloneStore
     
 
 
@@ -22,10 +24,13 @@ def main():
     server_ip = None
     server_port = None
 
-    mydb = None
-    mycursor = None
+    # Clones are journaled and copied to the sfp_info database of the
+    # control server in the background, so CLONE_SFP_MEMORY never waits
+    # for the database
+    clone_store = WriteBehindCloneStore(CloneJournal())
+    clone_store.start()
 
-    sfp_bus = SFP_I2C_Bus()
+    sfp_bus = SFP_EEPROM_Cache(SFP_I2C_Bus())
 
     log_fmt = "[%(asctime)s | %(levelname)s]: %(message)s"
     logging.basicConfig(level=logging.DEBUG, format=log_fmt, datefmt="%I:%M:%S")
@@ -74,7 +79,9 @@ def main():
 
         if not my_tcp_socket:
             logging.debug("Creating TCP socket")
-            my_tcp_socket = TCPSocket()
+            # Frames are decoded before the next receive, so the
+            # socket can hand out views of one reused buffer
+            my_tcp_socket = TCPSocket(reuse_buffer=True)
 
         try:
             logging.debug(f'Attempting to connect to {server_ip}:{server_port}')
@@ -99,27 +106,18 @@ def main():
             logging.debug('Awaiting TCP commands...')
             try:
                 raw_msg = my_tcp_socket.myreceive()
-                
-
-                msg_code_int, *garbage = struct.unpack("!H254x", raw_msg)
-                code = MessageCode(msg_code_int)
 
-                register_read_cmds = [MessageCode.REAL_TIME_REFRESH, MessageCode.DIAGNOSTIC_INIT_A0, MessageCode.DIAGNOSTIC_INIT_A2]
-
-                if code in register_read_cmds:
-                    received_cmd: ReadRegisterMessage = bytesToReadRegisterMessage(raw_msg)
-                else:
-                    received_cmd: Message = unpackRawBytes(raw_msg)
+                # Register read commands decode to a ReadRegisterMessage,
+                # everything else to a plain Message. Responses to tagged
+                # requests carry the same correlation id.
+                correlation_id, received_cmd = decode_tagged_frame(raw_msg)
 
                 if received_cmd.code == MessageCode.IDENTIFY_DEVICE:
                     logging.debug("Responding to identification request")
-                    msg = Message(MessageCode.DOCK_DISCOVER_ACK, "Docking Station")
-                    my_tcp_socket.mysend(msg.to_network_message())
+                    my_tcp_socket.mysend(tagged_response(identify_response(), correlation_id))
                 if received_cmd.code == MessageCode.CLONE_SFP_MEMORY:
-                    logging.debug('Trying to read SFP memory!')
                     try:
-                        a0_dump = sfp_bus.dumpA0()
-                        a2_dump = sfp_bus.dumpA2()
+                        a0_dump, a2_dump = clone_sfp_memory(sfp_bus)
 
                         #logging.debug("Page 0xA0")
                         #print_bus_dump(a0_dump, False)
@@ -128,53 +126,17 @@ def main():
                         #print_bus_dump(a2_dump, False)
                         #print_bus_dump(a2_dump, True)
                         
-                        try:
-                            mydb = mysql.connector.connect(
-                                host=server_ip,
-                                user="connor",
-                                password="cloudplug!@#@!",
-                                database="sfp_info",
-                                autocommit=True
-                            )
-
-                            mycursor = mydb.cursor()         
-                            insert_cloned_memory_to_database(mycursor, a0_dump, a2_dump)
-                            code = MessageCode.CLONE_SFP_MEMORY_SUCCESS
-                            data = "Successfully cloned SFP memory"
-                            msg = Message(code, data)
-
-                            my_tcp_socket.mysend(msg.to_network_message())
-
-                        except Exception as ex:
-                            logging.debug(ex)
+                        clone_store.store(server_ip, a0_dump, a2_dump)
+                        logging.debug(f'Clone journal: {clone_store.stats()}')
+                        my_tcp_socket.mysend(tagged_response(clone_success_response(), correlation_id))
                     
                     except Exception as ex:
-                        code = MessageCode.CLONE_SFP_MEMORY_ERROR
-                        data = "Error communicating with SFP"
-                        msg = Message(code, data)
-                        my_tcp_socket.mysend(msg.to_network_message())
+                        my_tcp_socket.mysend(tagged_response(clone_error_response(), correlation_id))
                         logging.debug(ex)
-                elif received_cmd.code in register_read_cmds:
-
-                    response_vals = []
-                    try:
-                        
-                        response_vals = sfp_bus.read_registers_from_page(received_cmd.register_numbers, received_cmd.page_number)
-
-                        if received_cmd.code == MessageCode.REAL_TIME_REFRESH:
-                            msg_code = MessageCode.REAL_TIME_REFRESH_ACK
-                        elif received_cmd.code == MessageCode.DIAGNOSTIC_INIT_A0:
-                            msg_code = MessageCode.DIAGNOSTIC_INIT_A0_ACK
-                        elif received_cmd.code == MessageCode.DIAGNOSTIC_INIT_A2:
-                            msg_code = MessageCode.DIAGNOSTIC_INIT_A2_ACK
-
-                        msg_response = ReadRegisterMessage(msg_code, "", received_cmd.page_number, response_vals)
-                        my_tcp_socket.mysend(msg_response.to_network_message())
-                        
-                    except Exception as ex:
-                            # Send I2C error code
-                        msg = Message(MessageCode.I2C_ERROR, "Remote I/O error when reading SFP")
-                        my_tcp_socket.mysend(msg.to_network_message())
+                elif received_cmd.code in REGISTER_READ_ACKS:
+                    my_tcp_socket.mysend(tagged_response(read_registers_response(sfp_bus, received_cmd), correlation_id))
+                elif received_cmd.code == MessageCode.READ_DDM_FLAGS:
+                    my_tcp_socket.mysend(tagged_response(read_ddm_flags_response(sfp_bus), correlation_id))
 
 
                 #time.sleep(0.3)
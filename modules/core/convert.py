@@ -1,15 +1,94 @@
 # Author:       Connor DeCamp
 # Created on:   7/29/2021
 #
-# History:      7/29/2021 - Added byte conversions 
+# History:      7/29/2021 - Added byte conversions
 #               9/09/2021 - Fixed type error in ieee754_to_int()
+#               10/18/2026 - Added fast float backend, Decimal kept as exact mode
+#               10/18/2026 - Added lookup tables for the 16 bit conversions
+#               10/18/2026 - Lookup tables off by default, they cost 640 KB
 #
 # See SFF-8472 for tables that determine what each
 # value means in the memory map.
+#
+# Every conversion has two backends. The default fast backend uses
+# struct, integer shifts and float arithmetic and returns floats/ints.
+# The exact backend is the original Decimal bit-string code, turn it on
+# with set_exact_mode(True) when auditing a module's values.
+#
+# With set_lookup_tables(True) the fast backend answers the two 16 bit
+# conversions from lookup tables holding all 65,536 results. They are
+# built on first use and take about 640 KB (see lookup_table_memory()).
+# They measure no faster than the arithmetic (see the timings of
+# __main__), so they are off by default.
 
+from array import array
 from decimal import *
+import struct
+
+_FLOAT32 = struct.Struct('>f')
+
+_exact_mode = False
+
+_tables_enabled = False
+_unsigned_fixed_table = None
+_twos_complement_table = None
+
+def set_exact_mode(enabled: bool) -> None:
+    '''
+    Selects the exact Decimal backend (True) or the fast float
+    backend (False, the default) for every conversion in this module.
+    '''
+    global _exact_mode
+    _exact_mode = enabled
+
+def is_exact_mode() -> bool:
+    return _exact_mode
 
-def ieee754_to_int(b3: int, b2: int, b1: int, b0: int) -> int:
+def set_lookup_tables(enabled: bool) -> None:
+    '''
+    Turns the 16 bit lookup tables on or off. Turning them off frees
+    the memory of tables that were already built.
+    '''
+    global _tables_enabled, _unsigned_fixed_table, _twos_complement_table
+    _tables_enabled = enabled
+
+    if not enabled:
+        _unsigned_fixed_table = None
+        _twos_complement_table = None
+
+def lookup_table_memory() -> int:
+    '''
+    Returns the number of bytes currently used by built lookup tables.
+    '''
+    total = 0
+
+    for table in (_unsigned_fixed_table, _twos_complement_table):
+        if table is not None:
+            total += table.itemsize * len(table)
+
+    return total
+
+def _unsigned_fixed_lookup() -> array:
+    global _unsigned_fixed_table
+
+    if _unsigned_fixed_table is None:
+        _unsigned_fixed_table = array('d', [word / 256 for word in range(0x10000)])
+
+    return _unsigned_fixed_table
+
+def _twos_complement_lookup() -> array:
+    global _twos_complement_table
+
+    if _twos_complement_table is None:
+        # Reinterpreting the unsigned words as signed ones is exactly
+        # the two's complement conversion
+        table = array('h')
+        table.frombytes(array('H', range(0x10000)).tobytes())
+        _twos_complement_table = table
+
+    return _twos_complement_table
+
+def ieee754_to_int(b3: int, b2: int, b1: int, b0: int) -> float:
     '''
     Takes 4 bytes in IEEE 754 floating point format and converts it into a floating point
     number as per the IEEE 754 specification. The MSB (bit 31) is the sign bit,
@@ -18,13 +97,67 @@ def ieee754_to_int(b3: int, b2: int, b1: int, b0: int) -> int:
     S = sign
     E = Exponent
     M = Mantissa
-    
+
     (Byte, Contents, Significance)\n
     (b3,     SEEEEEEE,       most)\n
     (b2,     EMMMMMMM,    second most)\n
     (b1,     MMMMMMMM,    second least)\n
     (b0,     MMMMMMMM,       least)\n
+
+    Returns a float, or a Decimal in exact mode.
+    '''
+    if _exact_mode:
+        return _ieee754_to_decimal(b3, b2, b1, b0)
+
+    return _FLOAT32.unpack(bytes((b3, b2, b1, b0)))[0]
+
+def bytes_to_unsigned_decimal(b1: int, b0: int) -> float:
+    '''
+    Takes in 2 bytes, formatted as b1.b0 and returns the
+    unsigned decimal equivalent. For example:
+        b1 = 1111 1111
+        b0 = 1111 1111
+
+    Number it represents is 1111 1111.1111 1111
+    which is 255 + (255) / 256
+
+    Returns a float (exact, 8 fractional bits always fit), or a
+    Decimal in exact mode.
     '''
+    if _exact_mode:
+        return _bytes_to_unsigned_decimal_exact(b1, b0)
+
+    if _tables_enabled:
+        table = _unsigned_fixed_table or _unsigned_fixed_lookup()
+        return table[b1 << 8 | b0]
+
+    return b1 + b0 / 256
+
+def signed_twos_complement_to_int(b1: int, b0: int) -> int:
+    '''
+    Takes two bytes (b1, b0) and converts it from signed two's complement
+    into an integer.
+    '''
+    if _exact_mode:
+        return _signed_twos_complement_exact(b1, b0)
+
+    if _tables_enabled:
+        table = _twos_complement_table or _twos_complement_lookup()
+        return table[b1 << 8 | b0]
+
+    val = (b1 << 8) | b0
+
+    if val & 0x8000:
+        val -= 0x10000
+
+    return val
+
+#######################################
+#######    Exact (Decimal)    #########
+#######       backend         #########
+#######################################
+
+def _ieee754_to_decimal(b3: int, b2: int, b1: int, b0: int) -> Decimal:
 
     # Put bytes into array to make it easier to
     # convert into binary string
@@ -34,30 +167,36 @@ def ieee754_to_int(b3: int, b2: int, b1: int, b0: int) -> int:
         s += format(b, '08b')        # Format each number in binary
 
     sign = int(s[0:1])               # Sign is the first bit
-    exponent = int(s[1:9], 2) - 127  # Exponent is the next 8 bits, subtract 127 to unbias it
+    exponent_bits = int(s[1:9], 2)   # Exponent is the next 8 bits
     mantissa_str = s[9:32]           # Mantissa (fraction) is the rest of the number (1.M)
-    mantissa_int = Decimal('1')      # Begin converting mantissa bits into fraction
+
+    # All ones in the exponent encode infinity (M = 0) and NaN
+    if exponent_bits == 0xFF:
+        if int(mantissa_str, 2):
+            return Decimal('NaN')
+        return Decimal('-Infinity') if sign else Decimal('Infinity')
+
+    if exponent_bits == 0:
+        # Zero and subnormal numbers have no implicit leading 1
+        # and use the smallest exponent, 0.M * 2^(-126)
+        exponent = -126
+        mantissa_int = Decimal('0')
+    else:
+        exponent = exponent_bits - 127   # Subtract 127 to unbias it
+        mantissa_int = Decimal('1')      # Begin converting mantissa bits into fraction
+
     power = -1                       # We need 1.M, so first power is 2^(-1) * bit and decreases from there
 
     for bit in mantissa_str:
         mantissa_int += Decimal(str(int(bit) * (2 ** power)))
         power -= 1
-    
+
 
     result = Decimal(pow(-1, int(sign))) * Decimal(pow(2, exponent)) * mantissa_int # (-1)^sign * 2^(exponent) * 1.M
-    
-    return result
 
-def bytes_to_unsigned_decimal(b1: int, b0: int) -> Decimal:
-    '''
-    Takes in 2 bytes, formatted as b1.b0 and returns the
-    unsigned decimal equivalent. For example:
-        b1 = 1111 1111
-        b0 = 1111 1111
+    return result
 
-    Number it represents is 1111 1111.1111 1111
-    which is 255 + (255) / 256
-    '''
+def _bytes_to_unsigned_decimal_exact(b1: int, b0: int) -> Decimal:
 
     integer = Decimal(str(b1))
     mantissa_str = format(b0, '08b')
@@ -70,11 +209,7 @@ def bytes_to_unsigned_decimal(b1: int, b0: int) -> Decimal:
 
     return Decimal(str(integer + mantissa_int))
 
-def signed_twos_complement_to_int(b1: int, b0: int) -> int:
-    '''
-    Takes two bytes (b1, b0) and converts it from signed two's complement
-    into an integer.
-    '''
+def _signed_twos_complement_exact(b1: int, b0: int) -> int:
 
     bit_string = format(b1, '08b') + format(b0, '08b')
     bits = len(bit_string)
@@ -82,5 +217,78 @@ def signed_twos_complement_to_int(b1: int, b0: int) -> int:
 
     if (val & (1 << (bits - 1))) != 0:
         val = val - (1 << bits)
-    
-    return val
\ No newline at end of file
+
+    return val
+
+def verify_backends(float_samples: int = 100000, seed: int = 0) -> None:
+    '''
+    Checks that the fast and exact backends agree on all 2^16 fixed
+    point and two's complement inputs (with and without the lookup
+    tables), the IEEE 754 special values and
+    float_samples random float bit patterns. Raises AssertionError on
+    the first mismatch.
+    '''
+    import math
+    import random
+
+    global _exact_mode
+    saved_mode = _exact_mode
+    saved_tables = _tables_enabled
+
+    def both(func, *args):
+        global _exact_mode
+        _exact_mode = False
+        fast = func(*args)
+        _exact_mode = True
+        exact = func(*args)
+        return fast, exact
+
+    try:
+        # Once through the lookup tables and once through the arithmetic
+        for tables in (True, False):
+            set_lookup_tables(tables)
+
+            for b1 in range(256):
+                for b0 in range(256):
+                    fast, exact = both(bytes_to_unsigned_decimal, b1, b0)
+                    assert fast == exact, f'bytes_to_unsigned_decimal({b1}, {b0}): {fast} != {exact}'
+
+                    fast, exact = both(signed_twos_complement_to_int, b1, b0)
+                    assert fast == exact, f'signed_twos_complement_to_int({b1}, {b0}): {fast} != {exact}'
+
+        rng = random.Random(seed)
+        patterns = [0x00000000, 0x80000000, 0x00000001, 0x807FFFFF, 0x00800000,
+                    0x7F7FFFFF, 0x7F800000, 0xFF800000, 0x7FC00000, 0x3F800000]
+        patterns += [rng.getrandbits(32) for _ in range(float_samples)]
+
+        for bits in patterns:
+            fast, exact = both(ieee754_to_int, *bits.to_bytes(4, 'big'))
+
+            if math.isnan(fast):
+                assert exact.is_nan(), f'ieee754_to_int({bits:#010x}): {fast} != {exact}'
+            else:
+                assert fast == float(exact), f'ieee754_to_int({bits:#010x}): {fast} != {exact}'
+    finally:
+        _exact_mode = saved_mode
+        set_lookup_tables(saved_tables)
+
+if __name__ == '__main__':
+    import timeit
+
+    verify_backends()
+    print('Fast and exact conversion backends agree')
+
+    for func in (bytes_to_unsigned_decimal, signed_twos_complement_to_int):
+        timings = []
+
+        for tables in (True, False):
+            set_lookup_tables(tables)
+            func(0xC8, 0x21)
+            timings.append(timeit.timeit(lambda: func(0xC8, 0x21), number=1000000))
+
+        print(f'{func.__name__}: {timings[0]:.3f} s with tables, {timings[1]:.3f} s without (1M calls)')
+
+    set_lookup_tables(True)
+    bytes_to_unsigned_decimal(0, 0)
+    signed_twos_complement_to_int(0, 0)
+    print(f'Lookup tables use {lookup_table_memory()} bytes')
@@ -0,0 +1,242 @@
+# Alarm and warning evaluation of the real time DDM values against the
+# thresholds of page 0xA2.
+#
+# The thresholds (bytes 0-39) are decoded once per module into plain
+# integers in the units of the A/D words (bytes 96-105), so every sample
+# is evaluated with integer comparisons only. This holds for internally
+# and externally calibrated modules alike: both store thresholds in the
+# units of their A/D values, and calibration is monotonic.
+#
+# Each channel has four conditions (high/low alarm, high/low warning).
+# A condition is raised when the value is past its threshold and cleared
+# once the value is back inside by more than the channel's hysteresis.
+# Temperature, Vcc and TX bias use a fixed band in raw units. The power
+# words are linear in mW, so TX and RX power use a band relative to the
+# threshold (in dB) to behave the same at -20 dBm and at 0 dBm.
+# Either change only happens after debounce consecutive samples agree,
+# so a value flickering around a threshold yields no events.
+#
+# The state is kept as two 16 bit sets laid out like the flag bytes of
+# page 0xA2 (112-113 alarms, 116-117 warnings): temperature high is bit
+# 15, temperature low bit 14, then Vcc, TX bias, TX power and RX power.
+
+from typing import List, NamedTuple, Sequence, Tuple
+
+from modules.core.telemetry_ring import CHANNELS, SIGNED, words_from_registers
+
+# Page 0xA2 bytes holding the thresholds of the five channels
+THRESHOLD_REGISTERS = list(range(0, 4 * 2 * len(CHANNELS)))
+
+LEVELS = ('high_alarm', 'low_alarm', 'high_warning', 'low_warning')
+
+# Channels whose hysteresis is relative to the threshold
+POWER_CHANNELS = (CHANNELS.index('tx_power'), CHANNELS.index('rx_power'))
+
+# Temperature, Vcc and TX bias in raw units: 1/256 C, 100 uV, 2 uA. So
+# 1 C, 10 mV and 1 mA.
+DEFAULT_HYSTERESIS = (256, 100, 500)
+
+DEFAULT_POWER_HYSTERESIS_DB = 0.5
+
+DEFAULT_DEBOUNCE = 3
+
+
+class AlarmEvent(NamedTuple):
+    timestamp_ms: int
+    channel: int        # index into CHANNELS
+    level: int          # index into LEVELS
+    raised: bool
+    value: int          # raw word of the sample that made the change
+    threshold: int
+    alarms: int         # alarm and warning sets after the change
+    warnings: int
+
+
+def _signed(word: int) -> int:
+    return word - 0x10000 if word & 0x8000 else word
+
+def flag_bit(channel: int, level: int) -> int:
+    '''
+    Bit of a condition in the alarm or warning set.
+    '''
+    return 1 << (15 - 2 * channel - (level & 1))
+
+def thresholds_from_registers(values: Sequence[int]) -> Tuple[Tuple[int, int, int, int], ...]:
+    '''
+    Decodes bytes 0-39 of page 0xA2 into (high alarm, low alarm, high
+    warning, low warning) per channel, as raw integers.
+    '''
+    if len(values) < len(THRESHOLD_REGISTERS):
+        raise ValueError(f"Expected {len(THRESHOLD_REGISTERS)} threshold bytes, got {len(values)}")
+
+    thresholds = []
+
+    for channel, signed in enumerate(SIGNED):
+        words = [values[8 * channel + idx] << 8 | values[8 * channel + idx + 1] for idx in range(0, 8, 2)]
+        thresholds.append(tuple(_signed(word) if signed else word for word in words))
+
+    return tuple(thresholds)
+
+
+class AlarmEngine:
+
+    def __init__(self, hysteresis: Sequence[int] = DEFAULT_HYSTERESIS, debounce: int = DEFAULT_DEBOUNCE,
+                 power_hysteresis_db: float = DEFAULT_POWER_HYSTERESIS_DB):
+        '''
+        hysteresis holds the raw band of each channel but TX and RX
+        power, power_hysteresis_db is the band of those two.
+        '''
+        linear_channels = len(CHANNELS) - len(POWER_CHANNELS)
+
+        if len(hysteresis) != linear_channels:
+            raise ValueError(f"Expected a hysteresis for each of the {linear_channels} channels other than power")
+
+        self.hysteresis = tuple(hysteresis)
+        self.power_hysteresis_db = power_hysteresis_db
+        self.debounce = max(debounce, 1)
+
+        self.thresholds = None
+        self.alarms = 0
+        self.warnings = 0
+
+        # One entry per condition: (channel, level, bit, is high,
+        # threshold, value the condition clears past), and per condition
+        # whether it is active and how many samples in a row asked to
+        # change it
+        self._conditions: List[tuple] = []
+        self._active: List[bool] = []
+        self._streak: List[int] = []
+
+    @property
+    def has_thresholds(self) -> bool:
+        return self.thresholds is not None
+
+    def set_thresholds(self, register_values: Sequence[int]) -> None:
+        '''
+        Loads the thresholds from bytes 0-39 of page 0xA2 (a page dump
+        works too) and resets the state.
+        '''
+        self.thresholds = thresholds_from_registers(register_values)
+        self._conditions = []
+
+        ratio = 10 ** (self.power_hysteresis_db / 10)
+        bands = iter(self.hysteresis)
+
+        for channel in range(len(CHANNELS)):
+            band = None if channel in POWER_CHANNELS else next(bands)
+
+            for level in range(len(LEVELS)):
+                is_high = not level & 1
+                threshold = self.thresholds[channel][level]
+
+                if band is None:
+                    clear = threshold / ratio if is_high else threshold * ratio
+                else:
+                    clear = threshold - band if is_high else threshold + band
+
+                self._conditions.append((channel, level, flag_bit(channel, level), is_high, threshold, clear))
+
+        self._active = [False] * len(self._conditions)
+        self._streak = [0] * len(self._conditions)
+        self.alarms = 0
+        self.warnings = 0
+
+    def clear_thresholds(self) -> None:
+        '''
+        Forgets the module, e.g. when it was pulled.
+        '''
+        self.thresholds = None
+        self._conditions = []
+        self.alarms = 0
+        self.warnings = 0
+
+    def evaluate(self, timestamp_ms: int, words: Sequence[int]) -> List[AlarmEvent]:
+        '''
+        Evaluates one sample of the five raw words and returns the
+        conditions it raised or cleared.
+        '''
+        events = []
+
+        if self.thresholds is None:
+            return events
+
+        values = [_signed(word) if signed else word for word, signed in zip(words, SIGNED)]
+        active = self._active
+        streak = self._streak
+
+        for idx, (channel, level, bit, is_high, threshold, clear) in enumerate(self._conditions):
+            value = values[channel]
+
+            if active[idx]:
+                change = value < clear if is_high else value > clear
+            else:
+                change = value > threshold if is_high else value < threshold
+
+            if not change:
+                streak[idx] = 0
+                continue
+
+            streak[idx] += 1
+            if streak[idx] < self.debounce:
+                continue
+
+            streak[idx] = 0
+            active[idx] = not active[idx]
+
+            if level < 2:
+                self.alarms ^= bit
+            else:
+                self.warnings ^= bit
+
+            events.append(AlarmEvent(timestamp_ms, channel, level, active[idx], words[channel], threshold,
+                                     self.alarms, self.warnings))
+
+        return events
+
+
+if __name__ == '__main__':
+    import time
+
+    from modules.core.sfp import SFP
+
+    with open('a0.txt') as file:
+        a0 = [int(val) for val in file.readline().split(',')]
+    with open('a2.txt') as file:
+        a2 = [int(val) for val in file.readline().split(',')]
+
+    engine = AlarmEngine()
+    engine.set_thresholds(a2)
+    high_alarm = engine.thresholds[0][0]
+
+    # Temperature ramping through its high alarm and back, with noise
+    temperatures = [high_alarm - 2048 + step * 64 + (step % 2) * 80 for step in range(64)]
+    temperatures += temperatures[::-1]
+    live = words_from_registers(a2[96:106])
+    samples = [(temperature & 0xFFFF,) + live[1:] for temperature in temperatures]
+
+    for step, sample in enumerate(samples):
+        for event in engine.evaluate(step, sample):
+            print(f'{step:3d}: {CHANNELS[event.channel]} {LEVELS[event.level]} '
+                  f'{"raised" if event.raised else "cleared"} at {event.value} (threshold {event.threshold}), '
+                  f'alarms {event.alarms:04x} warnings {event.warnings:04x}')
+
+    count = 100000
+    start = time.perf_counter()
+    for step in range(count):
+        engine.evaluate(step, samples[step % len(samples)])
+    engine_time = (time.perf_counter() - start) / count
+
+    # Converting to physical units and comparing with the SFP getters
+    sfp = SFP(a0, a2)
+    start = time.perf_counter()
+    for step in range(count // 100):
+        temperature = sfp.get_temperature()
+        vcc = sfp.get_vcc()
+        bias = sfp.get_tx_bias_current()
+        tx_power = sfp.get_tx_power()
+        [temperature > sfp.get_temp_high_alarm(), vcc > sfp.get_voltage_high_alarm(),
+         bias > sfp.get_bias_high_alarm(), tx_power > sfp.get_tx_power_high_alarm()]
+    getter_time = (time.perf_counter() - start) / (count // 100)
+
+    print(f'Engine {engine_time * 1e6:.1f} us per sample, 20 conditions; '
+          f'SFP getters {getter_time * 1e6:.1f} us for 4 conditions')
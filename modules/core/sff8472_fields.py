@@ -0,0 +1,204 @@
+# Declarative map of the SFF-8472 fields read by the SFP getters, and a
+# compiler that turns the fields of a page into a single struct.Struct.
+#
+# Each Field names a byte range of page 0xA0 or 0xA2 and its type:
+#
+#   u8, u16, s16    unsigned/signed big endian integers
+#   fixed8.8        unsigned fixed point, as bytes_to_unsigned_decimal()
+#   float32         IEEE 754 single precision, as ieee754_to_int()
+#   ascii           string, one character per byte
+#   bytes           list of the raw byte values
+#   bitflags        integer holding all bytes of the field, first byte
+#                   most significant
+#   enum            code byte, the getter looks it up in sff8472_tables
+#
+# PageDecoder packs the fields of a page (with pad bytes for the gaps)
+# into one struct format, so a whole page decodes with one unpack_from()
+# call. fixed8.8 and float32 fields go through convert.py, so they follow
+# its exact mode.
+#
+# The real time A/D values (0xA2 bytes 96-105) change on every refresh
+# and are not part of the map, SFP reads them directly.
+
+import struct
+from typing import Dict, List, NamedTuple, Sequence
+
+from modules.core.convert import bytes_to_unsigned_decimal, ieee754_to_int
+
+
+class Field(NamedTuple):
+    name: str
+    page: int
+    offset: int
+    length: int
+    type: str
+
+
+def _fixed(value: int):
+    return bytes_to_unsigned_decimal(value >> 8, value & 0xFF)
+
+def _float32(value: int):
+    return ieee754_to_int(value >> 24, value >> 16 & 0xFF, value >> 8 & 0xFF, value & 0xFF)
+
+def _ascii(value: bytes) -> str:
+    # latin-1 maps every byte to the character of the same code, like chr()
+    return value.decode('latin-1')
+
+_BITFLAG_FORMATS = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+# Fixed size types: struct code, length, converter (None = as unpacked)
+_FIXED_TYPES = {
+    'u8':       ('B', 1, None),
+    'enum':     ('B', 1, None),
+    'u16':      ('H', 2, None),
+    's16':      ('h', 2, None),
+    'fixed8.8': ('H', 2, _fixed),
+    'float32':  ('I', 4, _float32),
+}
+
+# Alarm and warning thresholds of page 0xA2, bytes 0-55, in memory order.
+# Each is an uncalibrated 16 bit value, the SFP getter is get_<name>().
+THRESHOLD_FIELDS = [
+    f'{quantity}_{level}'
+    for quantity in ('temp', 'voltage', 'bias', 'tx_power', 'rx_power',
+                     'optional_laser_temp', 'optional_tec_current')
+    for level in ('high_alarm', 'low_alarm', 'high_warning', 'low_warning')
+]
+
+FIELD_MAP: List[Field] = [
+    # Page 0xA0, serial ID (Table 4-1)
+    Field('identifier',                 0xA0, 0,   1,   'enum'),
+    Field('ext_identifier',             0xA0, 1,   1,   'enum'),
+    Field('connector_type',             0xA0, 2,   1,   'enum'),
+    Field('transceiver_info',           0xA0, 3,   8,   'bitflags'),
+    Field('encoding',                   0xA0, 11,  1,   'enum'),
+    Field('signaling_rate_nominal',     0xA0, 12,  1,   'u8'),
+    Field('rate_identifier',            0xA0, 13,  1,   'enum'),
+    Field('smf_link_length',            0xA0, 15,  1,   'u8'),
+    Field('om2_link_length',            0xA0, 16,  1,   'u8'),
+    Field('om1_link_length',            0xA0, 17,  1,   'u8'),
+    Field('om4_link_length',            0xA0, 18,  1,   'u8'),
+    Field('om3_link_length',            0xA0, 19,  1,   'u8'),
+    Field('vendor_name',                0xA0, 20,  16,  'ascii'),
+    Field('transceiver2',               0xA0, 36,  1,   'enum'),
+    Field('vendor_oui',                 0xA0, 37,  3,   'bytes'),
+    Field('vendor_part_number',         0xA0, 40,  16,  'ascii'),
+    Field('vendor_revision_level',      0xA0, 56,  4,   'ascii'),
+    Field('wavelength',                 0xA0, 60,  2,   'u16'),
+    Field('fibre_channel_speed2',       0xA0, 62,  1,   'u8'),
+    Field('cc_base',                    0xA0, 63,  1,   'u8'),
+    Field('optional_tr_signals',        0xA0, 64,  2,   'bitflags'),
+    Field('max_signaling_rate_margin',  0xA0, 66,  1,   'u8'),
+    Field('min_signaling_rate_margin',  0xA0, 67,  1,   'u8'),
+    Field('vendor_serial_number',       0xA0, 68,  16,  'bytes'),
+    Field('vendor_date_code',           0xA0, 84,  8,   'bytes'),
+    Field('diagnostic_monitoring_type', 0xA0, 92,  1,   'bitflags'),
+    Field('enhanced_options',           0xA0, 93,  1,   'bitflags'),
+    Field('sff_8472_compliance',        0xA0, 94,  1,   'enum'),
+    Field('cc_ext',                     0xA0, 95,  1,   'u8'),
+    Field('vendor_eeprom',              0xA0, 96,  32,  'bytes'),
+    Field('reserved_fields',            0xA0, 128, 128, 'bytes'),
+] + [
+    # Page 0xA2, alarm and warning thresholds (Table 9-5)
+    Field(name, 0xA2, 2 * idx, 2, 'u16') for idx, name in enumerate(THRESHOLD_FIELDS)
+] + [
+    # Page 0xA2, calibration constants (Table 9-6)
+    Field('rx_pwr_4',                   0xA2, 56,  4,   'float32'),
+    Field('rx_pwr_3',                   0xA2, 60,  4,   'float32'),
+    Field('rx_pwr_2',                   0xA2, 64,  4,   'float32'),
+    Field('rx_pwr_1',                   0xA2, 68,  4,   'float32'),
+    Field('rx_pwr_0',                   0xA2, 72,  4,   'float32'),
+    Field('tx_i_slope',                 0xA2, 76,  2,   'fixed8.8'),
+    Field('tx_i_offset',                0xA2, 78,  2,   's16'),
+    Field('tx_pwr_slope',               0xA2, 80,  2,   'fixed8.8'),
+    Field('tx_pwr_offset',              0xA2, 82,  2,   's16'),
+    Field('temp_slope',                 0xA2, 84,  2,   'fixed8.8'),
+    Field('temp_offset',                0xA2, 86,  2,   's16'),
+    Field('voltage_slope',              0xA2, 88,  2,   'fixed8.8'),
+    Field('voltage_offset',             0xA2, 90,  2,   's16'),
+    Field('reserved_a2_bytes',          0xA2, 92,  3,   'bytes'),
+    Field('pagea2_checksum',            0xA2, 95,  1,   'u8'),
+]
+
+
+class PageDecoder:
+    '''
+    Decodes every field of one page with a single struct unpack.
+    '''
+
+    def __init__(self, fields: Sequence[Field], page_size: int = 256):
+        fields = sorted(fields, key=lambda field: field.offset)
+
+        fmt = '>'
+        position = 0
+        self.names = []
+        self.converters = []
+
+        for field in fields:
+            if field.offset < position:
+                raise ValueError(f"Field {field.name} overlaps the field before it")
+
+            if field.type in _FIXED_TYPES:
+                code, length, converter = _FIXED_TYPES[field.type]
+                if field.length != length:
+                    raise ValueError(f"Field {field.name} of type {field.type} must be {length} bytes")
+            elif field.type == 'bitflags':
+                if field.length not in _BITFLAG_FORMATS:
+                    raise ValueError(f"Field {field.name} has no integer type of {field.length} bytes")
+                code, converter = _BITFLAG_FORMATS[field.length], None
+            elif field.type == 'ascii':
+                code, converter = f'{field.length}s', _ascii
+            elif field.type == 'bytes':
+                code, converter = f'{field.length}s', list
+            else:
+                raise ValueError(f"Field {field.name} has unknown type {field.type}")
+
+            if field.offset > position:
+                fmt += f'{field.offset - position}x'
+
+            fmt += code
+            position = field.offset + field.length
+
+            if converter is not None:
+                self.converters.append((field.name, converter))
+            self.names.append(field.name)
+
+        if position > page_size:
+            raise ValueError(f"Fields end at byte {position}, past the end of the page")
+
+        # Bytes 0 to size - 1 hold every field, the rest of the page is
+        # never looked at
+        self.size = position
+        self.struct = struct.Struct(fmt)
+
+    def decode(self, page) -> Dict[str, object]:
+        '''
+        Returns a dict from field name to decoded value. page is a
+        list of byte values or any bytes-like object.
+        '''
+        if isinstance(page, list):
+            page = bytes(page)
+
+        values = dict(zip(self.names, self.struct.unpack_from(page)))
+
+        for name, converter in self.converters:
+            values[name] = converter(values[name])
+
+        return values
+
+
+def compile_field_map(fields: Sequence[Field] = FIELD_MAP) -> Dict[int, PageDecoder]:
+    '''
+    Returns a PageDecoder for every page the fields are on, keyed by
+    page number.
+    '''
+    pages = {}
+
+    for field in fields:
+        pages.setdefault(field.page, []).append(field)
+
+    return {page: PageDecoder(page_fields) for page, page_fields in pages.items()}
+
+
+# Decoders of the standard map, used by SFP
+PAGE_DECODERS = compile_field_map()
@@ -0,0 +1,109 @@
+# Decoding of the status/control byte and the alarm and warning flags
+# of page 0xA2.
+#
+# SFF-8472 modules with DDM compare their own A/D readings against
+# their thresholds and latch the result in bytes 112-113 (alarms) and
+# 116-117 (warnings), next to the status/control byte 110 (TX fault,
+# RX LOS, data ready, ...). Bytes 110-117 are one 8 byte block read, so
+# polling them is far cheaper than reading and converting the five
+# measurements, and only a change in them calls for a full DDM read.
+#
+# The flags are decoded into one integer:
+#
+#   bits 32-39  byte 110, status/control
+#   bits 16-31  bytes 112-113, alarms
+#   bits  0-15  bytes 116-117, warnings
+#
+# The alarm and warning words are laid out like the sets of
+# ddm_alarms.py: temperature high is bit 15, temperature low bit 14,
+# then Vcc, TX bias, TX power, RX power, and the optional laser
+# temperature and TEC current flags. Bytes 111 and 114-115 are not
+# flags and are left out, so they never look like a change.
+
+from typing import List, Sequence
+
+# First register and length of the flag block of page 0xA2
+FLAG_START = 110
+FLAG_LENGTH = 8
+FLAG_REGISTERS = list(range(FLAG_START, FLAG_START + FLAG_LENGTH))
+
+STATUS_SHIFT = 32
+ALARM_SHIFT = 16
+WARNING_SHIFT = 0
+
+# Byte 110, bit 7 first
+STATUS_BITS = ('tx_disable_state', 'soft_tx_disable', 'rs1_state', 'rate_select_state',
+               'soft_rate_select', 'tx_fault', 'rx_los', 'data_not_ready')
+
+# Alarm and warning words, bit 15 first. Bits 1 and 0 are reserved.
+FLAG_BITS = ('temp_high', 'temp_low', 'vcc_high', 'vcc_low', 'tx_bias_high', 'tx_bias_low',
+             'tx_power_high', 'tx_power_low', 'rx_power_high', 'rx_power_low',
+             'laser_temp_high', 'laser_temp_low', 'tec_current_high', 'tec_current_low')
+
+
+def decode_flags(values: Sequence[int]) -> int:
+    '''
+    Decodes bytes 110-117 of page 0xA2 (the FLAG_LENGTH values of a
+    flag block read, or a whole page) into the flag integer.
+    '''
+    if len(values) == 256:
+        values = values[FLAG_START:FLAG_START + FLAG_LENGTH]
+    elif len(values) < FLAG_LENGTH:
+        raise ValueError(f"Expected {FLAG_LENGTH} flag bytes, got {len(values)}")
+
+    return (values[0] << STATUS_SHIFT
+            | values[2] << ALARM_SHIFT + 8 | values[3] << ALARM_SHIFT
+            | values[6] << WARNING_SHIFT + 8 | values[7] << WARNING_SHIFT)
+
+def status_byte(flags: int) -> int:
+    return flags >> STATUS_SHIFT & 0xFF
+
+def alarm_word(flags: int) -> int:
+    return flags >> ALARM_SHIFT & 0xFFFF
+
+def warning_word(flags: int) -> int:
+    return flags >> WARNING_SHIFT & 0xFFFF
+
+def flag_names(flags: int) -> List[str]:
+    '''
+    Names of the set status bits, alarms and warnings, e.g. 'rx_los',
+    'temp_high_alarm', 'vcc_low_warning'.
+    '''
+    names = [name for bit, name in enumerate(STATUS_BITS) if flags >> STATUS_SHIFT + 7 - bit & 1]
+
+    for shift, suffix in ((ALARM_SHIFT, 'alarm'), (WARNING_SHIFT, 'warning')):
+        names += [f'{name}_{suffix}' for bit, name in enumerate(FLAG_BITS) if flags >> shift + 15 - bit & 1]
+
+    return names
+
+
+if __name__ == '__main__':
+    import time
+
+    from modules.core.sfp import SFP
+
+    with open('a0.txt') as file:
+        a0 = [int(val) for val in file.readline().split(',')]
+    with open('a2.txt') as file:
+        a2 = [int(val) for val in file.readline().split(',')]
+
+    flags = decode_flags(a2)
+    print(f'Flags {flags:010x}: {flag_names(flags) or "none set"}')
+
+    block = a2[FLAG_START:FLAG_START + FLAG_LENGTH]
+    count = 100000
+    start = time.perf_counter()
+    for _ in range(count):
+        decode_flags(block)
+    flag_time = (time.perf_counter() - start) / count
+
+    # What detecting a fault without the flags costs per poll
+    sfp = SFP(a0, a2)
+    sfp.get_diagnostic_monitoring_type()
+    start = time.perf_counter()
+    for _ in range(count // 100):
+        sfp.get_temperature(), sfp.get_vcc(), sfp.get_tx_bias_current(), sfp.get_tx_power(), sfp.calculate_rx_power_uw()
+    measurement_time = (time.perf_counter() - start) / (count // 100)
+
+    print(f'Flags {flag_time * 1e6:.2f} us per poll ({FLAG_LENGTH} bytes), '
+          f'five measurements {measurement_time * 1e6:.1f} us (10 bytes plus calibration)')
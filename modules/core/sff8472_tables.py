@@ -0,0 +1,325 @@
+# String tables used to decode the SFF-8472 memory map. They used to be
+# rebuilt inside the SFP getters on every call, now they are built once
+# when this module is imported and shared by every SFP object.
+#
+# See SFF-8472 and SFF-8024 for the tables.
+
+# SFF-8024 Table 4-1, page 0xA0 byte 0. Codes above 0x1E are reserved
+# (up to 0x7F) or vendor specific
+IDENTIFIERS = (
+    'Unknown or unspecified',
+    'GBIC',
+    'Module/connector soldered to motherboard',
+    'SFP/SFP+/SFP28 and later',
+    '300 pin XBI',
+    'XENPAK',
+    'XFP',
+    'XFF',
+    'XFP-E',
+    'XPAK',
+    'X2',
+    'DWDM-SFP/SFP+ (not using SFF-8472)',
+    'QSFP (INF-8438)',
+    'QSFP+ or later with SFF-8636 or SFF-8436 management interface',
+    'CXP or later',
+    'Shielded Mini Multilane HD 4X',
+    'Shielded Mini Multilane HD 8X',
+    'QSFP28 or later with SFF-8636 management interface',
+    'CXP2 (aka CXP28) or later',
+    'CDFP (Style 1 / Style 2)',
+    'Shielded Mini Multilane HD 4X Fanout Cable',
+    'Shielded Mini Multilane HD 8X Fanout Cable',
+    'CDFP (Style 3)',
+    'microQSFP',
+    'QSFP-DD Double Density 8X Pluggable Transceiver (INF-8628)',
+    'QSFP 8X Pluggable Transceiver',
+    'SFP-DD Double Density 2X Pluggable Transceiver',
+    'DSFP Dual Small Form Factor Pluggable Transceiver',
+    'x4 MiniLink/OcuLink',
+    'x8 MiniLink',
+    'QSFP+ or later with CMIS'
+)
+
+# Table 5-2, page 0xA0 byte 1
+EXT_IDENTIFIERS = (
+    "GBIC Definition not specified/not compliant with a defined MOD_DEF",
+    "Compliant with MOD_DEF1",
+    "Compliant with MOD_DEF2",
+    "Compliant with MOD_DEF3",
+    "Function defined by 2-wire interface ID only",
+    "Compliant with MOD_DEF5",
+    "Compliant with MOD_DEF6",
+    "Compliant with MOD_DEF7"
+)
+
+# SFF-8024 Table 4-3, page 0xA0 byte 2, codes 0x00-0x0D
+CONNECTOR_TYPES = (
+    'Unknown or unspecified',
+    'SC (Subscriber Connector)',
+    'Fibre Channel Style 1 copper connector',
+    'Fibre Channel Style 2 copper connector',
+    'BNC/TNC (Bayonet/Threaded Neill-Concelman)',
+    'Fibre Channel coax headers',
+    'Fibre Jack',
+    'LC (Lucent Connector)',
+    'MT-RJ (Mechanical Transfer - Registered Jack)',
+    'MU (Multiple Optical)',
+    'SG',
+    'Optical Pigtail',
+    'MPO 1x12 (Multifiber Parallel Optic)',
+    'MPO 2x16'
+)
+
+# SFF-8024 Table 4-3, codes 0x20-0x28
+CONNECTOR_TYPES_FROM_0X20 = (
+    'HSSDC II (High Speed Serial Data Connector)',
+    'Copper Pigtail',
+    'RJ45 (Registered Jack)',
+    'No seperable connector',
+    'MXC 2x16',
+    'CS optical connector',
+    'SN (previously Mini CS) optical connector',
+    'MPO 2x12',
+    'MPO 1x16',
+)
+
+# Table 5-3, page 0xA0 bytes 3-10. Entry i of a byte's table is
+# the code for bit i of that byte
+TRANSCEIVER_BYTE_3_CODES = (
+    '1X Copper Passive',
+    '1X Copper Active',
+    '1X LX',
+    '1X SX',
+    '10GBASE-SR',
+    '10GBASE-LR',
+    '10GBASE-LRM',
+    '10GBASE-ER'
+)
+
+TRANSCEIVER_BYTE_4_CODES = (
+    'OC-48 short reach',
+    'OC-48 intermediate reach',
+    'OC-48 long reach',
+    'SONET reach specifier bit 2',
+    'SONET reach specifier bit 1',
+    'OC-192, short reach',
+    'ESCON SMF, 1310nm Laser',
+    'ESCON MMF, 1310nm LED'
+)
+
+TRANSCEIVER_BYTE_5_CODES = ( 
+    'OC-3, short reach',
+    'OC-3, single mode, intermediate reach',
+    'OC-3, single mode, long reach',
+    'Reserved',
+    'OC-12, short reach',
+    'OC-12, single mode, intermediate reach',
+    'OC-12, single mode, long reach',
+    'Reserved'
+)
+
+TRANSCEIVER_BYTE_6_CODES = (
+    '1000BASE-SX',
+    '1000BASE-LX',
+    '1000BASE-CX',
+    '1000BASE-T',
+    '100BASE-LX/LX10',
+    '100BASE-FX',
+    'BASE_BX10',
+    'BASE-PX',
+)
+
+TRANSCEIVER_BYTE_7_CODES = ( 
+    'Electrical inter-enclosure (EL)',
+    'Longwave laser (LC)',
+    'Shortwave laser, linear Rx (SA)',
+    'medium distance (M)',
+    'long distance (L)',
+    'intermediate distance (I)',
+    'short distance (S)',
+    'very long distance (V)',
+)
+
+TRANSCEIVER_BYTE_8_CODES = (
+    'Reserved'
+    'Reserved',
+    'Passive Cable',
+    'Active Cable',
+    'Longwave laser (LL)',
+    'Shortwave laser with OFC (SL)',
+    'Shortwave laser w/o OFC (SN)',
+    'Electrical intra-enclosure (EL)',
+)
+
+TRANSCEIVER_BYTE_9_CODES = (
+    'Single Mode (SM)'
+    'Reserved',
+    'Multimode, 50um (M5, M5E)',
+    'Multimode, 62.5um (M6)',
+    'Video Coax (TV)',
+    'Miniature Coax (MI)',
+    'Twisted Pair (TP)',
+    'Twin Axial Pair (TW)',
+)
+
+TRANSCEIVER_BYTE_10_CODES = (
+    '100 MBytes/sec'
+    'See byte 62 "Fibre Channel Speed 2"',
+    '200 MBytes/sec',
+    '3200 MBytes/sec',
+    '400 MBytes/sec',
+    '1600 MBytes/sec',
+    '800 MBytes/sec',
+    '1200 MBytes/sec',
+)
+
+# SFF-8024 Table 4-2, page 0xA0 byte 11
+ENCODINGS = (
+    'Unspecified',
+    '8B/10B',
+    '4B/5B',
+    'NRZ',
+    'Manchester (8472) or SONET Scrambled (8436/8636)',
+    'SONET Scrambled (8472) or 64B/66B (8436/8636)',
+    '64B/66B (8472) or Manchester (8436/8636)',
+    '256B/257B (transcoded FEC-enabled data)',
+    'PAM4',
+)
+
+# Table 5-6, page 0xA0 byte 13
+RATE_IDENTIFIERS = (
+    'Unspecified',
+    'SFF-8079 (4/2/1G Rate_Select & AS0/AS1)',
+    'SFF-8431 (8/4/2G Rx Rate_Select only)',
+    'Unspecified',
+    'SFF-8431 (8/4/2G Tx Rate_Select only)',
+    'Unspecified',
+    'SFF-8431 (8/4/2G Independent Rx & Tx Rate_Select)',
+    'Unspecified',
+    'FC-PI-5 (16/8/4G Independent Rx, Tx Rate_Select) High=16G only, Low=8G/4G',
+    'Unspecified',
+    'FC-PI-6 (32/16/8G Independent Rx, Tx Rate_Select) High=32G only, Low=16G/8G',
+    'Unspecified',
+    '10/8G Rx and Tx Rate_Select...',
+    'Unspecified',
+    'FC-PI-7 (64/32/16G Independent Rx, Tx Rate Select) High = 32GFC and 64GFC. Low = 16GFC',
+    'Unspecified'
+)
+
+# SFF-8024 Table 4-4, page 0xA0 byte 36, codes 0x00-0x4C
+TRANSCEIVER2_CODES = (
+    'Unspecified',
+    '100G AOC or 25GAUI C2M AOC. Providing a worst BER of 5 x 10^-5',
+    '100GBASE-SR4 or 25GBASE-SR',
+    '100GBASE-LR4 or 25GABSE-LR',
+    '100GBASE-ER4 or 25GBASE-ER',
+    '100GBASE-SR10',
+    '100G CWDM4',
+    '100G PSM4 Parallel SMF',
+    '100G ACC or 25GAUI C2M ACC. Providing a worst BER of 5 x 10^-5',
+    'Obsolete',
+    'Reserved',
+    '100GBASE-CR4, 25GBASE-CR CA-25G-L or 50GBASE-CR2 with RS (Clause91) FEC',
+    '25GBASE-CR CA-25G-S or 50GBASE-CR2 with BASE_R (Clause 74 Fire code) FEC',
+    '25GBASE-CR CA-25G-N or 50GBASE-CR2 with no FEC',
+    '10 Mb/s Single Pair Ethernet (802.3cg, Clause 146/147, 1000m copper)',
+    'Reserved',
+    '40GBASE-ER4',
+    '4 x 10GBASE-SR',
+    '40G PSM4 Parallel SMF',
+    'G959.1 profile P1I1-2D1 (10709 MBd, 2km, 1310 nm SM)',
+    'G959.1 profile P1S1-2D2 (10709 MBd, 40km, 1550 nm SM)',
+    'G959.1 profile P1L1-2D2 (10709 MBd, 80km, 1550 nm SM)',
+    '10GBASE-T with SFI electrical interface',
+    '100G CLR4',
+    '100G AOC or 25GAUI C2M AOC. Providing a worst BER of 10^-12 or below',
+    '100G ACC or 25GAUI C2M ACC. Providing a worst BER of 10^-12 or below',
+    '100GE-DWDM2',
+    '100G 1550nm WDM (4 wavelengths)',
+    '10GBASE-T Short Reach (30 meters)',
+    '5GBASE-T',
+    '2.5GBASE-T',
+    '40G SWDM4',
+    '100G SWDM4', #0x20
+    '100G PAM4 BiDi', #0x21
+    '4WDM-10 MSA', # 0x22 - Note that the table in SFF-8024 is out of order
+    '4WDM-20 MSA',
+    '4WDM-40 MSA',
+    '100GBASE-DR (Clause 140), CAUI-4 (no FEC)',
+    '100G-FR or 100GBASE-FR1 (Clause 140), CAUI-4 (no FEC)',
+    '100G-LR or 100GBASE-LR1 (Clause 140), CAUI-4 (no FEC)',
+    '100GBASE-SR (P802.3db, Clause 167), CAUI-4 (no FEC)',
+    '100GBASE-SR, 200GBASE-SR2 or 400GBASE-SR4 (P802.3db, Clause 167)'
+    '100GBASE-FR1 (P802.3cu, Clause 140)',
+    '100GBASE-LR1 (P802.3cu, Clause 140)',
+    '100G-LR1-20 MSA, CAUI-4 (no FEC)',
+    '100G-ER1-30 MSA, CAUI-4 (no FEC)',
+    '100G-ER1-40 MSA, CAUI-4 (no FEC)', 
+    '100G-LR1-20 MSA', #0x2F
+    'ACC with 50GAUI, 100GAUI-2 or 200GAUI-4 C2M',
+    'AOC with 50GAUI, 100GAUI-2 or 200GAUI-4 C2M',
+    'ACC with 50GAUI, 100GAUI-2 or 200GAUI-4 C2M',
+    'AOC with 50GAUI, 100GAUI-2 or 200GAUI-4 C2M',
+    '100G-ER1-30 MSA', #0x34
+    '100G-ER1-40 MSA',
+    '100GBASE-VR, 200GBASE-VR2 or 400GBASE-VR4 (P802.3db, Clause 167)',
+    '10GBASE-BR (Clause 158)',
+    '25GBASE-BR (Clause 159)',
+    '50GBASE-Br (Clause 160)',
+    '100GBASE-VR (P802.3db, Clause 167), CAUI-4 (no FEC)',
+    'Reserved',
+    'Reserved',
+    'Reserved',
+    'Reserved',
+    '100GBASE-CR1, 200GBASE-CR2 or 400GBASE-CR4 (P802.3ck, Clause 162)',
+    '50GBASE-CR, 100GBASE-CR2, or 200GBASE-CR4',
+    '50GBASE-SR, 100GBASE-SR2, or 200GBASE-SR4',
+    '50GBASE-FR or 200GBASE-DR4',
+    '200GBASE-FR4',
+    '200G 1550nm PSM4',
+    '50GBASE-LR',
+    '200GBASE-LR4',
+    '400GBASE-DR4 (802.3, Clause 124), 100GAUI-1 C2M (Annex 120G)',
+    '400GBASE-FR4 (802.3cu, Clause 151)',
+    '400GBASE-LR4-6 (802.3cu, Clause 151)',
+    '50GBASE-ER (IEEE 802.3cn, Clause 139)',
+    '400G-LR4-10',
+    '400GBASE-ZR (802.3cw, Clause 156)',
+)
+
+# Table 8-6, page 0xA0 byte 93, bit 7 first
+ENHANCED_OPTIONS = (
+    'Optional Alarm/warning flags implemented for all monitored quantities', # bit 7
+    'Optional soft TX_DISABLE control and monitoring implemented',
+    'Optional soft TX_FAULT monitoring implemented',
+    'Optional soft RX_LOS monitoring implemented',
+    'Optional soft RATE_SELECT control and monitoring implemented',
+    'Optional Application Select control implemented per SFF-8079',
+    'Optional soft Rate Select control implemented per SFF-8431',
+    'Reserved'
+)
+
+# Table 8-8, page 0xA0 byte 94
+SFF_8472_REVISIONS = (
+    '',
+    'Rev 9.3',
+    'Rev 9.5',
+    'Rev 10.2',
+    'Rev 10.4',
+    'Rev 11.0',
+    'Rev 11.3',
+    'Rev 11.4',
+    'Rev 12.3',
+    'Rev 12.4'
+)
+
+TRANSCEIVER_CODES = {
+    3: TRANSCEIVER_BYTE_3_CODES,
+    4: TRANSCEIVER_BYTE_4_CODES,
+    5: TRANSCEIVER_BYTE_5_CODES,
+    6: TRANSCEIVER_BYTE_6_CODES,
+    7: TRANSCEIVER_BYTE_7_CODES,
+    8: TRANSCEIVER_BYTE_8_CODES,
+    9: TRANSCEIVER_BYTE_9_CODES,
+    10: TRANSCEIVER_BYTE_10_CODES,
+}
@@ -7,16 +7,129 @@
 #               07/28/2021 - Continued work on getters for page a2
 #               07/29/2021 - Moved conversions to convert.py
 #               10/01/2021 - Fixed get_transceiver() method
+#               10/18/2026 - get_temperature() no longer forces Decimal math
+#               10/18/2026 - Cached calibration constants for real time values
+#               10/18/2026 - Moved string tables to sff8472_tables.py, memoized
+#                            decoded fields, added decode_all()
+#               10/18/2026 - Getters read the field map in sff8472_fields.py
+#               10/18/2026 - Pages are stored as bytes-like objects
+#               10/18/2026 - read_sfp_bin_file() reads the file in one call
+#               10/18/2026 - Added get_ddm_flags()
 #
 # See SFF-8472 for tables that determine what each
 # value means in the memory map.
 
 from dataclasses import dataclass
+from functools import wraps
 from random import randint
-from typing import List
+from typing import Iterable, List, Union
 from modules.core.convert import *
+from modules.core.sff8472_fields import PAGE_DECODERS
+from modules.core.sff8472_flags import FLAG_START, FLAG_LENGTH, decode_flags
+from modules.core.sff8472_tables import *
 from enum import Enum
 
+# A memory page, 256 byte values. memoryviews may be slices of a larger
+# buffer, such as an mmap'd dump file
+Page = Union[bytes, bytearray, memoryview]
+
+def as_page(values: Union[Page, Iterable[int]]) -> Page:
+    '''
+    Returns values as a page SFP can store. bytes, bytearray and
+    memoryview objects are used as they are (no copy), anything else,
+    like the List[int] pages the I2C bus returns, is copied into a
+    bytearray so it stays writable.
+    '''
+    if isinstance(values, memoryview):
+        return values if values.format == 'B' else values.cast('B')
+
+    if isinstance(values, (bytes, bytearray)):
+        return values
+
+    return bytearray(values)
+
+def _decoded_field(page: str, first: int, last: int):
+    '''
+    Memoizes a getter that decodes bytes [first, last] of the page
+    attribute page ('page_a0' or 'page_a2'). The getter runs again only
+    when those bytes changed since its last call. Lists are returned as
+    copies so callers can not change the memoized value.
+    '''
+    def decorator(getter):
+        name = getter.__name__
+
+        @wraps(getter)
+        def wrapper(self):
+            # Copied, a memoryview page can change under a view of it
+            source = bytes(getattr(self, page)[first:last + 1])
+            cached = self._decoded.get(name)
+
+            if cached is None or cached[0] != source:
+                cached = (source, getter(self))
+                self._decoded[name] = cached
+
+            value = cached[1]
+            return list(value) if isinstance(value, list) else value
+
+        return wrapper
+
+    return decorator
+
+def _mapped_field(page_number: int):
+    '''
+    Memoizes a getter that decodes fields of the SFF-8472 field map of
+    page 0xA0 or 0xA2. The memo is keyed on the decoded page _fields()
+    returns, so a call copies the page bytes once (in _fields()) and
+    the getter runs again only when _fields() decoded the page again.
+    Lists are returned as copies like _decoded_field().
+    '''
+    def decorator(getter):
+        name = getter.__name__
+
+        @wraps(getter)
+        def wrapper(self):
+            fields = self._fields(page_number)
+            cached = self._decoded.get(name)
+
+            if cached is None or cached[0] is not fields:
+                # The getter reads the fields just decoded instead of
+                # copying the page bytes again
+                pinned = self._pinned_fields
+                self._pinned_fields = {**(pinned or {}), page_number: fields}
+
+                try:
+                    cached = (fields, getter(self))
+                finally:
+                    self._pinned_fields = pinned
+
+                self._decoded[name] = cached
+
+            value = cached[1]
+            return list(value) if isinstance(value, list) else value
+
+        return wrapper
+
+    return decorator
+
+class CalibrationCoefficients:
+    '''
+    The external calibration constants of page 0xA2 (bytes 56-91),
+    decoded once. Internally calibrated modules carry slopes of 1 and
+    offsets of 0 here.
+    '''
+    __slots__ = (
+        'rx_pwr_4', 'rx_pwr_3', 'rx_pwr_2', 'rx_pwr_1', 'rx_pwr_0',
+        'tx_i_slope', 'tx_i_offset', 'tx_pwr_slope', 'tx_pwr_offset',
+        'temp_slope', 'temp_offset', 'voltage_slope', 'voltage_offset',
+    )
+
+    def __init__(self, fields: dict):
+        '''
+        fields is the decoded page 0xA2, see SFP._fields().
+        '''
+        for name in self.__slots__:
+            setattr(self, name, fields[name])
+
 class SFP:
     '''
     Has two lists of integers that represent the memory map
@@ -33,25 +146,40 @@ class SFP:
         EXTERNAL = 2
 
     # Holds the data values from page 0xA0 of the SFP memory map
-    page_a0 : List[int]
+    page_a0 : Page
 
     # Holds the data values from page 0xA2 of the SFP memory map
-    page_a2 : List[int]
+    page_a2 : Page
 
     memory_pages: dict
 
     # Holds the calibration type of the module
     calibration_type: CalibrationType = CalibrationType.UNKNOWN
 
-    def __init__(self, page_a0: List[int], page_a2: List[int]):
+    def __init__(self, page_a0: Union[Page, List[int]], page_a2: Union[Page, List[int]]):
 
         self.memory_pages = {}
 
-        self.page_a0 = page_a0
-        self.page_a2 = page_a2
+        # Lists of ints are converted, see as_page()
+        self.page_a0 = as_page(page_a0)
+        self.page_a2 = as_page(page_a2)
+
+        self.add_memory_page(0xA0, self.page_a0)
+        self.add_memory_page(0xA2, self.page_a2)
+
+        # Decoded calibration constants and the decoded page 0xA2 they
+        # were taken from, see get_calibration()
+        self._calibration = None
+        self._calibration_key = None
 
-        self.add_memory_page(0xA0, page_a0)
-        self.add_memory_page(0xA2, page_a2)
+        # Memoized getter results, see _decoded_field() and
+        # _mapped_field()
+        self._decoded = {}
+
+        # Decoded field maps of each page, see _fields(). decode_all()
+        # and _mapped_field() pin them while they run getters
+        self._page_fields = {}
+        self._pinned_fields = None
 
         # Sets the calibration type flag for use in
         # the calculation functions
@@ -60,16 +188,39 @@ class SFP:
         elif self.page_a0[92] & 0x10:
             self.calibration_type = self.CalibrationType.EXTERNAL
         
-    def add_memory_page(self, page_code: int, page_values: List[int]) -> None:
-        self.memory_pages[page_code] = page_values
+    def _fields(self, page_number: int) -> dict:
+        '''
+        Returns every field of page 0xA0 or 0xA2 in the SFF-8472 field
+        map, decoded with one struct unpack. The page is decoded again
+        only when the bytes the map covers (or the conversion mode)
+        changed since the last call, so refreshing the real time bytes
+        of page 0xA2 leaves it alone.
+        '''
+        if self._pinned_fields is not None and page_number in self._pinned_fields:
+            return self._pinned_fields[page_number]
+
+        page = self.page_a0 if page_number == 0xA0 else self.page_a2
+        decoder = PAGE_DECODERS[page_number]
+        key = (bytes(page[:decoder.size]), is_exact_mode())
+        cached = self._page_fields.get(page_number)
 
-    def get_page(self, page_number: int) -> List[int]:
+        if cached is None or cached[0] != key:
+            cached = (key, decoder.decode(key[0]))
+            self._page_fields[page_number] = cached
+
+        return cached[1]
+
+    def add_memory_page(self, page_code: int, page_values: Union[Page, List[int]]) -> None:
+        self.memory_pages[page_code] = as_page(page_values)
+
+    def get_page(self, page_number: int) -> Page:
         return self.memory_pages[page_number]
 
-    def get_page_a0(self) -> List[int]:
+    def get_page_a0(self) -> Page:
         return self.page_a0
 
     # From Table 5-1 and Table 4-1 from SFF 8024
+    @_mapped_field(0xA0)
     def get_identifier(self) -> str:
         '''
         Returns the type of transceiver the module has.
@@ -77,113 +228,43 @@ class SFP:
         '''
         # Use the id_code as an index into array
         # of strings for identifier type
-        id_code = self.page_a0[0]
-
-        result = [
-                'Unknown or unspecified',
-                'GBIC',
-                'Module/connector soldered to motherboard',
-                'SFP/SFP+/SFP28 and later',
-                '300 pin XBI',
-                'XENPAK',
-                'XFP',
-                'XFF',
-                'XFP-E',
-                'XPAK',
-                'X2',
-                'DWDM-SFP/SFP+ (not using SFF-8472)',
-                'QSFP (INF-8438)',
-                'QSFP+ or later with SFF-8636 or SFF-8436 management interface',
-                'CXP or later',
-                'Shielded Mini Multilane HD 4X',
-                'Shielded Mini Multilane HD 8X',
-                'QSFP28 or later with SFF-8636 management interface',
-                'CXP2 (aka CXP28) or later',
-                'CDFP (Style 1 / Style 2)',
-                'Shielded Mini Multilane HD 4X Fanout Cable',
-                'Shielded Mini Multilane HD 8X Fanout Cable',
-                'CDFP (Style 3)',
-                'microQSFP',
-                'QSFP-DD Double Density 8X Pluggable Transceiver (INF-8628)',
-                'QSFP 8X Pluggable Transceiver',
-                'SFP-DD Double Density 2X Pluggable Transceiver',
-                'DSFP Dual Small Form Factor Pluggable Transceiver',
-                'x4 MiniLink/OcuLink',
-                'x8 MiniLink',
-                'QSFP+ or later with CMIS'
-        ]
+        id_code = self._fields(0xA0)['identifier']
 
         if id_code <= 0x1E:
-            return result[id_code]
+            return IDENTIFIERS[id_code]
         elif id_code <= 0x7F:
             return "Reserved"
         else:
             return "Vendor specific"
 
     # From Table 5-2
+    @_mapped_field(0xA0)
     def get_ext_identifier(self) -> str:
         
-        possible = [
-            "GBIC Definition not specified/not compliant with a defined MOD_DEF",
-            "Compliant with MOD_DEF1",
-            "Compliant with MOD_DEF2",
-            "Compliant with MOD_DEF3",
-            "Function defined by 2-wire interface ID only",
-            "Compliant with MOD_DEF5",
-            "Compliant with MOD_DEF6",
-            "Compliant with MOD_DEF7"
-        ]
-        
-        ext_id_code = self.page_a0[1]
+        ext_id_code = self._fields(0xA0)['ext_identifier']
 
         if ext_id_code <= 0x07:
-            return possible[ext_id_code]
+            return EXT_IDENTIFIERS[ext_id_code]
         else:
             return "Reserved"
 
     # From SFF-8024 Table 4-3
+    @_mapped_field(0xA0)
     def get_connector_type(self) -> str:
-        code = self.page_a0[2]
-
-        result = [
-            'Unknown or unspecified',
-            'SC (Subscriber Connector)',
-            'Fibre Channel Style 1 copper connector',
-            'Fibre Channel Style 2 copper connector',
-            'BNC/TNC (Bayonet/Threaded Neill-Concelman)',
-            'Fibre Channel coax headers',
-            'Fibre Jack',
-            'LC (Lucent Connector)',
-            'MT-RJ (Mechanical Transfer - Registered Jack)',
-            'MU (Multiple Optical)',
-            'SG',
-            'Optical Pigtail',
-            'MPO 1x12 (Multifiber Parallel Optic)',
-            'MPO 2x16']
-        
-        result2 = [
-            'HSSDC II (High Speed Serial Data Connector)',
-            'Copper Pigtail',
-            'RJ45 (Registered Jack)',
-            'No seperable connector',
-            'MXC 2x16',
-            'CS optical connector',
-            'SN (previously Mini CS) optical connector',
-            'MPO 2x12',
-            'MPO 1x16',
-        ]
+        code = self._fields(0xA0)['connector_type']
 
         if code < 0x0E:
-            return result[code]
+            return CONNECTOR_TYPES[code]
         elif (code >= 0x0E and code <= 0x1F) or (code >= 0x29 and code <= 0x7F):
             return "Reserved"
         elif code > 0x1F and code < 0x29:
             print(f'{code - 0x20 = }')
-            return result2[code - 0x20]
+            return CONNECTOR_TYPES_FROM_0X20[code - 0x20]
         else:
             return "Vendor specific"
 
     # See comments in method
+    @_mapped_field(0xA0)
     def get_transceiver_info(self) -> List[str]:
         """
         Returns the optical/electronic compatibility of the transceiver.
@@ -191,110 +272,13 @@ class SFP:
         # Starting at page 0xA0 byte 3, bytes 3-10 are used
         # to define the transceiver compliance
 
-        # These arrays hold codes that represent the value for each
-        # bit that is set in the corresponding byte. For example,
-        # byte_three_codes[0] is the value we get when bit 0 of byte 3
+        # TRANSCEIVER_CODES holds the codes that represent the value for
+        # each bit that is set in the corresponding byte. For example,
+        # TRANSCEIVER_CODES[3][0] is the value we get when bit 0 of byte 3
         # is set, so if we had 0b00000001 we would add '1X Copper Passive'
         # to the transceiver type
-        byte_three_codes = [
-            '1X Copper Passive',
-            '1X Copper Active',
-            '1X LX',
-            '1X SX',
-            '10GBASE-SR',
-            '10GBASE-LR',
-            '10GBASE-LRM',
-            '10GBASE-ER'
-        ]
-
-        byte_four_codes = [
-            'OC-48 short reach',
-            'OC-48 intermediate reach',
-            'OC-48 long reach',
-            'SONET reach specifier bit 2',
-            'SONET reach specifier bit 1',
-            'OC-192, short reach',
-            'ESCON SMF, 1310nm Laser',
-            'ESCON MMF, 1310nm LED'
-        ]
-
-        byte_five_codes = [ 
-            'OC-3, short reach',
-            'OC-3, single mode, intermediate reach',
-            'OC-3, single mode, long reach',
-            'Reserved',
-            'OC-12, short reach',
-            'OC-12, single mode, intermediate reach',
-            'OC-12, single mode, long reach',
-            'Reserved'
-        ]
-
-        byte_six_codes = [
-            '1000BASE-SX',
-            '1000BASE-LX',
-            '1000BASE-CX',
-            '1000BASE-T',
-            '100BASE-LX/LX10',
-            '100BASE-FX',
-            'BASE_BX10',
-            'BASE-PX',
-        ]
-
-        byte_seven_codes = [ 
-            'Electrical inter-enclosure (EL)',
-            'Longwave laser (LC)',
-            'Shortwave laser, linear Rx (SA)',
-            'medium distance (M)',
-            'long distance (L)',
-            'intermediate distance (I)',
-            'short distance (S)',
-            'very long distance (V)',
-        ]
-
-        byte_eight_codes = [
-            'Reserved'
-            'Reserved',
-            'Passive Cable',
-            'Active Cable',
-            'Longwave laser (LL)',
-            'Shortwave laser with OFC (SL)',
-            'Shortwave laser w/o OFC (SN)',
-            'Electrical intra-enclosure (EL)',
-        ]
-
-
-        byte_nine_codes = [
-            'Single Mode (SM)'
-            'Reserved',
-            'Multimode, 50um (M5, M5E)',
-            'Multimode, 62.5um (M6)',
-            'Video Coax (TV)',
-            'Miniature Coax (MI)',
-            'Twisted Pair (TP)',
-            'Twin Axial Pair (TW)',
-        ]
-
-        byte_ten_codes = [
-            '100 MBytes/sec'
-            'See byte 62 "Fibre Channel Speed 2"',
-            '200 MBytes/sec',
-            '3200 MBytes/sec',
-            '400 MBytes/sec',
-            '1600 MBytes/sec',
-            '800 MBytes/sec',
-            '1200 MBytes/sec',
-        ]
-
-        code_dict = {}
-        code_dict[3] = byte_three_codes
-        code_dict[4] = byte_four_codes
-        code_dict[5] = byte_five_codes
-        code_dict[6] = byte_six_codes
-        code_dict[7] = byte_seven_codes
-        code_dict[8] = byte_eight_codes
-        code_dict[9] = byte_nine_codes
-        code_dict[10] = byte_ten_codes
 
+        flags = self._fields(0xA0)['transceiver_info']
         compliant_with : List[str] = []
 
 
@@ -310,35 +294,23 @@ class SFP:
                 # If we take perform (byte AND mask) / mask, we will get either
                 # zero or one
 
-                if (self.page_a0[byte] & mask) // mask == 1:
-                    compliant_with.append(code_dict[byte][i])
+                if ((flags >> 8 * (10 - byte)) & mask) // mask == 1:
+                    compliant_with.append(TRANSCEIVER_CODES[byte][i])
 
                 mask = mask // 2
 
         return compliant_with
 
+    @_mapped_field(0xA0)
     def get_encoding(self) -> str:
         '''
         Returns the encoding method of the SFP. Values are
         from SFF-8024 Table 4-2. Uses byte 11 of page 0xA0
         '''
-
-        encoding = [
-            'Unspecified',
-            '8B/10B',
-            '4B/5B',
-            'NRZ',
-            'Manchester (8472) or SONET Scrambled (8436/8636)',
-            'SONET Scrambled (8472) or 64B/66B (8436/8636)',
-            '64B/66B (8472) or Manchester (8436/8636)',
-            '256B/257B (transcoded FEC-enabled data)',
-            'PAM4',
-        ]
-
-        code = self.page_a0[11]
+        code = self._fields(0xA0)['encoding']
 
         if code < 0x09:
-            return encoding[code]
+            return ENCODINGS[code]
         else:
             return 'Reserved'
 
@@ -346,33 +318,15 @@ class SFP:
         '''
         Returns the nominal signaling rate in units of 100 MBaud.
         '''
-        return self.page_a0[12]
+        return self._fields(0xA0)['signaling_rate_nominal']
     
+    @_mapped_field(0xA0)
     def get_rate_identifier(self) -> str:
 
-        rates = [
-            'Unspecified',
-            'SFF-8079 (4/2/1G Rate_Select & AS0/AS1)',
-            'SFF-8431 (8/4/2G Rx Rate_Select only)',
-            'Unspecified',
-            'SFF-8431 (8/4/2G Tx Rate_Select only)',
-            'Unspecified',
-            'SFF-8431 (8/4/2G Independent Rx & Tx Rate_Select)',
-            'Unspecified',
-            'FC-PI-5 (16/8/4G Independent Rx, Tx Rate_Select) High=16G only, Low=8G/4G',
-            'Unspecified',
-            'FC-PI-6 (32/16/8G Independent Rx, Tx Rate_Select) High=32G only, Low=16G/8G',
-            'Unspecified',
-            '10/8G Rx and Tx Rate_Select...',
-            'Unspecified',
-            'FC-PI-7 (64/32/16G Independent Rx, Tx Rate Select) High = 32GFC and 64GFC. Low = 16GFC',
-            'Unspecified'
-        ]
-
-        code = self.page_a0[13]
+        code = self._fields(0xA0)['rate_identifier']
 
         if code < 0x12:
-            return rates[code]
+            return RATE_IDENTIFIERS[code]
         elif (code >= 0x12 and code <= 0x1F) or (code >= 0x21 and code <= 0xFF):
             return 'Reserved'
         elif code == 0x20:
@@ -383,134 +337,51 @@ class SFP:
         Link length supported for single-mode fiber, units of
         100m, or copper cable attenuation in dB at 25.78 GHz
         '''
-        return self.page_a0[15]
+        return self._fields(0xA0)['smf_link_length']
 
     def get_om2_link_length(self) -> int:
         '''
         Link length supported for 50um OM2 fiber
         '''
-        return self.page_a0[16]
+        return self._fields(0xA0)['om2_link_length']
 
     def get_om1_link_length(self) -> int:
         '''
         Link length supported for 62.5um OM1 fiber
         '''
-        return self.page_a0[17]
+        return self._fields(0xA0)['om1_link_length']
 
     def get_om4_link_length(self) -> int:
         '''
         Link length supported for 50um OM4 fiber in units of 10m,
         or length of copper/direct attach cable in units of m.
         '''
-        return self.page_a0[18]
+        return self._fields(0xA0)['om4_link_length']
 
     def get_om3_link_length(self) -> int:
         '''
         Link length supported for 50um OM3 fiber, units of 10m.
         Alternatively, copper/direct attach cable multiplier and base value
         '''
-        return self.page_a0[19]
+        return self._fields(0xA0)['om3_link_length']
 
+    @_mapped_field(0xA0)
     def get_vendor_name(self) -> str:
         '''
         Returns the vendor's name in ASCII.
         '''
-        name = ""
-        for num in self.page_a0[20:35 + 1]:
-            name += chr(num)
-        
-        return name
+        return self._fields(0xA0)['vendor_name']
 
+    @_mapped_field(0xA0)
     def get_transceiver2(self) -> str:
         '''
         Code for electronic or optical comatibility (Table 5-3). Also
         from SFF 8024 Table 4-4.
         '''
-
-        codes = [
-            'Unspecified',
-            '100G AOC or 25GAUI C2M AOC. Providing a worst BER of 5 x 10^-5',
-            '100GBASE-SR4 or 25GBASE-SR',
-            '100GBASE-LR4 or 25GABSE-LR',
-            '100GBASE-ER4 or 25GBASE-ER',
-            '100GBASE-SR10',
-            '100G CWDM4',
-            '100G PSM4 Parallel SMF',
-            '100G ACC or 25GAUI C2M ACC. Providing a worst BER of 5 x 10^-5',
-            'Obsolete',
-            'Reserved',
-            '100GBASE-CR4, 25GBASE-CR CA-25G-L or 50GBASE-CR2 with RS (Clause91) FEC',
-            '25GBASE-CR CA-25G-S or 50GBASE-CR2 with BASE_R (Clause 74 Fire code) FEC',
-            '25GBASE-CR CA-25G-N or 50GBASE-CR2 with no FEC',
-            '10 Mb/s Single Pair Ethernet (802.3cg, Clause 146/147, 1000m copper)',
-            'Reserved',
-            '40GBASE-ER4',
-            '4 x 10GBASE-SR',
-            '40G PSM4 Parallel SMF',
-            'G959.1 profile P1I1-2D1 (10709 MBd, 2km, 1310 nm SM)',
-            'G959.1 profile P1S1-2D2 (10709 MBd, 40km, 1550 nm SM)',
-            'G959.1 profile P1L1-2D2 (10709 MBd, 80km, 1550 nm SM)',
-            '10GBASE-T with SFI electrical interface',
-            '100G CLR4',
-            '100G AOC or 25GAUI C2M AOC. Providing a worst BER of 10^-12 or below',
-            '100G ACC or 25GAUI C2M ACC. Providing a worst BER of 10^-12 or below',
-            '100GE-DWDM2',
-            '100G 1550nm WDM (4 wavelengths)',
-            '10GBASE-T Short Reach (30 meters)',
-            '5GBASE-T',
-            '2.5GBASE-T',
-            '40G SWDM4',
-            '100G SWDM4', #0x20
-            '100G PAM4 BiDi', #0x21
-            '4WDM-10 MSA', # 0x22 - Note that the table in SFF-8024 is out of order
-            '4WDM-20 MSA',
-            '4WDM-40 MSA',
-            '100GBASE-DR (Clause 140), CAUI-4 (no FEC)',
-            '100G-FR or 100GBASE-FR1 (Clause 140), CAUI-4 (no FEC)',
-            '100G-LR or 100GBASE-LR1 (Clause 140), CAUI-4 (no FEC)',
-            '100GBASE-SR (P802.3db, Clause 167), CAUI-4 (no FEC)',
-            '100GBASE-SR, 200GBASE-SR2 or 400GBASE-SR4 (P802.3db, Clause 167)'
-            '100GBASE-FR1 (P802.3cu, Clause 140)',
-            '100GBASE-LR1 (P802.3cu, Clause 140)',
-            '100G-LR1-20 MSA, CAUI-4 (no FEC)',
-            '100G-ER1-30 MSA, CAUI-4 (no FEC)',
-            '100G-ER1-40 MSA, CAUI-4 (no FEC)', 
-            '100G-LR1-20 MSA', #0x2F
-            'ACC with 50GAUI, 100GAUI-2 or 200GAUI-4 C2M',
-            'AOC with 50GAUI, 100GAUI-2 or 200GAUI-4 C2M',
-            'ACC with 50GAUI, 100GAUI-2 or 200GAUI-4 C2M',
-            'AOC with 50GAUI, 100GAUI-2 or 200GAUI-4 C2M',
-            '100G-ER1-30 MSA', #0x34
-            '100G-ER1-40 MSA',
-            '100GBASE-VR, 200GBASE-VR2 or 400GBASE-VR4 (P802.3db, Clause 167)',
-            '10GBASE-BR (Clause 158)',
-            '25GBASE-BR (Clause 159)',
-            '50GBASE-Br (Clause 160)',
-            '100GBASE-VR (P802.3db, Clause 167), CAUI-4 (no FEC)',
-            'Reserved',
-            'Reserved',
-            'Reserved',
-            'Reserved',
-            '100GBASE-CR1, 200GBASE-CR2 or 400GBASE-CR4 (P802.3ck, Clause 162)',
-            '50GBASE-CR, 100GBASE-CR2, or 200GBASE-CR4',
-            '50GBASE-SR, 100GBASE-SR2, or 200GBASE-SR4',
-            '50GBASE-FR or 200GBASE-DR4',
-            '200GBASE-FR4',
-            '200G 1550nm PSM4',
-            '50GBASE-LR',
-            '200GBASE-LR4',
-            '400GBASE-DR4 (802.3, Clause 124), 100GAUI-1 C2M (Annex 120G)',
-            '400GBASE-FR4 (802.3cu, Clause 151)',
-            '400GBASE-LR4-6 (802.3cu, Clause 151)',
-            '50GBASE-ER (IEEE 802.3cn, Clause 139)',
-            '400G-LR4-10',
-            '400GBASE-ZR (802.3cw, Clause 156)',
-        ]
-
-        code = self.page_a0[36]
+        code = self._fields(0xA0)['transceiver2']
 
         if code < 0x4D:
-            return codes[code]
+            return TRANSCEIVER2_CODES[code]
         elif code >= 0x4D and code <= 0x7E:
             return "Reserved"
         elif code == 0x7F:
@@ -526,43 +397,34 @@ class SFP:
         '''
         Get's the SFP vendor IEEE company ID
         '''
-        return self.page_a0[37:39 + 1]
+        return list(self._fields(0xA0)['vendor_oui'])
     
+    @_mapped_field(0xA0)
     def get_vendor_part_number(self) -> str:
         '''
         Gets the part number provided by SFP vendor in ASCII.
         '''
-        part_number = ''
-
-        for val in self.page_a0[40:55 + 1]:
-            part_number += chr(val)
-
-        return part_number
+        return self._fields(0xA0)['vendor_part_number']
 
+    @_mapped_field(0xA0)
     def get_vendor_revision_level(self) -> str:
         '''
         Gets the revision level for part number provided 
         by vendor in ASCII. Returns bytes [56,59]
         '''
-
-        rev_level = ''
-
-        for val in self.page_a0[56:59 + 1]:
-            rev_level += chr(val)
-
-        return rev_level
+        return self._fields(0xA0)['vendor_revision_level']
     
     def get_wavelength(self) -> int:
         '''
         Gets the laser wavelength (Passive/Active Cable Specification Compliance) in nm
         '''
-        return self.page_a0[60] << 8 | self.page_a0[61]
+        return self._fields(0xA0)['wavelength']
 
     def get_fibre_channel_speed2(self) -> str:
-        return f'{self.page_a0[62]}'
+        return f'{self._fields(0xA0)["fibre_channel_speed2"]}'
 
     def get_cc_base(self) -> str:
-        return f'{hex(self.page_a0[63])}'
+        return f'{hex(self._fields(0xA0)["cc_base"])}'
 
     
     def calculate_cc_base(self) -> int:
@@ -574,6 +436,7 @@ class SFP:
         return 0xFF & sum(self.page_a0[0:62 + 1])
 
     # Extended ID Field getters
+    @_mapped_field(0xA0)
     def get_optional_tr_signals(self) -> str:
         '''
         Gets a list of optional transceiver signals that are
@@ -584,8 +447,9 @@ class SFP:
 
         optional_signals = []
 
-        byte_64 = self.page_a0[64]
-        byte_65 = self.page_a0[65]
+        flags = self._fields(0xA0)['optional_tr_signals']
+        byte_64 = flags >> 8
+        byte_65 = flags & 0xFF
 
         if (byte_64 & 0x80):
             optional_signals.append("Reserved")
@@ -650,20 +514,22 @@ class SFP:
         '''
         Gets the upper signaling rate margin in units of %
         '''
-        return f'{self.page_a0[66]} %'
+        return f'{self._fields(0xA0)["max_signaling_rate_margin"]} %'
 
     def get_min_signaling_rate_margin(self) -> str:
         '''
         Gets the lower signaling rate margin in units of %
         '''
-        return f'{self.page_a0[67]} %'
+        return f'{self._fields(0xA0)["min_signaling_rate_margin"]} %'
 
+    @_mapped_field(0xA0)
     def get_vendor_serial_number(self) -> str:
         '''
         Gets the serial number provided by the vendor (ASCII)
         '''
-        return f'{self.page_a0[68:83 + 1]}'
+        return f'{self._fields(0xA0)["vendor_serial_number"]}'
 
+    @_mapped_field(0xA0)
     def get_vendor_date_code(self) -> str:
         '''
         Gets the vendor's manufacturing date code (Table 8-4)
@@ -672,21 +538,24 @@ class SFP:
         # Not sure if this is correct. The standard says it's
         # all ASCII codes so it shouldn't matter. I'm just formatting it
         # nicely
-        year = f'{self.page_a0[84]}{self.page_a0[85]}'
-        month = f'{self.page_a0[86]}{self.page_a0[87]}'
-        day = f'{self.page_a0[88]}{self.page_a0[89]}'
+        code = self._fields(0xA0)['vendor_date_code']
 
-        extra_code = f'{self.page_a0[90]}{self.page_a0[91]}'
+        year = f'{code[0]}{code[1]}'
+        month = f'{code[2]}{code[3]}'
+        day = f'{code[4]}{code[5]}'
+
+        extra_code = f'{code[6]}{code[7]}'
 
         date = f'{month}/{day}/{year}\t{extra_code}'
         return date
 
+    @_mapped_field(0xA0)
     def get_diagnostic_monitoring_type(self) -> str:
         '''
         Indicates which type of diagnostic monitoring is implemented (if any)
         in the transceiver (see Table 8-5).
         '''
-        code = self.page_a0[92]
+        code = self._fields(0xA0)['diagnostic_monitoring_type']
 
         compliant_with = []
 
@@ -717,59 +586,35 @@ class SFP:
 
         return compliant_with
 
+    @_mapped_field(0xA0)
     def get_enhanced_options(self) -> str:
         '''
         Indicates which optional enhanced features are
         implemented (if any) in the transceiver (see Table 8-6).
         '''
-        
-        options = [
-            'Optional Alarm/warning flags implemented for all monitored quantities', # bit 7
-            'Optional soft TX_DISABLE control and monitoring implemented',
-            'Optional soft TX_FAULT monitoring implemented',
-            'Optional soft RX_LOS monitoring implemented',
-            'Optional soft RATE_SELECT control and monitoring implemented',
-            'Optional Application Select control implemented per SFF-8079',
-            'Optional soft Rate Select control implemented per SFF-8431',
-            'Reserved'
-        ]
-
-        code = self.page_a0[93]
+        code = self._fields(0xA0)['enhanced_options']
         compliant_with = []
 
         mask = 0x80
 
         for i in range(8):
             if code & mask:
-                compliant_with.append(options[i]) 
+                compliant_with.append(ENHANCED_OPTIONS[i])
 
             mask = mask // 2
 
         return compliant_with
 
+    @_mapped_field(0xA0)
     def get_sff_8472_compliance(self) -> str:
         '''
         Indicates which revision of SFF-8472 the transceiver complies
         with (see Table 8-8).
         '''
-
-        options = [
-            '',
-            'Rev 9.3',
-            'Rev 9.5',
-            'Rev 10.2',
-            'Rev 10.4',
-            'Rev 11.0',
-            'Rev 11.3',
-            'Rev 11.4',
-            'Rev 12.3',
-            'Rev 12.4'
-        ]
-
-        code = self.page_a0[94]
+        code = self._fields(0xA0)['sff_8472_compliance']
 
         if code <= 0x09:
-            return options[code]
+            return SFF_8472_REVISIONS[code]
         else:
             return "Reserved as of SFF-8472 Rev 12.4"
 
@@ -778,7 +623,7 @@ class SFP:
         Returns a hexadecimal string for the checksum
         over the extended ID fields of SFP memory page 0xA0.
         '''
-        return f'{hex(self.page_a0[95])}'
+        return f'{hex(self._fields(0xA0)["cc_ext"])}'
 
     def calculate_cc_ext(self) -> int:
         '''
@@ -794,12 +639,14 @@ class SFP:
 
     # Vendor Specific ID Fields
 
+    @_mapped_field(0xA0)
     def get_vendor_eeprom(self) -> str:
         '''
         Returns the vendor specific EEPROM data of page 0xA0.
         '''
-        return f'{self.page_a0[96:127 + 1]}'
+        return f'{self._fields(0xA0)["vendor_eeprom"]}'
 
+    @_mapped_field(0xA0)
     def get_reserved_fields(self) -> str:
         '''
         In SFF-8472 R12.4, says bytes 122-255 are reserved,
@@ -807,9 +654,9 @@ class SFP:
         any information on these fields. Simply returns an ASCII string
         that contains the data.
         '''
-        return f'{self.page_a0[128:255 + 1]}'
+        return f'{self._fields(0xA0)["reserved_fields"]}'
 
-    def get_page_a2(self) -> List[int]:
+    def get_page_a2(self) -> Page:
         return self.page_a2
 
     #######################################
@@ -832,7 +679,7 @@ class SFP:
 
         # MSB is at the lower address, so shift it left 8 bits
         # and OR it with the rest of the number
-        return self._calibration_helper(0, 1)
+        return self._fields(0xA2)['temp_high_alarm']
 
     def get_temp_low_alarm(self) -> int:
         '''
@@ -842,7 +689,7 @@ class SFP:
 
         # MSB is at the lower address, so shift it left 8 bits
         # and OR it with the rest of the number
-        return self.page_a2[2] << 8 | self.page_a2[3]
+        return self._fields(0xA2)['temp_low_alarm']
     
     def get_temp_high_warning(self) -> int:
         '''
@@ -850,7 +697,7 @@ class SFP:
         being too high. This value is not calibrated.
         '''
 
-        return self.page_a2[4] << 8 | self.page_a2[5]
+        return self._fields(0xA2)['temp_high_warning']
 
     def get_temp_low_warning(self) -> int:
         '''
@@ -858,7 +705,7 @@ class SFP:
         being too low. This value is not calibrated.
         '''
 
-        return self.page_a2[6] << 8 | self.page_a2[7]
+        return self._fields(0xA2)['temp_low_warning']
 
     def get_voltage_high_alarm(self) -> int:
         '''
@@ -866,7 +713,7 @@ class SFP:
         being too high. This value is not calibrated.
         '''
 
-        return self.page_a2[8] << 8 | self.page_a2[9]
+        return self._fields(0xA2)['voltage_high_alarm']
 
     def get_voltage_low_alarm(self) -> int:
         '''
@@ -874,7 +721,7 @@ class SFP:
         being too low. This value is not calibrated.
         '''
 
-        return self.page_a2[10] << 8 | self.page_a2[11]
+        return self._fields(0xA2)['voltage_low_alarm']
 
     def get_voltage_high_warning(self) -> int:
         '''
@@ -882,7 +729,7 @@ class SFP:
         being too high. This value is not calibrated.
         '''
 
-        return self.page_a2[12] << 8 | self.page_a2[13]
+        return self._fields(0xA2)['voltage_high_warning']
 
     def get_voltage_low_warning(self) -> int:
         '''
@@ -890,7 +737,7 @@ class SFP:
         being too low. This value is not calibrated.
         '''
 
-        return self.page_a2[14] << 8 | self.page_a2[15]
+        return self._fields(0xA2)['voltage_low_warning']
 
     def get_bias_high_alarm(self) -> int:
         '''
@@ -898,7 +745,7 @@ class SFP:
         current being too high. This value is not calibrated.
         '''
 
-        return self.page_a2[16] << 8 | self.page_a2[17]
+        return self._fields(0xA2)['bias_high_alarm']
 
     def get_bias_low_alarm(self) -> int:
         '''
@@ -906,7 +753,7 @@ class SFP:
         current being too low. This value is not calibrated.
         '''
 
-        return self.page_a2[18] << 8 | self.page_a2[19]
+        return self._fields(0xA2)['bias_low_alarm']
 
     def get_bias_high_warning(self) -> int:
         '''
@@ -914,7 +761,7 @@ class SFP:
         current being too high. This value is not calibrated.
         '''
 
-        return self._calibration_helper(20, 21)
+        return self._fields(0xA2)['bias_high_warning']
 
     def get_bias_low_warning(self) -> int:
         '''
@@ -922,119 +769,119 @@ class SFP:
         current being too low. This value is not calibrated.
         '''
 
-        return self._calibration_helper(22, 23)
+        return self._fields(0xA2)['bias_low_warning']
 
     def get_tx_power_high_alarm(self) -> int:
         '''
         Gets the alarm threshod for module transmitter
         power being too high. Uncalibrated.
         '''
-        return self._calibration_helper(24, 25)
+        return self._fields(0xA2)['tx_power_high_alarm']
 
     def get_tx_power_low_alarm(self) -> int:
         '''
         Gets the alarm threshod for module transmitter
         power being too low. Uncalibrated.
         '''
-        return self._calibration_helper(26, 27)
+        return self._fields(0xA2)['tx_power_low_alarm']
     
     def get_tx_power_high_warning(self) -> int:
         '''
         Gets the warning threshold for module transmitter
         power being too high. Uncalibrated.
         '''
-        return self._calibration_helper(28, 29)
+        return self._fields(0xA2)['tx_power_high_warning']
 
     def get_tx_power_low_warning(self) -> int:
         '''
         Gets the warning threshold for module transmitter
         power being too low. Uncalibrated.
         '''
-        return self._calibration_helper(30, 31)
+        return self._fields(0xA2)['tx_power_low_warning']
 
     def get_rx_power_high_alarm(self) -> int:
         '''
         Gets the alarm threshold for module receiver
         power being too high. Uncalibrated.
         '''
-        return self._calibration_helper(32, 33)
+        return self._fields(0xA2)['rx_power_high_alarm']
 
     def get_rx_power_low_alarm(self) -> int:
         '''
         Gets the alarm threshold for module receiver
         power being too low. Uncalibrated.
         '''
-        return self._calibration_helper(34, 35)
+        return self._fields(0xA2)['rx_power_low_alarm']
     
     def get_rx_power_high_warning(self) -> int:
         '''
         Gets the warning threshold for module receiver
         power being too high. Uncalibrated.
         '''
-        return self._calibration_helper(36, 37)
+        return self._fields(0xA2)['rx_power_high_warning']
 
     def get_rx_power_low_warning(self) -> int:
         '''
         Gets the warning threshold for module receiver
         power being too low. Uncalibrated.
         '''
-        return self._calibration_helper(38, 39)
+        return self._fields(0xA2)['rx_power_low_warning']
 
     def get_optional_laser_temp_high_alarm(self) -> int:
         '''
         Gets the high alarm threshold for the optional laser
         temperature. Uncalibrated
         '''
-        return self._calibration_helper(40, 41)
+        return self._fields(0xA2)['optional_laser_temp_high_alarm']
 
     def get_optional_laser_temp_low_alarm(self) -> int:
         '''
         Gets the low alarm threshold for the optional laser
         temperature. Uncalibrated
         '''
-        return self._calibration_helper(42, 43)
+        return self._fields(0xA2)['optional_laser_temp_low_alarm']
     
     def get_optional_laser_temp_high_warning(self) -> int:
         '''
         Gets the high warning threshold for the optional laser
         temperature. Uncalibrated.
         '''
-        return self._calibration_helper(44, 45)
+        return self._fields(0xA2)['optional_laser_temp_high_warning']
 
     def get_optional_laser_temp_low_warning(self) -> int:
         '''
         Gets the low warning threshold for the optional laser
         temperature. Uncalibrated.
         '''
-        return self._calibration_helper(46, 47)
+        return self._fields(0xA2)['optional_laser_temp_low_warning']
     
     def get_optional_tec_current_high_alarm(self) -> int:
         '''
         Gets the high alarm threshold for the optional TEC
         current. Uncalibrated.
         '''
-        return self._calibration_helper(48, 49)
+        return self._fields(0xA2)['optional_tec_current_high_alarm']
     
     def get_optional_tec_current_low_alarm(self) -> int:
         '''
         Gets the low alarm threshold for the optional TEC
         current. Uncalibrated.
         '''
-        return self._calibration_helper(50, 51)
+        return self._fields(0xA2)['optional_tec_current_low_alarm']
     
     def get_optional_tec_current_high_warning(self) -> int:
         '''
         Gets the high warning threshold for the optional TEC
         current. Uncalibrated.
         '''
-        return self._calibration_helper(52, 53)
+        return self._fields(0xA2)['optional_tec_current_high_warning']
 
     def get_optional_tec_current_low_warning(self) -> int:
         '''
         Gets the low warning threshold for the optional TEC
         current. Uncalibrated.
         '''
-        return self._calibration_helper(54, 55)
+        return self._fields(0xA2)['optional_tec_current_low_warning']
     
     #   Getters for External Calibration Constants
     #   RX Power uses IEEE 754 standard to represent
@@ -1047,10 +894,7 @@ class SFP:
         power. Bit 7 of byte 56 is MSB. Bit 0 of byte 59 is LSB. Rx_PWR(4)
         should be set to zero for 'internally calibrated' devices.
         '''
-        return ieee754_to_int(
-            self.page_a2[56], self.page_a2[57], 
-            self.page_a2[58], self.page_a2[59]
-        )
+        return self._fields(0xA2)['rx_pwr_4']
 
     def _get_rx_pwr_3(self) -> int:
         '''
@@ -1058,10 +902,7 @@ class SFP:
         power. Bit 7 of byte 56 is MSB. Bit 0 of byte 59 is LSB. Rx_PWR(3)
         should be set to zero for 'internally calibrated' devices.
         '''
-        return ieee754_to_int(
-            self.page_a2[60], self.page_a2[61],
-            self.page_a2[62], self.page_a2[63]
-        )
+        return self._fields(0xA2)['rx_pwr_3']
 
     def _get_rx_pwr_2(self) -> int:
         '''
@@ -1069,10 +910,7 @@ class SFP:
         power. Bit 7 of byte 56 is MSB. Bit 0 of byte 59 is LSB. Rx_PWR(2)
         should be set to zero for 'internally calibrated' devices.
         '''
-        return ieee754_to_int(
-            self.page_a2[64], self.page_a2[65],
-            self.page_a2[66], self.page_a2[67]
-        )
+        return self._fields(0xA2)['rx_pwr_2']
 
     def _get_rx_pwr_1(self) -> int:
         '''
@@ -1080,10 +918,7 @@ class SFP:
         power. Bit 7 of byte 56 is MSB. Bit 0 of byte 59 is LSB. Rx_PWR(1)
         should be set to zero for 'internally calibrated' devices.
         '''
-        return ieee754_to_int(
-            self.page_a2[68], self.page_a2[69],
-            self.page_a2[70], self.page_a2[71]
-        )
+        return self._fields(0xA2)['rx_pwr_1']
 
     def _get_rx_pwr_0(self) -> int:
         '''
@@ -1091,10 +926,7 @@ class SFP:
         power. Bit 7 of byte 56 is MSB. Bit 0 of byte 59 is LSB. Rx_PWR(0)
         should be set to zero for 'internally calibrated' devices.
         '''
-        return ieee754_to_int(
-            self.page_a2[72], self.page_a2[73],
-            self.page_a2[74], self.page_a2[75]
-        )
+        return self._fields(0xA2)['rx_pwr_0']
 
     def calculate_rx_power_uw(self) -> int:
         '''
@@ -1117,9 +949,10 @@ class SFP:
         if self._calibration_type == self.CalibrationType.INTERNAL:
             return float(value)
         elif self._calibration_type == self.CalibrationType.EXTERNAL:
-            return self._get_rx_pwr_4() * value + self._get_rx_pwr_3() * value + \
-                   self._get_rx_pwr_2() * value + self._get_rx_pwr_2() * value + \
-                   self._get_rx_pwr_1() * value + self._get_rx_pwr_0()
+            cal = self.get_calibration()
+            return cal.rx_pwr_4 * value + cal.rx_pwr_3 * value + \
+                   cal.rx_pwr_2 * value + cal.rx_pwr_2 * value + \
+                   cal.rx_pwr_1 * value + cal.rx_pwr_0
         else:
             print("ERROR::SFP::calculate_rx_power() - Unknown calibration type")
             return -1
@@ -1132,7 +965,7 @@ class SFP:
         Bit 7 of byte 76 is MSB, bit 0 of byte 77 is LSB. Tx_I(slope)
         should be set to 1 for 'internally calibrated' devices.
         '''
-        return bytes_to_unsigned_decimal(self.page_a2[76], self.page_a2[77])
+        return self._fields(0xA2)['tx_i_slope']
 
     def get_tx_i_offset(self) -> float:
         '''
@@ -1140,7 +973,7 @@ class SFP:
         current. Bit 7 of byte 78 is MSB, bit 0 of byte 79 is LSB.
         Tx_I(Offset) should be set to zero for "internally calibrated' devices.
         '''
-        return signed_twos_complement_to_int(self.page_a2[78], self.page_a2[79])
+        return self._fields(0xA2)['tx_i_offset']
 
     def get_tx_pwr_slope(self) -> float:
         '''
@@ -1148,7 +981,7 @@ class SFP:
         output power. Bit 7 of byte 80 is MSB, bit 0 of byte 81 is LSB. Tx_PWR(slope)
         should be set to 1 for 'internally calibrated' devices.
         '''
-        return bytes_to_unsigned_decimal(self.page_a2[80], self.page_a2[81])
+        return self._fields(0xA2)['tx_pwr_slope']
 
     def get_tx_pwr_offset(self) -> float:
         '''
@@ -1156,7 +989,7 @@ class SFP:
         coupled output power. Bit 7 of byte 82 is MSB, bit 0 of byte 83 is LSB.
         Tx_PWR(Offset) should be set to zero for "internally calibrated" devices.
         '''
-        return signed_twos_complement_to_int(self.page_a2[82], self.page_a2[83])
+        return self._fields(0xA2)['tx_pwr_offset']
     
     def get_temp_slope(self) -> float:
         '''
@@ -1164,7 +997,7 @@ class SFP:
         Bit 7 of byte 84 is MSB, bit 0 of byte 85 is LSB. T(Slope) should be set to
         1 for "internally calibrated" devices.
         '''
-        return bytes_to_unsigned_decimal(self.page_a2[84], self.page_a2[85])
+        return self._fields(0xA2)['temp_slope']
 
     def get_temp_offset(self) -> float:
         '''
@@ -1172,7 +1005,7 @@ class SFP:
         Bit 7 of byte 86 is MSB, bit 0 of byte 87 is LSB. T(Offset) should be set to
         0 for "internally calibrated" devices.
         '''
-        return signed_twos_complement_to_int(self.page_a2[86], self.page_a2[87])
+        return self._fields(0xA2)['temp_offset']
 
     def get_voltage_slope(self) -> float:
         '''
@@ -1180,7 +1013,7 @@ class SFP:
         Bit 7 of byte 88 is MSB, bit 0 of byte 89 is LSB. V(Slope) should be set to
         1 for "internally calibrated" devices.
         '''
-        return bytes_to_unsigned_decimal(self.page_a2[88], self.page_a2[89])
+        return self._fields(0xA2)['voltage_slope']
 
     def get_voltage_offset(self) -> float:
         '''
@@ -1188,13 +1021,26 @@ class SFP:
         Bit 7 of byte 90 is MSB, bit 0 of byte 91 is LSB. V(Offset) should be set to
         0 for "internally calibrated" devices.
         '''
-        return signed_twos_complement_to_int(self.page_a2[90], self.page_a2[91])
+        return self._fields(0xA2)['voltage_offset']
+
+    def get_calibration(self) -> CalibrationCoefficients:
+        '''
+        Returns the decoded calibration constants, taken from the
+        decoded page 0xA2 again only when _fields() decoded it again.
+        '''
+        fields = self._fields(0xA2)
+
+        if fields is not self._calibration_key:
+            self._calibration = CalibrationCoefficients(fields)
+            self._calibration_key = fields
+
+        return self._calibration
 
     def get_reserved_a2_bytes(self) -> int:
-        return f'{self.page_a2[92:94 + 1]}'
+        return f'{self._fields(0xA2)["reserved_a2_bytes"]}'
 
     def get_pagea2_checksum(self) -> str:
-        return f'{hex(self.page_a2[95])}'
+        return f'{hex(self._fields(0xA2)["pagea2_checksum"])}'
 
     def _real_time_measurement_helper(self, msb_addr, lsb_addr, measurement_slope: float, measurement_offset: float) -> float:
         msb = self.page_a2[msb_addr]
@@ -1221,31 +1067,28 @@ class SFP:
         lsb = self.page_a2[97]
 
         converted_val = bytes_to_unsigned_decimal(msb, lsb)
+        calibration = self.get_calibration()
 
-        return Decimal(self.get_temp_slope()) * Decimal(converted_val) + Decimal(self.get_temp_offset())
+        # Floats from the fast conversion backend, Decimals in exact mode
+        return calibration.temp_slope * converted_val + calibration.temp_offset
 
     def get_vcc(self) -> float:
         '''
         Returns the measured supply voltage in transceiver.
         '''
+        calibration = self.get_calibration()
 
-        slope = self.get_voltage_slope()
-        offset = self.get_voltage_offset()
-
-        return self._real_time_measurement_helper(98, 99, slope, offset)
+        return self._real_time_measurement_helper(98, 99, calibration.voltage_slope, calibration.voltage_offset)
 
     def get_tx_bias_current(self) -> float:
-        
-        slope = self.get_tx_i_slope()
-        offset = self.get_tx_i_offset()
+        calibration = self.get_calibration()
 
-        return self._real_time_measurement_helper(100, 101, slope, offset)
+        return self._real_time_measurement_helper(100, 101, calibration.tx_i_slope, calibration.tx_i_offset)
 
     def get_tx_power(self) -> float:
-        slope = self.get_tx_pwr_slope()
-        offset = self.get_tx_pwr_offset()
+        calibration = self.get_calibration()
 
-        return self._real_time_measurement_helper(102, 103, slope, offset)
+        return self._real_time_measurement_helper(102, 103, calibration.tx_pwr_slope, calibration.tx_pwr_offset)
 
     def get_rx_power(self):
         msb = self.page_a2[104]
@@ -1263,18 +1106,56 @@ class SFP:
             raise Exception("ERROR:SFP::get_rx_pwr() - Unknown calibration type")
 
 
+    @_decoded_field('page_a2', FLAG_START, FLAG_START + FLAG_LENGTH - 1)
+    def get_ddm_flags(self) -> int:
+        '''
+        Returns the status/control byte (110) and the alarm (112-113)
+        and warning (116-117) flags the module set itself, decoded by
+        sff8472_flags.decode_flags(). Nonzero alarm or warning bits
+        mean a measurement is past one of its thresholds.
+        '''
+        return decode_flags(self.page_a2[FLAG_START:FLAG_START + FLAG_LENGTH])
+
+    def decode_all(self) -> dict:
+        '''
+        Decodes every field of the memory map in one pass. Returns a
+        dict from field name (the getter name without 'get_') to its
+        value, in memory map order.
+        '''
+        fields = {}
+
+        # Both pages are decoded once for the whole pass
+        self._pinned_fields = {0xA0: self._fields(0xA0), 0xA2: self._fields(0xA2)}
+
+        try:
+            for getter_name in DECODED_FIELDS:
+                # Receiver power needs the calibration type, which is only
+                # known once diagnostic monitoring type was decoded
+                if getter_name == 'calculate_rx_power_uw' and not hasattr(self, '_calibration_type'):
+                    continue
+
+                key = getter_name[len('get_'):] if getter_name.startswith('get_') else getter_name
+                fields[key] = getattr(self, getter_name)()
+        finally:
+            self._pinned_fields = None
+
+        return fields
+
+# Getters run by SFP.decode_all(), in the order they are defined. Raw
+# page access, get_calibration() (all of its values have their own
+# getters) and get_rx_power() are left out.
+DECODED_FIELDS = tuple(
+    name for name in vars(SFP)
+    if name.startswith(('get_', 'calculate_'))
+    and name not in ('get_page', 'get_page_a0', 'get_page_a2', 'get_calibration', 'get_rx_power')
+)
+
 # Test function, can remove later
 def read_sfp_bin_file(filename: str) -> List[int]:
 
-    memory = []
+    # One read, iterating the bytes object gives the byte values
     with open(filename, 'rb') as file:
-        byte = file.read(1)
-        while byte != b"":
-            # We are reading a Byte object, and we can
-            # access the actual value by indexing it at
-            # 0
-            memory.append(byte[0])
-            byte = file.read(1)
+        memory = list(file.read())
 
     if len(memory) < 256:
         for _ in range(256 - len(memory)):
@@ -0,0 +1,357 @@
+# Single file, append-only archive of SFP memory dumps.
+#
+# Layout of the archive file:
+#
+#   header      64 bytes, !8sHH52x (magic, version, record size)
+#   records     512 bytes each, page 0xA0 followed by page 0xA2
+#
+# Record n starts at HEADER.size + n * RECORD_SIZE. The archive is read
+# through mmap, sfp() builds an SFP whose pages are memoryview slices of
+# the mapping, so nothing is copied.
+#
+# Next to it, <archive>.idx holds one fixed size entry per record:
+#
+#   !IQ16s16s16s    (record number, timestamp in ms, vendor name,
+#                    part number, serial number)
+#
+# The index is loaded into memory on open and can be rebuilt from the
+# records (losing the timestamps) with rebuild_index() if it is lost.
+
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from modules.core.sfp import SFP
+
+HEADER = struct.Struct('!8sHH52x')
+INDEX_ENTRY = struct.Struct('!IQ16s16s16s')
+
+MAGIC = b'SFPARCH1'
+VERSION = 1
+
+PAGE_SIZE = 256
+RECORD_SIZE = 2 * PAGE_SIZE
+
+# Page 0xA0 identity fields used as index keys
+VENDOR_NAME = slice(20, 36)
+VENDOR_PART_NUMBER = slice(40, 56)
+VENDOR_SERIAL_NUMBER = slice(68, 84)
+
+
+class IndexEntry(NamedTuple):
+    record: int
+    timestamp_ms: int
+    vendor_name: str
+    part_number: str
+    serial_number: str
+
+
+def _identity_field(raw: bytes) -> str:
+    return raw.decode('latin-1').rstrip(' \x00')
+
+def _identity(page_a0) -> Tuple[bytes, bytes, bytes]:
+    return bytes(page_a0[VENDOR_NAME]), bytes(page_a0[VENDOR_PART_NUMBER]), bytes(page_a0[VENDOR_SERIAL_NUMBER])
+
+def _as_page_bytes(page: Sequence[int]) -> bytes:
+    page = bytes(page)
+
+    if len(page) > PAGE_SIZE:
+        raise ValueError(f"Page holds {len(page)} bytes, expected at most {PAGE_SIZE}")
+
+    # Short dumps are padded with zeros, like read_sfp_bin_file()
+    return page.ljust(PAGE_SIZE, b'\x00')
+
+
+class SFPArchive:
+
+    def __init__(self, filename: str, writable: bool = False):
+        '''
+        Opens the archive in filename. With writable=True it is
+        created if it does not exist yet.
+        '''
+        self.filename = filename
+        self.index_filename = filename + '.idx'
+        self.writable = writable
+
+        if writable and not os.path.exists(filename):
+            with open(filename, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE))
+
+            open(self.index_filename, 'wb').close()
+
+        self._file = open(filename, 'r+b' if writable else 'rb')
+
+        magic, version, record_size = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC or record_size != RECORD_SIZE:
+            self._file.close()
+            raise ValueError(f"{filename} is not an SFP archive")
+        if version > VERSION:
+            self._file.close()
+            raise ValueError(f"{filename} is archive version {version}, only {VERSION} is supported")
+
+        self._file.seek(0, os.SEEK_END)
+        self._count = (self._file.tell() - HEADER.size) // RECORD_SIZE
+
+        if writable:
+            # Cut off a torn last record (crash while appending)
+            self._truncate_to_records()
+
+        self._map = None
+        self._mapped_count = 0
+
+        self.entries: List[IndexEntry] = []
+        self._by_identity: Dict[Tuple[str, str, str], List[IndexEntry]] = {}
+        self._load_index()
+
+        self._index_file = open(self.index_filename, 'ab') if writable else None
+
+        if writable:
+            self._truncate_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        # The mapping itself is released once no SFP views it anymore
+        self._map = None
+
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+        self._file.close()
+
+    def _truncate_to_records(self) -> None:
+        # Appends go right after the last whole record, never after
+        # the leftovers of a partial write
+        self._file.seek(HEADER.size + self._count * RECORD_SIZE)
+        self._file.truncate()
+
+    def _truncate_index(self) -> None:
+        # Same for the index, an entry appended after a torn one would
+        # be misaligned, and so would every entry after it
+        end = self._index_file.seek(0, os.SEEK_END)
+        self._index_file.truncate(end - end % INDEX_ENTRY.size)
+
+    def _add_entry(self, entry: IndexEntry) -> None:
+        self.entries.append(entry)
+        key = (entry.vendor_name, entry.part_number, entry.serial_number)
+        self._by_identity.setdefault(key, []).append(entry)
+
+    def _load_index(self) -> None:
+        if not os.path.exists(self.index_filename):
+            return
+
+        with open(self.index_filename, 'rb') as file:
+            data = file.read()
+
+        # A torn last entry (crash while appending) is ignored
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+
+        for record, timestamp_ms, vendor, part, serial in INDEX_ENTRY.iter_unpack(data[:usable]):
+            if record < self._count:
+                self._add_entry(IndexEntry(record, timestamp_ms, _identity_field(vendor),
+                                           _identity_field(part), _identity_field(serial)))
+
+    def rebuild_index(self) -> None:
+        '''
+        Rewrites the index from the records. Timestamps are lost and
+        set to 0.
+        '''
+        if not self.writable:
+            raise PermissionError("Archive was opened read only")
+
+        self.entries = []
+        self._by_identity = {}
+        self._index_file.close()
+
+        with open(self.index_filename, 'wb') as file:
+            for record in range(self._count):
+                vendor, part, serial = _identity(self.record(record)[:PAGE_SIZE])
+                file.write(INDEX_ENTRY.pack(record, 0, vendor, part, serial))
+                self._add_entry(IndexEntry(record, 0, _identity_field(vendor),
+                                           _identity_field(part), _identity_field(serial)))
+
+        self._index_file = open(self.index_filename, 'ab')
+
+    def append(self, page_a0: Sequence[int], page_a2: Sequence[int], timestamp_ms: Optional[int] = None) -> int:
+        '''
+        Appends one dump and returns its record number.
+        '''
+        return self.append_many([(page_a0, page_a2, timestamp_ms)])[0]
+
+    def append_many(self, dumps: Iterable[Tuple[Sequence[int], Sequence[int], Optional[int]]]) -> List[int]:
+        '''
+        Appends (page_a0, page_a2, timestamp_ms) dumps with one write to
+        the archive and one to the index. Returns their record numbers.
+        '''
+        if not self.writable:
+            raise PermissionError("Archive was opened read only")
+
+        records = bytearray()
+        index = bytearray()
+        entries = []
+        now_ms = int(time.time() * 1000)
+
+        for page_a0, page_a2, timestamp_ms in dumps:
+            page_a0 = _as_page_bytes(page_a0)
+            page_a2 = _as_page_bytes(page_a2)
+            timestamp_ms = now_ms if timestamp_ms is None else timestamp_ms
+
+            record = self._count + len(entries)
+            vendor, part, serial = _identity(page_a0)
+
+            records += page_a0
+            records += page_a2
+            index += INDEX_ENTRY.pack(record, timestamp_ms, vendor, part, serial)
+            entries.append(IndexEntry(record, timestamp_ms, _identity_field(vendor),
+                                      _identity_field(part), _identity_field(serial)))
+
+        # Records first, an index entry never points past the archive
+        self._truncate_to_records()
+        self._file.write(records)
+        self._file.flush()
+        self._truncate_index()
+        self._index_file.write(index)
+        self._index_file.flush()
+
+        self._count += len(entries)
+        for entry in entries:
+            self._add_entry(entry)
+
+        return [entry.record for entry in entries]
+
+    def record(self, record: int) -> memoryview:
+        '''
+        Returns the 512 bytes of a record as a view of the mapped file.
+        '''
+        if not 0 <= record < self._count:
+            raise IndexError(f"Record {record} not in archive of {self._count} records")
+
+        if record >= self._mapped_count:
+            # Map again to see records appended since. Views of the old
+            # mapping keep it alive, so it is not closed here
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_count = self._count
+
+        start = HEADER.size + record * RECORD_SIZE
+
+        return memoryview(self._map)[start:start + RECORD_SIZE]
+
+    def sfp(self, record: int) -> SFP:
+        '''
+        Returns an SFP whose pages are views of the record.
+        '''
+        view = self.record(record)
+
+        return SFP(view[:PAGE_SIZE], view[PAGE_SIZE:])
+
+    def find(self, vendor_name: Optional[str] = None, part_number: Optional[str] = None,
+             serial_number: Optional[str] = None, since_ms: Optional[int] = None,
+             until_ms: Optional[int] = None) -> List[IndexEntry]:
+        '''
+        Returns the index entries matching every given key, oldest
+        first. Names are compared without trailing spaces.
+        '''
+        if vendor_name is not None and part_number is not None and serial_number is not None:
+            candidates = self._by_identity.get((vendor_name, part_number, serial_number), [])
+        else:
+            candidates = self.entries
+
+        return [
+            entry for entry in candidates
+            if (vendor_name is None or entry.vendor_name == vendor_name)
+            and (part_number is None or entry.part_number == part_number)
+            and (serial_number is None or entry.serial_number == serial_number)
+            and (since_ms is None or entry.timestamp_ms >= since_ms)
+            and (until_ms is None or entry.timestamp_ms < until_ms)
+        ]
+
+
+def import_bin_files(archive: SFPArchive, filenames: Iterable[str]) -> int:
+    '''
+    Imports .bin dumps, page 0xA0 alone (up to 256 bytes) or pages 0xA0
+    and 0xA2 back to back (512 bytes). The file modification time is
+    used as timestamp. Returns the number of records added.
+    '''
+    dumps = []
+
+    for filename in filenames:
+        with open(filename, 'rb') as file:
+            data = file.read()
+
+        if len(data) > RECORD_SIZE:
+            print(f"WARNING: Skipping {filename}, {len(data)} bytes is too big for a dump")
+            continue
+
+        timestamp_ms = int(os.path.getmtime(filename) * 1000)
+        dumps.append((data[:PAGE_SIZE], data[PAGE_SIZE:], timestamp_ms))
+
+    return len(archive.append_many(dumps))
+
+def import_page_files(archive: SFPArchive, a0_filename: str, a2_filename: str) -> int:
+    '''
+    Imports a0.txt/a2.txt style files, one comma separated page per
+    line, line n of both files being the same module. Returns the
+    number of records added.
+    '''
+    def pages(filename):
+        with open(filename) as file:
+            return [bytes(int(val) for val in line.split(',')) for line in file if line.strip()]
+
+    a0_pages = pages(a0_filename)
+    a2_pages = pages(a2_filename)
+
+    if len(a0_pages) != len(a2_pages):
+        raise ValueError(f"{a0_filename} has {len(a0_pages)} pages but {a2_filename} has {len(a2_pages)}")
+
+    timestamp_ms = int(os.path.getmtime(a0_filename) * 1000)
+
+    return len(archive.append_many((a0, a2, timestamp_ms) for a0, a2 in zip(a0_pages, a2_pages)))
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='SFP dump archive')
+    parser.add_argument('archive', help='archive file, created if needed')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    bin_parser = commands.add_parser('import-bin', help='import .bin dump files')
+    bin_parser.add_argument('files', nargs='+')
+
+    txt_parser = commands.add_parser('import-txt', help='import a0.txt/a2.txt style files')
+    txt_parser.add_argument('a0_file')
+    txt_parser.add_argument('a2_file')
+
+    find_parser = commands.add_parser('find', help='list records')
+    find_parser.add_argument('--vendor')
+    find_parser.add_argument('--part')
+    find_parser.add_argument('--serial')
+
+    commands.add_parser('reindex', help='rebuild the index from the records')
+
+    args = parser.parse_args()
+
+    with SFPArchive(args.archive, writable=args.command != 'find') as archive:
+        if args.command == 'import-bin':
+            print(f'Imported {import_bin_files(archive, args.files)} dumps, {len(archive)} in archive')
+        elif args.command == 'import-txt':
+            print(f'Imported {import_page_files(archive, args.a0_file, args.a2_file)} dumps, {len(archive)} in archive')
+        elif args.command == 'reindex':
+            archive.rebuild_index()
+            print(f'Indexed {len(archive)} records')
+        else:
+            for entry in archive.find(args.vendor, args.part, args.serial):
+                print(f'{entry.record}\t{entry.timestamp_ms}\t{entry.vendor_name}\t{entry.part_number}\t{entry.serial_number}')
+
+if __name__ == '__main__':
+    main()
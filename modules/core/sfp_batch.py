@@ -0,0 +1,184 @@
+# Batch decoding of many cloned SFP memory images at once.
+#
+# Auditing the page_a0/page_a2 tables one SFP object at a time spends
+# nearly all of its time in Python getters. decode_batch() takes the
+# pages of N modules as (N, 256) uint8 arrays and computes the checksums,
+# the calibrated real time measurements, the alarm/warning thresholds,
+# the wavelength and the identifier/connector/encoding codes as NumPy
+# column operations. The result is columnar: a dict from field name to
+# an array holding that field for every module.
+#
+# Every column matches the SFP getter of the same name with the fast
+# (float) conversion backend, see verify_batch().
+
+from typing import Dict, Iterable, Sequence
+
+import numpy as np
+
+from modules.core.sff8472_fields import THRESHOLD_FIELDS
+from modules.core.sfp import SFP
+
+# Calibration types as in SFP.get_diagnostic_monitoring_type(), the
+# externally calibrated bit wins when both are set
+_INTERNALLY_CALIBRATED = 0x20
+_EXTERNALLY_CALIBRATED = 0x10
+
+
+def _as_pages(pages) -> np.ndarray:
+    pages = np.asarray(pages, dtype=np.uint8)
+
+    if pages.ndim != 2 or pages.shape[1] != 256:
+        raise ValueError(f"Expected an (N, 256) array of pages, got shape {pages.shape}")
+
+    return pages
+
+def _words(pages: np.ndarray, start: int, end: int) -> np.ndarray:
+    '''
+    Big endian 16 bit words of bytes [start, end) as an (N, words)
+    uint16 array.
+    '''
+    return np.ascontiguousarray(pages[:, start:end]).view('>u2').astype(np.uint16)
+
+def _word(pages: np.ndarray, msb: int) -> np.ndarray:
+    return pages[:, msb].astype(np.uint16) << 8 | pages[:, msb + 1]
+
+def _checksum(pages: np.ndarray, start: int, end: int) -> np.ndarray:
+    return (pages[:, start:end + 1].sum(axis=1, dtype=np.uint32) & 0xFF).astype(np.uint8)
+
+def decode_batch(page_a0, page_a2) -> Dict[str, np.ndarray]:
+    '''
+    Decodes N modules from their (N, 256) page 0xA0 and 0xA2 arrays.
+    Returns a dict of columns, one value per module.
+    '''
+    a0 = _as_pages(page_a0)
+    a2 = _as_pages(page_a2)
+
+    if a0.shape[0] != a2.shape[0]:
+        raise ValueError(f"Got {a0.shape[0]} 0xA0 pages but {a2.shape[0]} 0xA2 pages")
+
+    columns = {
+        'identifier':           a0[:, 0].copy(),
+        'ext_identifier':       a0[:, 1].copy(),
+        'connector_type':       a0[:, 2].copy(),
+        'encoding':             a0[:, 11].copy(),
+        'rate_identifier':      a0[:, 13].copy(),
+        'wavelength':           _word(a0, 60),
+        'cc_base':              a0[:, 63].copy(),
+        'calculated_cc_base':   _checksum(a0, 0, 62),
+        'cc_ext':               a0[:, 95].copy(),
+        'calculated_cc_ext':    _checksum(a0, 64, 94),
+        'pagea2_checksum':      a2[:, 95].copy(),
+        'calculated_pagea2_checksum': _checksum(a2, 0, 94),
+    }
+
+    thresholds = _words(a2, 0, 56)
+    for idx, name in enumerate(THRESHOLD_FIELDS):
+        columns[name] = thresholds[:, idx]
+
+    # Calibration constants, bytes 56-91
+    rx_pwr = np.ascontiguousarray(a2[:, 56:76]).view('>f4').astype(np.float64)
+    fixed = _words(a2, 76, 92)
+    slopes = fixed[:, 0::2] / 256
+    offsets = fixed[:, 1::2].view(np.int16).astype(np.float64)
+
+    for idx, name in enumerate(('tx_i', 'tx_pwr', 'temp', 'voltage')):
+        columns[f'{name}_slope'] = slopes[:, idx]
+        columns[f'{name}_offset'] = offsets[:, idx]
+
+    # Real time A/D values, bytes 96-105
+    live = _words(a2, 96, 106).astype(np.float64)
+
+    columns['temperature'] = slopes[:, 2] * (live[:, 0] / 256) + offsets[:, 2]
+    columns['vcc'] = slopes[:, 3] * live[:, 1] + offsets[:, 3]
+    columns['tx_bias_current'] = slopes[:, 0] * live[:, 2] + offsets[:, 0]
+    columns['tx_power'] = slopes[:, 1] * live[:, 3] + offsets[:, 1]
+
+    # Same formula as SFP.calculate_rx_power_uw()
+    rx_raw = live[:, 4]
+    monitoring = a0[:, 92]
+    external = rx_pwr[:, 0] * rx_raw + rx_pwr[:, 1] * rx_raw + \
+               rx_pwr[:, 2] * rx_raw + rx_pwr[:, 2] * rx_raw + \
+               rx_pwr[:, 3] * rx_raw + rx_pwr[:, 4]
+
+    columns['rx_power_uw'] = np.select(
+        [monitoring & _EXTERNALLY_CALIBRATED != 0, monitoring & _INTERNALLY_CALIBRATED != 0],
+        [external, rx_raw],
+        default=-1.0
+    )
+
+    return columns
+
+def pages_from_rows(rows: Iterable[Sequence[int]]) -> np.ndarray:
+    '''
+    Builds an (N, 256) page array from rows of the page_a0/page_a2
+    tables, using the last 256 columns of each row (the id column
+    comes first).
+    '''
+    return _as_pages([row[-256:] for row in rows])
+
+def load_page_file(filename: str) -> np.ndarray:
+    '''
+    Loads an a0.txt/a2.txt style file, one comma separated page per
+    line.
+    '''
+    return _as_pages(np.loadtxt(filename, delimiter=',', dtype=np.uint8, ndmin=2))
+
+def verify_batch(page_a0, page_a2, columns: Dict[str, np.ndarray]) -> None:
+    '''
+    Compares the batch columns with the SFP getters for every module.
+    Raises AssertionError on the first mismatch.
+    '''
+    for idx, (a0, a2) in enumerate(zip(page_a0, page_a2)):
+        sfp = SFP([int(val) for val in a0], [int(val) for val in a2])
+        sfp.get_diagnostic_monitoring_type()
+
+        expected = {
+            'wavelength':                   sfp.get_wavelength(),
+            'calculated_cc_base':           sfp.calculate_cc_base(),
+            'calculated_cc_ext':            sfp.calculate_cc_ext(),
+            'calculated_pagea2_checksum':   sfp.calculate_pagea2_checksum(),
+            'temperature':                  sfp.get_temperature(),
+            'vcc':                          sfp.get_vcc(),
+            'tx_bias_current':              sfp.get_tx_bias_current(),
+            'tx_power':                     sfp.get_tx_power(),
+        }
+
+        for name in THRESHOLD_FIELDS:
+            expected[name] = getattr(sfp, f'get_{name}')()
+
+        # Modules without a calibration type make the SFP path raise
+        if getattr(sfp, '_calibration_type', None) is not None:
+            expected['rx_power_uw'] = sfp.calculate_rx_power_uw()
+
+        for name, value in expected.items():
+            got = columns[name][idx]
+            assert got == value or (np.isnan(got) and np.isnan(value)), \
+                f'Module {idx}: {name} = {got} in the batch, {value} from SFP'
+
+if __name__ == '__main__':
+    import time
+
+    a0 = load_page_file('a0.txt')
+    a2 = load_page_file('a2.txt')
+
+    # Scale the recorded module up to a table of clones with varying
+    # live values and calibration constants
+    count = 20000
+    rng = np.random.default_rng(0)
+    page_a0 = np.repeat(a0[:1], count, axis=0)
+    page_a2 = np.repeat(a2[:1], count, axis=0)
+    page_a2[:, 76:106] = rng.integers(0, 256, size=(count, 30), dtype=np.uint8)
+    page_a0[:, 92] = rng.choice([0x00, 0x20, 0x10, 0x68], size=count)
+
+    start = time.perf_counter()
+    columns = decode_batch(page_a0, page_a2)
+    batch_time = time.perf_counter() - start
+
+    sample = 500
+    start = time.perf_counter()
+    verify_batch(page_a0[:sample], page_a2[:sample], columns)
+    object_time = (time.perf_counter() - start) * count / sample
+
+    print(f'Batch decoded {count} modules in {batch_time * 1000:.1f} ms')
+    print(f'SFP objects would take about {object_time * 1000:.0f} ms, '
+          f'{object_time / batch_time:.0f}x slower')
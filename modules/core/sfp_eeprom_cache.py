@@ -0,0 +1,247 @@
+import time
+from typing import Dict, List
+
+from modules.core.sff8472_flags import FLAG_LENGTH, FLAG_REGISTERS, FLAG_START
+from modules.core.sfp_i2c_bus import SFP_I2C_Bus
+
+
+class SFP_EEPROM_Cache:
+    '''
+    Caching front end for SFP_I2C_Bus. Keeps a 256 byte image of pages
+    0xA0 and 0xA2 and only goes to the bus for registers that have never
+    been read or whose time to live has expired.
+
+    Identification (0xA0) and threshold/calibration (0xA2 bytes 0-95)
+    data never changes while a module is seated, so those registers
+    never expire. Only the live diagnostic region of 0xA2 is given a
+    short TTL. The whole image is dropped when a module swap is detected.
+
+    Exposes the same read methods as SFP_I2C_Bus, anything else
+    (end_communication, last_dump_bytes_per_sec, ...) is passed through
+    to the wrapped bus.
+    '''
+
+    # (page address, first register, last register) of regions that
+    # change while the module is seated. 0xA2 96-109 are the A/D
+    # readings, 110 is status/control and 112-119 are the alarm and
+    # warning flags.
+    LIVE_REGIONS = [(SFP_I2C_Bus.DDM_ADDR, 96, 119)]
+
+    # Seconds a live register may be served from the cache
+    DEFAULT_LIVE_TTL = 0.5
+
+    # Registers of page 0xA0 compared to detect that the module was
+    # swapped: CC_BASE, the vendor serial number and CC_EXT
+    SWAP_CHECK_REGISTERS = [63] + list(range(68, 83 + 1)) + [95]
+
+    # Minimum number of seconds between two swap checks
+    DEFAULT_SWAP_CHECK_INTERVAL = 1.0
+
+    def __init__(self, bus: SFP_I2C_Bus, live_ttl: float = DEFAULT_LIVE_TTL,
+                 swap_check_interval: float = DEFAULT_SWAP_CHECK_INTERVAL):
+        self.bus = bus
+        self.live_ttl = live_ttl
+        self.swap_check_interval = swap_check_interval
+
+        # Registers served from the image vs. read from the bus
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._ttls: Dict[int, List[float]] = {}
+        for page in (SFP_I2C_Bus.INFO_ADDR, SFP_I2C_Bus.DDM_ADDR):
+            self._ttls[page] = [float('inf')] * 256
+
+        for page, first, last in self.LIVE_REGIONS:
+            for reg in range(first, last + 1):
+                self._ttls[page][reg] = live_ttl
+
+        self._swap_signature = None
+        self._last_swap_check = float('-inf')
+
+        self.invalidate()
+
+    def __getattr__(self, name):
+        # Only called for attributes the cache itself does not define
+        if name == 'bus':
+            raise AttributeError(name)
+
+        return getattr(self.bus, name)
+
+    def invalidate(self) -> None:
+        '''
+        Drops every cached register, the next read of each page goes to
+        the bus.
+        '''
+        self._images: Dict[int, List[int]] = {}
+        self._expires: Dict[int, List[float]] = {}
+
+        for page in self._ttls:
+            self._images[page] = [0] * 256
+            self._expires[page] = [float('-inf')] * 256
+
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': hit_rate,
+            'invalidations': self.invalidations,
+        }
+
+    def check_module_swap(self, force: bool = False) -> bool:
+        '''
+        Re-reads the identity registers of page 0xA0 (at most once every
+        swap_check_interval seconds unless force is set) and invalidates
+        the cache if they differ from the last check. Returns True if a
+        swap was detected.
+        '''
+        now = time.monotonic()
+        if not force and now - self._last_swap_check < self.swap_check_interval:
+            return False
+
+        self._last_swap_check = now
+
+        try:
+            signature = self.bus.read_registers_from_page(self.SWAP_CHECK_REGISTERS, SFP_I2C_Bus.INFO_ADDR)
+        except Exception:
+            # Module is most likely unplugged, nothing cached is valid
+            self._swap_signature = None
+            self.invalidate()
+            raise
+
+        swapped = self._swap_signature is not None and signature != self._swap_signature
+        if swapped:
+            self.invalidate()
+
+        self._swap_signature = signature
+
+        return swapped
+
+    def _store(self, page_num: int, registers: List[int], values: List[int], now: float) -> None:
+        image = self._images[page_num]
+        expires = self._expires[page_num]
+        ttls = self._ttls[page_num]
+
+        for reg, value in zip(registers, values):
+            image[reg] = value
+            expires[reg] = now + ttls[reg]
+
+    def read_cached(self, registers: List[int], page_num: int):
+        '''
+        Returns the values of the registers if every one of them can be
+        served from the cache, None otherwise. Never touches the bus, so
+        it also returns None once a swap check is due: the read on the
+        bus checks for a swap before anything cached is served again.
+        '''
+        if page_num not in self._images:
+            return None
+
+        now = time.monotonic()
+
+        if now - self._last_swap_check >= self.swap_check_interval:
+            return None
+        expires = self._expires[page_num]
+
+        for reg in registers:
+            if expires[reg] <= now:
+                return None
+
+        image = self._images[page_num]
+        self.hits += len(registers)
+
+        return [image[reg] for reg in registers]
+
+    def read_registers_from_page(self, registers: List[int], page_num: int) -> List[int]:
+        return self._read(registers, page_num, fresh=False)
+
+    def read_fresh(self, registers: List[int], page_num: int) -> List[int]:
+        '''
+        Like read_registers_from_page(), but live registers always come
+        from the bus. For samplers that run faster than the live TTL,
+        which would otherwise see the same values several times.
+        Registers that never change while the module is seated are
+        still served from the image.
+        '''
+        return self._read(registers, page_num, fresh=True)
+
+    def _read(self, registers: List[int], page_num: int, fresh: bool) -> List[int]:
+        if page_num not in self._images:
+            raise ValueError("Page number not supported")
+
+        self.check_module_swap()
+
+        registers = list(registers)
+        now = time.monotonic()
+        expires = self._expires[page_num]
+
+        if fresh:
+            ttls = self._ttls[page_num]
+            stale = [reg for reg in registers if expires[reg] <= now or ttls[reg] != float('inf')]
+        else:
+            stale = [reg for reg in registers if expires[reg] <= now]
+
+        if stale:
+            values = self.bus.read_registers_from_page(stale, page_num)
+            self._store(page_num, stale, values, now)
+
+        self.misses += len(stale)
+        self.hits += len(registers) - len(stale)
+
+        image = self._images[page_num]
+
+        return [image[reg] for reg in registers]
+
+    def _dump(self, page_num: int, chunk_size: int) -> List[int]:
+        self.check_module_swap()
+
+        now = time.monotonic()
+        expires = self._expires[page_num]
+
+        if all(expires[reg] <= now for reg in range(256)):
+            # Cold page, let the bus pull it in with a bulk dump
+            values = self.bus._dump(page_num, 0xFF, chunk_size)
+            self._store(page_num, list(range(256)), values, now)
+            self.misses += 256
+
+            return list(values)
+
+        return self.read_registers_from_page(range(256), page_num)
+
+    def dumpA0(self, chunk_size: int = SFP_I2C_Bus.DEFAULT_CHUNK_SIZE) -> List[int]:
+        return self._dump(SFP_I2C_Bus.INFO_ADDR, chunk_size)
+
+    def dumpA2(self, chunk_size: int = SFP_I2C_Bus.DEFAULT_CHUNK_SIZE) -> List[int]:
+        return self._dump(SFP_I2C_Bus.DDM_ADDR, chunk_size)
+
+    def read_ddm_flags(self) -> List[int]:
+        '''
+        Always reads the flags from the bus, they are polled to notice
+        changes. When they changed, the rest of the live region is
+        expired so the next read of the measurements is fresh.
+        '''
+        page_num = SFP_I2C_Bus.DDM_ADDR
+        values = self.bus.read_ddm_flags()
+        now = time.monotonic()
+        image = self._images[page_num]
+
+        if image[FLAG_START:FLAG_START + FLAG_LENGTH] != list(values):
+            expires = self._expires[page_num]
+            for page, first, last in self.LIVE_REGIONS:
+                if page == page_num:
+                    expires[first:last + 1] = [float('-inf')] * (last + 1 - first)
+
+        self._store(page_num, FLAG_REGISTERS, values, now)
+        self.misses += FLAG_LENGTH
+
+        return values
+
+    def read_param_registers(self) -> List[int]:
+        return self.read_registers_from_page(range(96, 105 + 1), SFP_I2C_Bus.INFO_ADDR)
+
+    def read_info_registers(self, registers: List[int]) -> List[int]:
+        return self.read_registers_from_page(registers, SFP_I2C_Bus.INFO_ADDR)
@@ -1,5 +1,8 @@
-from typing import List
+from typing import Iterable, List, Tuple
+import time
 import smbus2
+from smbus2 import i2c_msg
+from modules.core.sff8472_flags import FLAG_START, FLAG_LENGTH
 
 class SFP_I2C_Bus:
 
@@ -14,20 +17,82 @@ class SFP_I2C_Bus:
     # So we get 101 0001, which is 0x51
     DDM_ADDR = 0x51
 
+    # Largest transfer a single SMBus block read can return
+    SMBUS_BLOCK_MAX = 32
+
+    # Bytes requested per transaction when dumping a page. 256 pulls
+    # a whole page in one combined write/read transfer.
+    DEFAULT_CHUNK_SIZE = 256
+
+    # Largest hole between two requested registers that is read through
+    # rather than split into a new transaction. A few wasted bytes are
+    # much cheaper than another I2C start/address/stop sequence.
+    DEFAULT_GAP_THRESHOLD = 4
+
     def __init__(self):
         self.bus = smbus2.SMBus(self.DEVICE_BUS)
 
+        # Throughput of the most recent page dump, used to tune
+        # chunk_size per module vendor
+        self.last_dump_bytes_per_sec: float = 0.0
+        self.last_dump_bulk: bool = False
+
+    def _read_chunk(self, addr: int, start: int, length: int) -> List[int]:
+        '''
+        Reads `length` consecutive registers beginning at `start` in one
+        transaction. Lengths up to 32 use an SMBus block read, anything
+        larger uses a combined i2c_rdwr write/read message pair.
+        '''
+        if length <= self.SMBUS_BLOCK_MAX:
+            return self.bus.read_i2c_block_data(addr, start, length)
+
+        write = i2c_msg.write(addr, [start])
+        read = i2c_msg.read(addr, length)
+        self.bus.i2c_rdwr(write, read)
+
+        return list(read)
+
+    def _read_block(self, addr: int, start: int, length: int, chunk_size: int) -> List[int]:
+        '''
+        Reads `length` consecutive registers beginning at `start`, split
+        into transactions of at most `chunk_size` bytes.
+        '''
+        values = []
+
+        for offset in range(start, start + length, chunk_size):
+            count = min(chunk_size, start + length - offset)
+            values.extend(self._read_chunk(addr, offset, count))
+
+        return values
 
-    def _dump(self, addr: int, max_addr: int) -> List[int]:
+    def _dump_bytewise(self, addr: int, max_addr: int) -> List[int]:
+        '''
+        Original dump path, one read_byte_data followed by sequential
+        read_byte calls. Slow, but works on modules that reject block reads.
+        '''
+        values = [self.bus.read_byte_data(addr, 0)]
+
+        for i in range(1, max_addr + 1):
+            values.append(self.bus.read_byte(addr))
+
+        return values
+
+    def _dump(self, addr: int, max_addr: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[int]:
         values = []
+        start_time = time.perf_counter()
+        self.last_dump_bulk = chunk_size > 1
 
         try:
-            read_value = self.bus.read_byte_data(addr, 0)
-            values.append(read_value)
+            if self.last_dump_bulk:
+                try:
+                    values = self._read_block(addr, 0, max_addr + 1, chunk_size)
+                except OSError as ex:
+                    print(f"WARNING::SFP_I2C_BUS::_dump() block read of {hex(addr)} rejected, falling back to single bytes")
+                    print(ex)
+                    self.last_dump_bulk = False
 
-            for i in range(1, max_addr + 1):
-                read_value = self.bus.read_byte(addr)
-                values.append(read_value)
+            if not self.last_dump_bulk:
+                values = self._dump_bytewise(addr, max_addr)
 
         except Exception as ex:
             print(f"ERROR::SFP_I2C_BUS::_dump() trying to read from {hex(addr)}")
@@ -36,16 +101,27 @@ class SFP_I2C_Bus:
 
             raise Exception("Remote I/O error communicating with SFP")
 
+        elapsed = time.perf_counter() - start_time
+        self.last_dump_bytes_per_sec = len(values) / elapsed if elapsed > 0 else 0.0
+
         #print(f"Received {len(values)} values from SFP")
         #print(f"_dump() OK, got {values}")
 
         return values
 
-    def dumpA0(self) -> List[int]:
-        return self._dump(self.INFO_ADDR, 0xFF)
+    def dumpA0(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[int]:
+        '''
+        Dumps page 0xA0. chunk_size is the number of bytes requested per
+        I2C transaction, a chunk_size of 1 uses the single byte path.
+        '''
+        return self._dump(self.INFO_ADDR, 0xFF, chunk_size)
 
-    def dumpA2(self) -> List[int]:
-        return self._dump(self.DDM_ADDR, 0xFF)
+    def dumpA2(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[int]:
+        '''
+        Dumps page 0xA2. chunk_size is the number of bytes requested per
+        I2C transaction, a chunk_size of 1 uses the single byte path.
+        '''
+        return self._dump(self.DDM_ADDR, 0xFF, chunk_size)
 
     def read_param_registers(self) -> List[int]:
         ''' 
@@ -57,38 +133,76 @@ class SFP_I2C_Bus:
 
         return self.read_info_registers(addr)
 
-    def read_registers_from_page(self, registers: List[int], page_num: int):
+    def read_ddm_flags(self) -> List[int]:
+        '''
+        Reads the status/control byte and the alarm and warning flags,
+        addr 0xA2, registers 110->117, in a single block read.
+        sff8472_flags.decode_flags() decodes them.
+        '''
+        return self._read_chunk(self.DDM_ADDR, FLAG_START, FLAG_LENGTH)
 
-        read_values = []
+    def read_registers_from_page(self, registers: List[int], page_num: int, gap_threshold: int = DEFAULT_GAP_THRESHOLD) -> List[int]:
+        '''
+        Reads the given registers from page_num (0x50 or 0x51) and returns
+        their values in request order. Registers are coalesced into
+        contiguous runs by plan_register_reads() so each run costs a
+        single block read.
+        '''
 
         if page_num != 0x50 and page_num != 0x51:
             raise ValueError("Page number not supported")
-        else:
-            for reg_num in registers:
-                read_val = self.bus.read_byte_data(page_num, reg_num)
-                read_values.append(read_val)
 
-        return read_values
+        registers = list(registers)
+        page_values = {}
+
+        for start, length in plan_register_reads(registers, gap_threshold):
+            try:
+                run = self._read_block(page_num, start, length, self.DEFAULT_CHUNK_SIZE)
+            except OSError:
+                # Module rejected the block read, read this run one
+                # register at a time instead
+                run = [self.bus.read_byte_data(page_num, reg) for reg in range(start, start + length)]
+
+            for offset, value in enumerate(run):
+                page_values[start + offset] = value
+
+        return [page_values[reg_num] for reg_num in registers]
 
     def read_info_registers(self, registers: List[int]) -> List[int]:
         '''
         Returns a list of values read from the SFP given a list
         of values indicating register number/location.
         '''
-        vals = []
-
-        for reg in registers:
-            if reg < 0 or reg > 255:
-                raise Exception("Invalid register number. Valid register numbers are 0-255")
-            else:
-                vals.append(self.bus.read_byte_data(self.INFO_ADDR, reg))
-        
-        return vals
+        return self.read_registers_from_page(registers, self.INFO_ADDR)
 
     def end_communication(self):
         self.bus.close()
 
 
+def plan_register_reads(registers: Iterable[int], gap_threshold: int = SFP_I2C_Bus.DEFAULT_GAP_THRESHOLD) -> List[Tuple[int, int]]:
+    '''
+    Sorts and deduplicates the requested register numbers and merges
+    them into (start, length) runs. Registers separated by at most
+    gap_threshold unrequested bytes are merged into the same run.
+
+    For example, [105, 96, 97, 98, 110] with a gap threshold of 4
+    gives [(96, 3), (105, 6)].
+    '''
+    runs = []
+
+    for reg in sorted(set(registers)):
+        if reg < 0 or reg > 255:
+            raise Exception("Invalid register number. Valid register numbers are 0-255")
+
+        if runs and reg - (runs[-1][0] + runs[-1][1]) <= gap_threshold:
+            start, _ = runs[-1]
+            runs[-1] = (start, reg - start + 1)
+        else:
+            runs.append((reg, 1))
+
+    return runs
+
+
 def print_bus_dump(bus_dump: List[int], ascii: bool) -> None:
 
     # Print header
@@ -0,0 +1,308 @@
+# Fixed size, memory mapped store of the real time DDM values of page
+# 0xA2 (bytes 96-105: temperature, Vcc, TX bias, TX power, RX power).
+#
+# The file holds four rings, each overwriting its oldest record once it
+# is full, so the file never grows past its size at creation:
+#
+#   tier 0  raw samples, the five uncalibrated 16 bit A/D words
+#   tier 1  1 second rollups      min, max and mean of each word
+#   tier 2  1 minute rollups
+#   tier 3  1 hour rollups
+#
+# Layout (little endian):
+#
+#   header          64 bytes, <8sHH52x (magic, version, tier count)
+#   ring headers    16 bytes per tier, <QII (records written, capacity,
+#                   record size), padded to 64 bytes
+#   rings           capacity * record size bytes per tier, in tier order
+#
+# Every record starts with its timestamp in ms, as a u64. Rollups are
+# built from the raw samples as they are appended and written when a
+# sample falls into the next period, the samples of a period taken
+# before a restart are not in its rollup. Timestamps never go backwards, a clock stepped back is
+# clamped to the latest timestamp so the rings stay sorted for queries.
+
+import mmap
+import os
+import struct
+from typing import List, Optional, Sequence, Tuple
+
+HEADER = struct.Struct('<8sHH52x')
+RING_HEADER = struct.Struct('<QII')
+RING_HEADERS_SIZE = 64
+TIMESTAMP = struct.Struct('<Q')
+
+MAGIC = b'SFPTLM01'
+VERSION = 1
+
+# Words of page 0xA2 bytes 96-105, the temperature is signed
+CHANNELS = ('temperature', 'vcc', 'tx_bias', 'tx_power', 'rx_power')
+SIGNED = (True, False, False, False, False)
+LIVE_REGISTERS = list(range(96, 106))
+
+TIER_RAW = 0
+TIER_1S = 1
+TIER_1M = 2
+TIER_1H = 3
+
+# Period of each rollup tier in ms
+TIER_PERIODS_MS = (None, 1000, 60 * 1000, 60 * 60 * 1000)
+
+# (timestamp, word of each channel)
+SAMPLE = struct.Struct('<Q5H')
+
+# (period start, samples, then min, max, mean of each channel)
+ROLLUP = struct.Struct('<QI' + ''.join(('hhf' if signed else 'HHf') for signed in SIGNED))
+
+# Records kept per tier: 1 hour of 10 Hz samples, 6 hours of seconds,
+# 1 week of minutes, 1 year of hours. About 2.8 MB in all.
+DEFAULT_CAPACITIES = (36000, 6 * 3600, 7 * 24 * 60, 365 * 24)
+
+
+def words_from_registers(values: Sequence[int]) -> Tuple[int, ...]:
+    '''
+    Turns the 10 register values of bytes 96-105 into the five 16 bit
+    words, MSB first.
+    '''
+    return tuple(values[idx] << 8 | values[idx + 1] for idx in range(0, 2 * len(CHANNELS), 2))
+
+def _signed(word: int) -> int:
+    return word - 0x10000 if word & 0x8000 else word
+
+
+class _Ring:
+
+    def __init__(self, buffer: mmap.mmap, header_offset: int, data_offset: int, record: struct.Struct):
+        self.buffer = buffer
+        self.header_offset = header_offset
+        self.data_offset = data_offset
+        self.record = record
+        self.written, self.capacity, _ = RING_HEADER.unpack_from(buffer, header_offset)
+
+    def __len__(self) -> int:
+        return min(self.written, self.capacity)
+
+    def _offset(self, number: int) -> int:
+        return self.data_offset + (number % self.capacity) * self.record.size
+
+    def append(self, *values) -> None:
+        self.record.pack_into(self.buffer, self._offset(self.written), *values)
+        self.written += 1
+        # Record first, the count never covers an unwritten record
+        RING_HEADER.pack_into(self.buffer, self.header_offset, self.written, self.capacity, self.record.size)
+
+    def _timestamp(self, number: int) -> int:
+        return TIMESTAMP.unpack_from(self.buffer, self._offset(number))[0]
+
+    def _first_at(self, timestamp_ms: int) -> int:
+        # Number of the first record at or after timestamp_ms
+        low = self.written - len(self)
+        high = self.written
+
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp(middle) < timestamp_ms:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def query(self, since_ms: int, until_ms: int, max_records: Optional[int]) -> List[tuple]:
+        start = self._first_at(since_ms)
+        end = self._first_at(until_ms)
+
+        if max_records is not None:
+            end = min(end, start + max_records)
+
+        return [self.record.unpack_from(self.buffer, self._offset(number)) for number in range(start, end)]
+
+
+class _Rollup:
+    __slots__ = ('period_ms', 'start_ms', 'count', 'mins', 'maxs', 'sums')
+
+    def __init__(self, period_ms: int):
+        self.period_ms = period_ms
+        self.start_ms = None
+        self.count = 0
+
+    def add(self, timestamp_ms: int, values: Sequence[int]) -> Optional[tuple]:
+        '''
+        Adds a sample, returns the ROLLUP values of the previous period
+        if the sample starts a new one.
+        '''
+        start_ms = timestamp_ms - timestamp_ms % self.period_ms
+        finished = None
+
+        if start_ms != self.start_ms:
+            if self.count:
+                finished = self.values()
+
+            self.start_ms = start_ms
+            self.count = 0
+            self.mins = list(values)
+            self.maxs = list(values)
+            self.sums = [0] * len(values)
+
+        self.count += 1
+        for idx, value in enumerate(values):
+            if value < self.mins[idx]:
+                self.mins[idx] = value
+            elif value > self.maxs[idx]:
+                self.maxs[idx] = value
+            self.sums[idx] += value
+
+        return finished
+
+    def values(self) -> tuple:
+        values = [self.start_ms, self.count]
+
+        for low, high, total in zip(self.mins, self.maxs, self.sums):
+            values += (low, high, total / self.count)
+
+        return tuple(values)
+
+
+class TelemetryRing:
+
+    def __init__(self, filename: str, capacities: Sequence[int] = DEFAULT_CAPACITIES):
+        '''
+        Opens the store in filename, creating it if needed. A file made
+        with other capacities is started over.
+        '''
+        self.filename = filename
+        records = [SAMPLE] + [ROLLUP] * (len(TIER_PERIODS_MS) - 1)
+
+        if len(capacities) != len(records):
+            raise ValueError(f"Expected {len(records)} capacities, got {len(capacities)}")
+
+        size = HEADER.size + RING_HEADERS_SIZE + sum(capacity * record.size for capacity, record in zip(capacities, records))
+
+        self._file = open(filename, 'r+b' if os.path.exists(filename) else 'w+b')
+
+        if not self._matches(capacities, records, size):
+            if os.fstat(self._file.fileno()).st_size:
+                print(f"WARNING: {filename} is not a telemetry store of this size, starting over")
+
+            self._file.truncate(0)
+            self._file.truncate(size)
+            self._file.seek(0)
+            self._file.write(HEADER.pack(MAGIC, VERSION, len(records)))
+
+            for tier, (capacity, record) in enumerate(zip(capacities, records)):
+                self._file.seek(HEADER.size + tier * RING_HEADER.size)
+                self._file.write(RING_HEADER.pack(0, capacity, record.size))
+
+            self._file.flush()
+
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+        self.rings = []
+        data_offset = HEADER.size + RING_HEADERS_SIZE
+
+        for tier, record in enumerate(records):
+            ring = _Ring(self._map, HEADER.size + tier * RING_HEADER.size, data_offset, record)
+            self.rings.append(ring)
+            data_offset += ring.capacity * record.size
+
+        self._rollups = [_Rollup(period_ms) for period_ms in TIER_PERIODS_MS[1:]]
+
+        raw = self.rings[TIER_RAW]
+        self.last_timestamp_ms = raw._timestamp(raw.written - 1) if raw.written else 0
+
+    def _matches(self, capacities, records, size: int) -> bool:
+        self._file.seek(0)
+        data = self._file.read(HEADER.size + RING_HEADERS_SIZE)
+
+        if len(data) < HEADER.size + RING_HEADERS_SIZE or os.fstat(self._file.fileno()).st_size != size:
+            return False
+
+        magic, version, tiers = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or tiers != len(records):
+            return False
+
+        for tier, (capacity, record) in enumerate(zip(capacities, records)):
+            _, stored_capacity, record_size = RING_HEADER.unpack_from(data, HEADER.size + tier * RING_HEADER.size)
+            if stored_capacity != capacity or record_size != record.size:
+                return False
+
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def size(self) -> int:
+        return len(self._map)
+
+    def append(self, timestamp_ms: int, words: Sequence[int]) -> None:
+        '''
+        Records one sample of the five raw words (see
+        words_from_registers()).
+        '''
+        timestamp_ms = max(timestamp_ms, self.last_timestamp_ms)
+        self.last_timestamp_ms = timestamp_ms
+
+        self.rings[TIER_RAW].append(timestamp_ms, *words)
+
+        values = [_signed(word) if signed else word for word, signed in zip(words, SIGNED)]
+
+        for tier, rollup in enumerate(self._rollups, TIER_1S):
+            finished = rollup.add(timestamp_ms, values)
+            if finished is not None:
+                self.rings[tier].append(*finished)
+
+    def query(self, tier: int, since_ms: int = 0, until_ms: int = 2 ** 64 - 1,
+              max_records: Optional[int] = None) -> List[tuple]:
+        '''
+        Returns the records of a tier with since_ms <= timestamp <
+        until_ms, oldest first: SAMPLE tuples for TIER_RAW, ROLLUP
+        tuples for the others.
+        '''
+        if not 0 <= tier < len(self.rings):
+            raise ValueError(f"No telemetry tier {tier}")
+
+        return self.rings[tier].query(since_ms, until_ms, max_records)
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    filename = os.path.join(tempfile.mkdtemp(), 'telemetry.bin')
+
+    with TelemetryRing(filename) as ring:
+        # 2 hours of 10 Hz samples, twice what the raw ring holds
+        count = 2 * 36000
+        start_ms = 1699999200000
+        start = time.perf_counter()
+        for idx in range(count):
+            ring.append(start_ms + idx * 100, (0xFF00 + idx % 200, 33000, 3000, 5000, 4000 + idx % 7))
+        append_time = time.perf_counter() - start
+
+        raw = ring.query(TIER_RAW)
+        assert len(raw) == 36000 and raw[0][0] == start_ms + 36000 * 100
+
+        minutes = ring.query(TIER_1M)
+        assert len(minutes) == 119 and minutes[0][1] == 600
+        # Signed temperature words 0xFF00-0xFFC7 are -256 to -57
+        assert minutes[0][2:5] == (-256, -57, -156.5), minutes[0][2:5]
+
+        start = time.perf_counter()
+        window = ring.query(TIER_1S, start_ms + 3600 * 1000, start_ms + 3660 * 1000)
+        query_time = time.perf_counter() - start
+        assert len(window) == 60
+
+        print(f'{count} samples in {append_time * 1000:.0f} ms ({append_time / count * 1e6:.1f} us each), '
+              f'file {ring.size / 1e6:.1f} MB, 1 minute of seconds queried in {query_time * 1e6:.0f} us')
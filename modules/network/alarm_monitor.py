@@ -0,0 +1,198 @@
+# Pushes DDM alarm and warning transitions to subscribed connections of
+# the asyncio dock.
+#
+# AlarmMonitor listens to the samples of the TelemetryRecorder and runs
+# them through an AlarmEngine (ddm_alarms.py). The thresholds are read
+# from the module when the first sample arrives, again after the module
+# could not be read (it may have been swapped) and every
+# threshold_refresh seconds. While no module answers, nothing is raised.
+#
+# SUBSCRIBE_ALARMS is answered with SUBSCRIBE_ALARMS_ACK and a snapshot
+# of the current state, then one ALARM_EVENT per transition, all tagged
+# with the subscribe request's correlation id if it had one:
+#
+#   !H Q H H B B B x H H pad    (code, timestamp ms, alarm set, warning
+#                                set, channel, level, raised, value,
+#                                threshold)
+#
+# The sets are laid out like page 0xA2 bytes 112-113 and 116-117, value
+# and threshold are raw 16 bit words (the temperature is signed). A
+# snapshot, sent on subscribe and whenever the thresholds are reloaded
+# or the module goes away, has channel SNAPSHOT_CHANNEL.
+
+import asyncio
+import logging
+import struct
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from modules.core.ddm_alarms import THRESHOLD_REGISTERS, AlarmEngine, AlarmEvent, thresholds_from_registers
+from modules.network.codec import CODE_HEADER, TAGGED_FLAG, TAGGED_HEADER, Buffer, peek_code, tag_frame
+from modules.network.message import MESSAGE_BYTES, MessageCode
+from modules.network.telemetry_recorder import DDM_ADDR
+
+ALARM_EVENT_BODY = struct.Struct('!QHHBBBxHH')
+
+SNAPSHOT_CHANNEL = 0xFF
+
+# Events queued for subscribers before new ones are dropped
+MAX_QUEUED_EVENTS = 256
+
+
+def encode_alarm_event(event: AlarmEvent, correlation_id: Optional[int] = None) -> bytes:
+    frame = bytearray(MESSAGE_BYTES)
+    CODE_HEADER.pack_into(frame, 0, MessageCode.ALARM_EVENT.value)
+    ALARM_EVENT_BODY.pack_into(frame, CODE_HEADER.size, event.timestamp_ms, event.alarms, event.warnings,
+                               event.channel, event.level, event.raised,
+                               event.value & 0xFFFF, event.threshold & 0xFFFF)
+
+    return tag_frame(bytes(frame), correlation_id)
+
+
+def decode_alarm_event(raw_msg: Buffer) -> Tuple[Optional[int], AlarmEvent]:
+    '''
+    Decodes an ALARM_EVENT frame into its correlation id (None if
+    untagged) and the event, value and threshold as raw words.
+    '''
+    frame = memoryview(raw_msg)
+
+    if peek_code(frame) != MessageCode.ALARM_EVENT:
+        raise ValueError("Not an ALARM_EVENT frame")
+
+    code_int, correlation_id = TAGGED_HEADER.unpack_from(frame)
+
+    if code_int & TAGGED_FLAG:
+        start = TAGGED_HEADER.size
+    else:
+        start = CODE_HEADER.size
+        correlation_id = None
+
+    timestamp_ms, alarms, warnings, channel, level, raised, value, threshold = ALARM_EVENT_BODY.unpack_from(frame, start)
+
+    return correlation_id, AlarmEvent(timestamp_ms, channel, level, bool(raised), value, threshold, alarms, warnings)
+
+
+class AlarmMonitor:
+
+    DEFAULT_THRESHOLD_REFRESH = 60.0
+
+    def __init__(self, read: Callable[[List[int], int], Awaitable[List[int]]],
+                 engine: Optional[AlarmEngine] = None,
+                 threshold_refresh: float = DEFAULT_THRESHOLD_REFRESH):
+        '''
+        read(registers, page) returns the current register values.
+        '''
+        self.read = read
+        self.engine = engine or AlarmEngine()
+        self.threshold_refresh = threshold_refresh
+
+        # send(frame) and correlation id of each subscription, keyed by
+        # (connection, correlation id)
+        self.subscribers: Dict[Tuple[int, Optional[int]], Tuple[Callable[[bytes], Awaitable[None]], Optional[int]]] = {}
+
+        # Transitions pushed, and transitions lost to a full queue
+        self.events = 0
+        self.dropped = 0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._loader: Optional[asyncio.Task] = None
+        self._loaded_at: Optional[float] = None
+        self._last_timestamp_ms = 0
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(MAX_QUEUED_EVENTS)
+        self._sender = asyncio.ensure_future(self._send_events())
+
+    def stop(self) -> None:
+        for task in (self._sender, self._loader):
+            if task is not None:
+                task.cancel()
+
+        self._sender = None
+        self._loader = None
+
+    def snapshot(self) -> AlarmEvent:
+        return AlarmEvent(self._last_timestamp_ms, SNAPSHOT_CHANNEL, 0, False, 0, 0,
+                          self.engine.alarms, self.engine.warnings)
+
+    def _post(self, event: AlarmEvent) -> None:
+        if self._queue is None or not self.subscribers:
+            return
+
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def on_sample(self, timestamp_ms: int, words: Optional[Tuple[int, ...]]) -> None:
+        '''
+        TelemetryRecorder listener.
+        '''
+        self._last_timestamp_ms = timestamp_ms
+
+        if words is None:
+            if self.engine.has_thresholds:
+                # Module pulled or not answering, forget it and read the
+                # thresholds again once it answers
+                had_conditions = self.engine.alarms or self.engine.warnings
+                self.engine.clear_thresholds()
+                self._loaded_at = None
+                if had_conditions:
+                    self._post(self.snapshot())
+            return
+
+        loop = asyncio.get_running_loop()
+
+        if self._loaded_at is None or loop.time() - self._loaded_at >= self.threshold_refresh:
+            if self._loader is None or self._loader.done():
+                self._loader = asyncio.ensure_future(self._load_thresholds())
+
+        for event in self.engine.evaluate(timestamp_ms, words):
+            self._post(event)
+
+    async def _load_thresholds(self) -> None:
+        try:
+            values = await self.read(THRESHOLD_REGISTERS, DDM_ADDR)
+        except Exception as ex:
+            logging.debug(f'Alarm monitor: {ex}')
+            return
+
+        self._loaded_at = asyncio.get_running_loop().time()
+
+        # Same module and thresholds, keep the state
+        if self.engine.thresholds == thresholds_from_registers(values):
+            return
+
+        self.engine.set_thresholds(values)
+        self._post(self.snapshot())
+
+    def subscribe(self, client_id: int, send: Callable[[bytes], Awaitable[None]],
+                  correlation_id: Optional[int]) -> bytes:
+        '''
+        Adds a subscription and returns the snapshot frame to send
+        after the ACK.
+        '''
+        self.subscribers[(client_id, correlation_id)] = (send, correlation_id)
+
+        return encode_alarm_event(self.snapshot(), correlation_id)
+
+    def unsubscribe(self, client_id: int, correlation_id: Optional[int] = None) -> None:
+        '''
+        Removes a subscription, or every subscription of the connection
+        if correlation_id is None.
+        '''
+        for key in list(self.subscribers):
+            if key[0] == client_id and (correlation_id is None or key[1] == correlation_id):
+                del self.subscribers[key]
+
+    async def _send_events(self) -> None:
+        while True:
+            event = await self._queue.get()
+            self.events += 1
+
+            for key, (send, correlation_id) in list(self.subscribers.items()):
+                try:
+                    await send(encode_alarm_event(event, correlation_id))
+                except Exception as ex:
+                    logging.debug(f'Dropping alarm subscriber {key}: {ex!r}')
+                    self.subscribers.pop(key, None)
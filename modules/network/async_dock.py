@@ -0,0 +1,484 @@
+# asyncio version of the docking station loop in main.py.
+#
+# Discovery, the TCP command protocol and the I2C/database work all run
+# concurrently: blocking SFP reads go through FairI2CScheduler, which
+# runs them one at a time on its own thread, and database inserts
+# through their own executor, so a slow CLONE_SFP_MEMORY never holds up
+# an IDENTIFY_DEVICE on the event loop.
+#
+# By default the dock waits to be discovered and connects to the control
+# server like main.py does. In server mode (--server) it instead accepts
+# any number of control connections itself, the scheduler serves their
+# I2C work round robin and shares register reads between them.
+#
+# Requests may be tagged with a correlation id (see codec.py). A
+# connection can have up to MAX_OUTSTANDING requests in flight and
+# responses go out as soon as they are ready, so register reads the
+# EEPROM cache can answer overtake slow I2C reads and clones.
+#
+# SUBSCRIBE_TELEMETRY starts pushing samples of a register set at a
+# fixed rate, see telemetry_stream.py. REAL_TIME_REFRESH_DELTA is a
+# REAL_TIME_REFRESH answered with a TELEMETRY_DELTA frame (delta.py)
+# relative to the previous refresh of the same registers.
+#
+# The dock records the real time DDM values in a fixed size file,
+# TELEMETRY_QUERY reads them back (telemetry_recorder.py). The same
+# samples are checked against the module's alarm and warning thresholds,
+# SUBSCRIBE_ALARMS pushes every transition (alarm_monitor.py).
+#
+# READ_DDM_FLAGS reads just the module's own status, alarm and warning
+# flags. SUBSCRIBE_DDM_FLAGS polls them at a high rate and pushes the
+# full real time block whenever they change (flag_poller.py).
+#
+# Clones are appended to a local journal and copied to the database of
+# the requesting host in the background (clone_journal.py), into the
+# page_a0/page_a2 tables or with --clone-backend blob into the BLOB
+# tables of db_blob_store.py.
+#
+# Run with:   python -m modules.network.async_dock [--server [--port N]] [--no-record] [--clone-backend blob]
+
+import argparse
+import asyncio
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from modules.core.sfp_i2c_bus import SFP_I2C_Bus
+from modules.core.sfp_eeprom_cache import SFP_EEPROM_Cache
+from modules.core.telemetry_ring import TelemetryRing
+
+from modules.network.alarm_monitor import AlarmMonitor
+from modules.network.clone_journal import CloneJournal, WriteBehindCloneStore
+from modules.network.codec import decode_frame, decode_tagged_frame, tag_frame
+from modules.network.delta import DeltaEncoder
+from modules.network.dock_commands import *
+from modules.network.flag_poller import DDM_REGISTERS, FlagPoller
+from modules.network.i2c_scheduler import FairI2CScheduler
+from modules.network.message import MESSAGE_BYTES, Message, MessageCode, SubscribeMessage
+from modules.network.telemetry_recorder import DDM_ADDR, DEFAULT_TELEMETRY_FILE, TelemetryRecorder, query_result_frames
+from modules.network.telemetry_stream import TelemetrySubscription
+
+# Port the control software broadcasts DISCOVER messages on
+DISCOVERY_PORT = 20100
+
+# TCP port control consoles connect to in server mode
+DEFAULT_SERVER_PORT = 20101
+
+# Requests a single connection may have in flight before the dock
+# stops reading from it
+MAX_OUTSTANDING = 64
+
+# Telemetry subscriptions a single connection may hold
+MAX_SUBSCRIPTIONS = 8
+
+# Register sets a single connection keeps delta refresh state for
+MAX_DELTA_REFRESH_SETS = 8
+
+# Bytes queued on a connection before writes wait for it to drain,
+# keeps a slow subscriber from buffering a backlog of stale samples
+WRITE_BUFFER_HIGH_WATER = 16 * MESSAGE_BYTES
+
+
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    '''
+    Listens for DISCOVER broadcasts and remembers which address sent the
+    latest one. The control server's TCP socket listens on the same
+    ip/port its broadcasts come from.
+    '''
+
+    def __init__(self):
+        self.discovered = asyncio.Event()
+        self.server_addr: Optional[Tuple[str, int]] = None
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        try:
+            received_cmd = decode_frame(data)
+        except ValueError as ex:
+            logging.debug(ex)
+            return
+
+        if received_cmd.code == MessageCode.DISCOVER:
+            logging.debug(f'Has been discovered by the server at {addr[0]}:{addr[1]}')
+            self.server_addr = addr
+            self.discovered.set()
+
+
+class DockClient:
+    '''
+    One control connection. host is where that control software (and
+    its sfp_info database) runs.
+    '''
+
+    def __init__(self, client_id: int, host: str, writer: asyncio.StreamWriter):
+        self.client_id = client_id
+        self.host = host
+        self.writer = writer
+        self.write_lock = asyncio.Lock()
+        self.subscriptions: Dict[Optional[int], TelemetrySubscription] = {}
+        self.refresh_encoders: Dict[Tuple[int, Tuple[int, ...]], DeltaEncoder] = {}
+
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH_WATER)
+
+    async def send(self, frame: bytes) -> None:
+        # Responses are written whole, never interleaved
+        async with self.write_lock:
+            self.writer.write(frame)
+            await self.writer.drain()
+
+    def refresh_encoder(self, page_number: int, register_numbers) -> DeltaEncoder:
+        key = (page_number, tuple(register_numbers))
+        encoder = self.refresh_encoders.pop(key, None)
+
+        if encoder is None:
+            encoder = DeltaEncoder(len(key[1]))
+
+            if len(self.refresh_encoders) >= MAX_DELTA_REFRESH_SETS:
+                # Dicts keep insertion order, the first entry is the
+                # least recently used register set
+                del self.refresh_encoders[next(iter(self.refresh_encoders))]
+
+        self.refresh_encoders[key] = encoder
+
+        return encoder
+
+    def unsubscribe(self, correlation_id: Optional[int]) -> None:
+        subscription = self.subscriptions.pop(correlation_id, None)
+
+        if subscription is not None:
+            subscription.stop()
+            logging.debug(f'Connection {self.client_id} stream stopped after {subscription.sent} samples '
+                          f'({subscription.dropped} dropped, {subscription.merged} merged)')
+
+    def unsubscribe_all(self) -> None:
+        for correlation_id in list(self.subscriptions):
+            self.unsubscribe(correlation_id)
+
+
+class AsyncDock:
+
+    # Scheduler client the recorder reads the module as
+    RECORDER_CLIENT_ID = 'telemetry-recorder'
+
+    # Scheduler client the flag poller reads the module as
+    FLAG_POLLER_CLIENT_ID = 'ddm-flags'
+
+    def __init__(self, sfp_bus, clone_store=None, telemetry_file: Optional[str] = DEFAULT_TELEMETRY_FILE,
+                 clone_backend: str = 'columns'):
+        '''
+        clone_store(db_host, a0_dump, a2_dump) persists a cloned
+        module and is run on the database executor. It defaults to
+        journaling it for the sfp_info database on db_host, whose tables
+        clone_backend selects (see WriteBehindCloneStore).
+
+        The real time values are recorded to telemetry_file, None turns
+        recording off. They are sampled for the alarm monitor either way.
+        '''
+        self.sfp_bus = sfp_bus
+
+        # Journal owned by the dock, None with a custom clone_store
+        self.write_behind: Optional[WriteBehindCloneStore] = None
+
+        if clone_store is None:
+            self.write_behind = WriteBehindCloneStore(CloneJournal(), backend=clone_backend)
+            self.write_behind.start()
+            clone_store = self.write_behind.store
+
+        self.clone_store = clone_store
+
+        self.scheduler = FairI2CScheduler(sfp_bus)
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+
+        ring = TelemetryRing(telemetry_file) if telemetry_file else None
+        self.recorder = TelemetryRecorder(ring, self._record_read)
+        self.alarm_monitor = AlarmMonitor(self._record_read)
+        self.recorder.listeners.append(self.alarm_monitor.on_sample)
+
+        # Polls only while someone is subscribed
+        self.flag_poller = FlagPoller(self._read_ddm_flags, self._read_ddm)
+
+        self.discovery: Optional[DiscoveryProtocol] = None
+        self._client_ids = itertools.count()
+
+    async def _record_read(self, register_numbers, page_number: int) -> List[int]:
+        # Fresh, the recorder samples faster than the cache's live TTL
+        return await self.scheduler.read_registers(self.RECORDER_CLIENT_ID, register_numbers, page_number, fresh=True)
+
+    async def _read_ddm_flags(self) -> List[int]:
+        return await self.scheduler.submit(self.FLAG_POLLER_CLIENT_ID, self.sfp_bus.read_ddm_flags)
+
+    async def _read_ddm(self) -> List[int]:
+        # Fresh, neither a cached nor a shared read from before the
+        # flags changed would do. The I2C thread runs one job at a time,
+        # so a fresh read this joins started after the flag read.
+        return await self.scheduler.read_registers(self.FLAG_POLLER_CLIENT_ID, DDM_REGISTERS, DDM_ADDR, fresh=True)
+
+    def start(self) -> None:
+        self.scheduler.start()
+        self.alarm_monitor.start()
+        self.recorder.start()
+
+    async def run_db(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db_executor, func, *args)
+
+    async def start_discovery(self) -> None:
+        loop = asyncio.get_running_loop()
+        _, self.discovery = await loop.create_datagram_endpoint(
+            DiscoveryProtocol, local_addr=('0.0.0.0', DISCOVERY_PORT)
+        )
+
+    async def wait_for_discovery(self) -> Tuple[str, int]:
+        self.discovery.discovered.clear()
+        logging.debug('Waiting for message...')
+        await self.discovery.discovered.wait()
+
+        return self.discovery.server_addr
+
+    async def handle_command(self, received_cmd: Message, client: DockClient, correlation_id: Optional[int] = None) -> None:
+        async def respond(frame: bytes) -> None:
+            await client.send(tagged_response(frame, correlation_id))
+
+        if received_cmd.code == MessageCode.CLONE_SFP_MEMORY:
+            try:
+                a0_dump, a2_dump = await self.scheduler.submit(client.client_id, clone_sfp_memory, self.sfp_bus)
+            except Exception as ex:
+                logging.debug(ex)
+                await respond(clone_error_response())
+                return
+
+            try:
+                await self.run_db(self.clone_store, client.host, a0_dump, a2_dump)
+            except Exception as ex:
+                logging.debug(ex)
+                await respond(clone_error_response())
+                return
+
+            await respond(clone_success_response())
+
+        elif received_cmd.code in REGISTER_READ_ACKS:
+            try:
+                response_vals = await self.read_registers(client, received_cmd.register_numbers, received_cmd.page_number)
+            except Exception as ex:
+                logging.debug(ex)
+                await respond(i2c_error_response())
+                return
+
+            await respond(register_read_ack(received_cmd, response_vals))
+
+        elif received_cmd.code == MessageCode.REAL_TIME_REFRESH_DELTA:
+            try:
+                response_vals = await self.read_registers(client, received_cmd.register_numbers, received_cmd.page_number)
+            except Exception as ex:
+                logging.debug(ex)
+                await respond(i2c_error_response())
+                return
+
+            # Encoded right before the send, so frames of one register
+            # set always reach the client in sequence order
+            encoder = client.refresh_encoder(received_cmd.page_number, received_cmd.register_numbers)
+            await client.send(encoder.encode(response_vals, correlation_id))
+
+        elif received_cmd.code == MessageCode.SUBSCRIBE_TELEMETRY:
+            await respond(self.subscribe(received_cmd, client, correlation_id).to_network_message())
+
+        elif received_cmd.code == MessageCode.UNSUBSCRIBE_TELEMETRY:
+            # A tagged request stops the stream started with the same
+            # id, an untagged one stops every stream of the connection
+            if correlation_id is None:
+                client.unsubscribe_all()
+            else:
+                client.unsubscribe(correlation_id)
+
+            await respond(Message(MessageCode.UNSUBSCRIBE_TELEMETRY_ACK, "Unsubscribed").to_network_message())
+
+        elif received_cmd.code == MessageCode.TELEMETRY_QUERY:
+            for frame in query_result_frames(self.recorder.ring, received_cmd, correlation_id):
+                await client.send(frame)
+
+        elif received_cmd.code == MessageCode.SUBSCRIBE_ALARMS:
+            snapshot = self.alarm_monitor.subscribe(client.client_id, client.send, correlation_id)
+            await respond(Message(MessageCode.SUBSCRIBE_ALARMS_ACK, "Subscribed to alarms").to_network_message())
+            await client.send(snapshot)
+
+        elif received_cmd.code == MessageCode.UNSUBSCRIBE_ALARMS:
+            # Like UNSUBSCRIBE_TELEMETRY, untagged stops every subscription
+            self.alarm_monitor.unsubscribe(client.client_id, correlation_id)
+            await respond(Message(MessageCode.UNSUBSCRIBE_ALARMS_ACK, "Unsubscribed from alarms").to_network_message())
+
+        elif received_cmd.code == MessageCode.READ_DDM_FLAGS:
+            try:
+                flag_values = await self.scheduler.submit(client.client_id, self.sfp_bus.read_ddm_flags)
+            except Exception as ex:
+                logging.debug(ex)
+                await respond(i2c_error_response())
+                return
+
+            await respond(ddm_flags_ack(flag_values))
+
+        elif received_cmd.code == MessageCode.SUBSCRIBE_DDM_FLAGS:
+            snapshot = self.flag_poller.subscribe(client.client_id, client.send, correlation_id)
+            await respond(Message(MessageCode.SUBSCRIBE_DDM_FLAGS_ACK,
+                                  f"Subscribed, polling every {self.flag_poller.interval_ms} ms").to_network_message())
+            if snapshot is not None:
+                await client.send(snapshot)
+
+        elif received_cmd.code == MessageCode.UNSUBSCRIBE_DDM_FLAGS:
+            # Like UNSUBSCRIBE_ALARMS, untagged stops every subscription
+            self.flag_poller.unsubscribe(client.client_id, correlation_id)
+            await respond(Message(MessageCode.UNSUBSCRIBE_DDM_FLAGS_ACK, "Unsubscribed from flags").to_network_message())
+
+    async def read_registers(self, client: DockClient, register_numbers, page_number: int) -> List[int]:
+        # Registers the EEPROM cache still holds are answered right
+        # away without waiting behind queued bus work
+        read_cached = getattr(self.sfp_bus, 'read_cached', None)
+
+        if read_cached is not None:
+            response_vals = read_cached(register_numbers, page_number)
+            if response_vals is not None:
+                return response_vals
+
+        return await self.scheduler.read_registers(client.client_id, register_numbers, page_number)
+
+    def subscribe(self, received_cmd: SubscribeMessage, client: DockClient, correlation_id: Optional[int]) -> Message:
+        if correlation_id not in client.subscriptions and len(client.subscriptions) >= MAX_SUBSCRIPTIONS:
+            return Message(MessageCode.SUBSCRIBE_TELEMETRY_ACK, "Refused, too many subscriptions")
+
+        # Subscribing again with the same id replaces the old stream
+        client.unsubscribe(correlation_id)
+
+        # Fresh, streams may sample faster than the cache's live TTL
+        async def read(register_numbers, page_number):
+            return await self.scheduler.read_registers(client.client_id, register_numbers, page_number, fresh=True)
+
+        subscription = TelemetrySubscription(
+            read, client.send, received_cmd.page_number, received_cmd.register_numbers,
+            received_cmd.interval_ms, received_cmd.flags, correlation_id
+        )
+        subscription.start()
+        client.subscriptions[correlation_id] = subscription
+
+        logging.debug(f'Connection {client.client_id} streaming {len(subscription.register_numbers)} registers '
+                      f'every {subscription.interval_ms} ms')
+
+        return Message(MessageCode.SUBSCRIBE_TELEMETRY_ACK, f"Subscribed, sampling every {subscription.interval_ms} ms")
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        host = writer.get_extra_info('peername')[0]
+        client = DockClient(next(self._client_ids), host, writer)
+        pending: Set[asyncio.Task] = set()
+
+        logging.debug(f'Serving control connection {client.client_id} from {host}')
+
+        try:
+            while True:
+                if len(pending) >= MAX_OUTSTANDING:
+                    await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                logging.debug('Awaiting TCP commands...')
+                raw_msg = await reader.readexactly(MESSAGE_BYTES)
+
+                try:
+                    correlation_id, received_cmd = decode_tagged_frame(raw_msg)
+                except ValueError as ex:
+                    logging.debug(ex)
+                    continue
+
+                if received_cmd.code == MessageCode.IDENTIFY_DEVICE:
+                    # Answered straight from the event loop, even while
+                    # I2C or database work is in flight
+                    logging.debug("Responding to identification request")
+                    await client.send(tag_frame(identify_response(), correlation_id))
+                else:
+                    task = asyncio.ensure_future(self.handle_command(received_cmd, client, correlation_id))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+
+        except (asyncio.IncompleteReadError, ConnectionError) as ex:
+            logging.debug(f'Lost connection {client.client_id}... ({ex!r})')
+        finally:
+            for task in pending:
+                task.cancel()
+
+            client.unsubscribe_all()
+            self.alarm_monitor.unsubscribe(client.client_id)
+            self.flag_poller.unsubscribe(client.client_id)
+            writer.close()
+
+    async def run(self) -> None:
+        '''
+        Waits to be discovered, then connects to the control server and
+        serves it until the connection drops.
+        '''
+        self.start()
+        await self.start_discovery()
+
+        while True:
+            server_ip, server_port = await self.wait_for_discovery()
+
+            try:
+                logging.debug(f'Attempting to connect to {server_ip}:{server_port}')
+                reader, writer = await asyncio.open_connection(server_ip, server_port)
+                logging.debug('Connection successful!')
+            except OSError as ex:
+                logging.debug(ex)
+                logging.debug('Connection error, reverting to undiscovered state')
+                continue
+
+            await self.serve_connection(reader, writer)
+
+    async def serve(self, host: str = '0.0.0.0', port: int = DEFAULT_SERVER_PORT) -> None:
+        '''
+        Server mode, accepts any number of control connections.
+        '''
+        self.start()
+        server = await asyncio.start_server(self.serve_connection, host, port)
+        logging.debug(f'Accepting control connections on {host}:{port}')
+
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        self.recorder.stop()
+        self.alarm_monitor.stop()
+        self.flag_poller.stop()
+
+        if self.recorder.ring is not None:
+            self.recorder.ring.close()
+
+        self.scheduler.stop()
+        self.db_executor.shutdown(wait=True)
+
+        if self.write_behind is not None:
+            self.write_behind.close()
+
+        self.sfp_bus.end_communication()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CloudPlug docking station')
+    parser.add_argument('--server', action='store_true', help='accept control connections instead of waiting to be discovered')
+    parser.add_argument('--port', type=int, default=DEFAULT_SERVER_PORT, help='TCP port to listen on in server mode')
+    parser.add_argument('--no-record', action='store_true', help='do not record the real time values')
+    parser.add_argument('--clone-backend', choices=WriteBehindCloneStore.BACKENDS, default='columns',
+                        help='database tables clones are written to')
+    args = parser.parse_args()
+
+    log_fmt = "[%(asctime)s | %(levelname)s]: %(message)s"
+    logging.basicConfig(level=logging.DEBUG, format=log_fmt, datefmt="%I:%M:%S")
+    logging.debug("Application started")
+
+    dock = AsyncDock(SFP_EEPROM_Cache(SFP_I2C_Bus()), telemetry_file=None if args.no_record else DEFAULT_TELEMETRY_FILE,
+                     clone_backend=args.clone_backend)
+
+    try:
+        if args.server:
+            asyncio.run(dock.serve(port=args.port))
+        else:
+            asyncio.run(dock.run())
+    finally:
+        dock.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,643 @@
+# Write-behind storage of cloned modules.
+#
+# Inserting a clone into the sfp_info database from the command loop
+# makes every CLONE_SFP_MEMORY as slow as the database, and a clone is
+# lost when the database is down. Instead the dock appends the clone to
+# a local append-only journal, answers CLONE_SFP_MEMORY_SUCCESS right
+# away, and a drain thread copies the journal into the database.
+#
+# Journal file, fixed size records:
+#
+#   !I16sQ64s256s256s   (CRC-32 of the rest of the record, record id,
+#                        timestamp in ms, database host, page 0xA0,
+#                        page 0xA2)
+#
+# Appends go to the OS right away and are fsync'ed in groups, at most
+# fsync_interval seconds after they were written, so a burst of clones
+# shares one fsync. A torn last record (crash while appending) is cut
+# off when the journal is opened.
+#
+# <journal>.pos holds the offset of the first record not yet in the
+# database. Each host is drained on its own, so records of a host that
+# can not be reached are skipped until its back off ends while the
+# records of other hosts behind them are replayed. The position only
+# moves past records that are all applied, and the journal is truncated
+# once every host has caught up.
+#
+# Replay is idempotent: the id of every record is inserted into the
+# clone_journal_applied table in the same transaction as the clone, and
+# records whose id is already there are skipped. A crash between the
+# database commit and the .pos update only replays records the database
+# then ignores.
+
+import logging
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from modules.network.db_blob_store import BlobCloneStore
+from modules.network.db_pool import DBConnectionPool
+from modules.network.db_utility import _sfp_row, connect_to_database, insert_clone_rows
+
+RECORD = struct.Struct('!I16sQ64s256s256s')
+POSITION = struct.Struct('!Q')
+
+DEFAULT_JOURNAL_FILE = 'clone_journal.bin'
+
+_APPLIED_TABLE = """CREATE TABLE IF NOT EXISTS clone_journal_applied (
+    record_id BINARY(16) PRIMARY KEY,
+    cloned_at_ms BIGINT NOT NULL
+)"""
+
+
+class JournalRecord(NamedTuple):
+    record_id: bytes
+    timestamp_ms: int
+    host: str
+    page_a0: bytes
+    page_a2: bytes
+
+
+def _pack(record: JournalRecord) -> bytes:
+    body = RECORD.pack(0, record.record_id, record.timestamp_ms, record.host.encode(),
+                       record.page_a0, record.page_a2)[4:]
+
+    return struct.pack('!I', zlib.crc32(body)) + body
+
+def _unpack(data: bytes) -> Optional[JournalRecord]:
+    crc, record_id, timestamp_ms, host, page_a0, page_a2 = RECORD.unpack(data)
+
+    if crc != zlib.crc32(data[4:]):
+        return None
+
+    return JournalRecord(record_id, timestamp_ms, host.rstrip(b'\x00').decode(), page_a0, page_a2)
+
+
+class CloneJournal:
+
+    DEFAULT_FSYNC_INTERVAL = 0.05
+
+    def __init__(self, filename: str = DEFAULT_JOURNAL_FILE, fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        self.filename = filename
+        self.position_filename = filename + '.pos'
+        self.fsync_interval = fsync_interval
+
+        self._fd = os.open(filename, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._lock = threading.Condition()
+        self._closed = False
+
+        size = os.fstat(self._fd).st_size
+        self._size = size - size % RECORD.size
+
+        if self._size != size:
+            logging.warning(f'Cutting torn record off the end of {filename}')
+            os.ftruncate(self._fd, self._size)
+
+        self._position = self._load_position()
+
+        # Appends written and appends known to be on disk
+        self._written = 0
+        self._synced = 0
+
+        # Records appended, fsyncs and records marked as applied
+        self.appended = 0
+        self.fsyncs = 0
+        self.applied = 0
+
+        self._sync_thread = threading.Thread(target=self._sync_loop, name='journal-sync', daemon=True)
+        self._sync_thread.start()
+
+    def _load_position(self) -> int:
+        try:
+            with open(self.position_filename, 'rb') as file:
+                position, = POSITION.unpack(file.read(POSITION.size))
+        except (OSError, struct.error):
+            return 0
+
+        # A position past the end means the journal was truncated before
+        # the position file was updated, replay skips what is applied
+        if position > self._size or position % RECORD.size:
+            return 0
+
+        return position
+
+    def _store_position(self, position: int) -> None:
+        temp_filename = self.position_filename + '.tmp'
+
+        with open(temp_filename, 'wb') as file:
+            file.write(POSITION.pack(position))
+
+        os.replace(temp_filename, self.position_filename)
+
+    def __len__(self) -> int:
+        '''
+        Number of records not yet applied.
+        '''
+        return (self._size - self._position) // RECORD.size
+
+    def append(self, host: str, page_a0, page_a2) -> JournalRecord:
+        '''
+        Appends a clone for the database on host. It reaches the disk
+        within fsync_interval seconds, see wait_synced().
+        '''
+        page_a0 = bytes(page_a0)
+        page_a2 = bytes(page_a2)
+
+        if len(page_a0) != 256 or len(page_a2) != 256:
+            raise ValueError("Length of given memory is != 256")
+        if len(host.encode()) > 64:
+            raise ValueError(f"Host name {host} is too long for the journal")
+
+        record = JournalRecord(uuid.uuid4().bytes, int(time.time() * 1000), host, page_a0, page_a2)
+        data = _pack(record)
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Journal is closed")
+
+            os.write(self._fd, data)
+            self._size += len(data)
+            self._written += 1
+            self.appended += 1
+            self._lock.notify_all()
+
+        return record
+
+    def wait_synced(self, timeout: Optional[float] = None) -> bool:
+        '''
+        Waits until everything appended so far is fsync'ed. Returns
+        False on timeout.
+        '''
+        with self._lock:
+            target = self._written
+            return self._lock.wait_for(lambda: self._synced >= target, timeout)
+
+    def _sync_loop(self) -> None:
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self._written > self._synced or self._closed)
+
+                if self._written == self._synced:
+                    return
+
+            # Let more appends join this fsync
+            if not self._closed:
+                time.sleep(self.fsync_interval)
+
+            with self._lock:
+                target = self._written
+
+            os.fsync(self._fd)
+
+            with self._lock:
+                self._synced = max(self._synced, target)
+                self.fsyncs += 1
+                self._lock.notify_all()
+
+    @property
+    def position(self) -> int:
+        return self._position
+
+    def wait_for_append(self, appended: int, timeout: Optional[float] = None) -> bool:
+        '''
+        Waits until more than appended records were appended in total.
+        '''
+        with self._lock:
+            return self._lock.wait_for(lambda: self.appended > appended or self._closed, timeout)
+
+    def read_pending(self, max_records: int, start: Optional[int] = None) -> List[Tuple[Optional[JournalRecord], int]]:
+        '''
+        Returns up to max_records unapplied records from offset start
+        (the position by default), oldest first, each with its end
+        offset. mark_applied() takes the end offset once the record and
+        the ones before it are in the database. Corrupt records are None.
+        '''
+        with self._lock:
+            if start is None or start < self._position:
+                start = self._position
+            end = min(self._size, start + max_records * RECORD.size)
+
+        if end <= start:
+            return []
+
+        data = os.pread(self._fd, end - start, start)
+        records = []
+
+        for offset in range(0, len(data), RECORD.size):
+            record = _unpack(data[offset:offset + RECORD.size])
+
+            if record is None:
+                logging.warning(f'Skipping corrupt record at offset {start + offset} of {self.filename}')
+
+            records.append((record, start + offset + RECORD.size))
+
+        return records
+
+    def mark_applied(self, position: int) -> None:
+        with self._lock:
+            self.applied += (position - self._position) // RECORD.size
+            self._position = position
+
+            if self._position == self._size:
+                # Caught up, start over with an empty journal. Truncating
+                # first, a crash in between leaves a position past the end
+                os.ftruncate(self._fd, 0)
+                self._size = 0
+                self._position = 0
+
+            self._store_position(self._position)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+
+            self._closed = True
+            self._lock.notify_all()
+
+        self._sync_thread.join()
+        os.close(self._fd)
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self),
+            'appended': self.appended,
+            'applied': self.applied,
+            'fsyncs': self.fsyncs,
+        }
+
+
+def _apply_records(cursor, records: List[JournalRecord], placeholder: str,
+                   blob_store: Optional[BlobCloneStore]) -> int:
+    ids = [record.record_id for record in records]
+    p = placeholder
+
+    cursor.execute(f"SELECT record_id FROM clone_journal_applied WHERE record_id IN ({', '.join([p] * len(ids))})", ids)
+    done = {bytes(row[0]) for row in cursor.fetchall()}
+    new = [record for record in records if record.record_id not in done]
+
+    if not new:
+        return 0
+
+    cursor.executemany(f"INSERT INTO clone_journal_applied (record_id, cloned_at_ms) VALUES ({p}, {p})",
+                       [(record.record_id, record.timestamp_ms) for record in new])
+
+    if blob_store is not None:
+        for record in new:
+            blob_store.store_clone_rows(cursor, record.page_a0, record.page_a2, record.timestamp_ms)
+
+        return len(new)
+
+    # Raises if the sfp table is not as expected, the whole batch is
+    # rolled back and stays in the journal
+    sfp_rows = [_sfp_row(record.page_a0, record.page_a2) for record in new]
+    insert_clone_rows(cursor, sfp_rows, [tuple(record.page_a0) for record in new],
+                      [tuple(record.page_a2) for record in new], placeholder)
+
+    return len(new)
+
+def replay_records(connection, records: List[JournalRecord], placeholder: str = '%s',
+                   blob_store: Optional[BlobCloneStore] = None) -> int:
+    '''
+    Inserts the records not inserted before in one transaction and
+    returns how many were new. They go to the page_a0/page_a2 tables,
+    or to the BLOB tables if blob_store is given. On error the
+    transaction is rolled back and the exception raised.
+    '''
+    if blob_store is not None:
+        # The store forgets the pages it cached if this is rolled back
+        return blob_store.transaction(lambda cursor: _apply_records(cursor, records, placeholder, blob_store), connection)
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute("BEGIN")
+        count = _apply_records(cursor, records, placeholder, None)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+    return count
+
+
+class WriteBehindCloneStore:
+    '''
+    Clone store for the dock: store() appends to the journal and
+    returns, a drain thread replays the journal into the database of
+    each record's host, batch_size records per transaction. A host whose
+    batch failed is retried with a back off doubling up to max_backoff
+    seconds, the journal keeps its records meanwhile (also across
+    restarts) and the other hosts are drained past them.
+
+    backend is 'columns' for the page_a0/page_a2 tables, or 'blob' for
+    the BLOB tables of db_blob_store.py, with dialect 'mysql' or
+    'sqlite'.
+    '''
+
+    BACKENDS = ('columns', 'blob')
+
+    DEFAULT_BATCH_SIZE = 50
+    INITIAL_BACKOFF = 0.5
+    DEFAULT_MAX_BACKOFF = 30.0
+
+    # Longest wait for new records before checking for close()
+    IDLE_POLL = 0.5
+
+    def __init__(self, journal: CloneJournal, connect: Callable[[str], object] = connect_to_database,
+                 batch_size: int = DEFAULT_BATCH_SIZE, max_backoff: float = DEFAULT_MAX_BACKOFF,
+                 placeholder: str = '%s', backend: str = 'columns', dialect: str = 'mysql'):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown clone backend {backend}, expected one of {', '.join(self.BACKENDS)}")
+
+        self.journal = journal
+        self._connect = connect
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.placeholder = placeholder
+        self.backend = backend
+        self.dialect = dialect
+
+        # BLOB store of each database host with backend 'blob', it
+        # caches the pages and modules already in that database
+        self.blob_stores: Dict[str, BlobCloneStore] = {}
+
+        # Connection pool of each database host, only used by the drain
+        self.pools: Dict[str, DBConnectionPool] = {}
+        self._schema_ready = set()
+
+        # End offsets of records applied past the journal position, and
+        # (retry time, back off) of each failing host
+        self._applied: Set[int] = set()
+        self._backoff: Dict[str, Tuple[float, float]] = {}
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Batches replayed, and failed attempts
+        self.batches = 0
+        self.failures = 0
+
+    def store(self, db_host: str, a0_dump, a2_dump) -> None:
+        self.journal.append(db_host, a0_dump, a2_dump)
+
+    def _pool(self, db_host: str) -> DBConnectionPool:
+        pool = self.pools.get(db_host)
+
+        if pool is None:
+            pool = self.pools[db_host] = DBConnectionPool(lambda: self._connect(db_host))
+
+        return pool
+
+    def _next_batch(self, now: float) -> List[Tuple[JournalRecord, int]]:
+        # Oldest records of the first host that is not backing off,
+        # skipping records already applied
+        batch = []
+        host = None
+        offset = None
+
+        while len(batch) < self.batch_size:
+            pending = self.journal.read_pending(self.batch_size, offset)
+
+            if not pending:
+                break
+
+            for record, end in pending:
+                if end in self._applied:
+                    continue
+
+                if record is None:
+                    self._applied.add(end)
+                    continue
+
+                if record.host in self._backoff and self._backoff[record.host][0] > now:
+                    continue
+
+                if host is None:
+                    host = record.host
+
+                if record.host == host:
+                    batch.append((record, end))
+                    if len(batch) == self.batch_size:
+                        break
+
+            offset = pending[-1][1]
+
+        return batch
+
+    def _advance(self) -> None:
+        # Moves the journal position past the applied records in front
+        position = self.journal.position
+
+        while position + RECORD.size in self._applied:
+            position += RECORD.size
+            self._applied.discard(position)
+
+        if position != self.journal.position:
+            self.journal.mark_applied(position)
+
+    def drain_once(self) -> int:
+        '''
+        Replays the oldest records of one host and returns how many
+        records were taken off the journal. Raises if the host's
+        database failed, the host then backs off.
+        '''
+        batch = self._next_batch(time.monotonic())
+
+        if not batch:
+            self._advance()
+            return 0
+
+        host = batch[0][0].host
+
+        try:
+            with self._pool(host).connection() as connection:
+                blob_store = None
+                if self.backend == 'blob':
+                    blob_store = self.blob_stores.get(host)
+                    if blob_store is None:
+                        blob_store = self.blob_stores[host] = BlobCloneStore(None, self.placeholder, self.dialect)
+
+                if host not in self._schema_ready:
+                    connection.cursor().execute(_APPLIED_TABLE)
+                    if blob_store is not None:
+                        blob_store.create_schema(connection)
+                    self._schema_ready.add(host)
+
+                replay_records(connection, [record for record, _ in batch], self.placeholder, blob_store)
+        except Exception:
+            self.failures += 1
+            backoff = min(max(2 * self._backoff.get(host, (0.0, 0.0))[1], self.INITIAL_BACKOFF), self.max_backoff)
+            self._backoff[host] = (time.monotonic() + backoff, backoff)
+            raise
+
+        self._backoff.pop(host, None)
+        self._applied.update(end for _, end in batch)
+        self._advance()
+        self.batches += 1
+
+        return len(batch)
+
+    def _drain_loop(self) -> None:
+        while not self._stop.is_set():
+            appended = self.journal.appended
+
+            try:
+                drained = self.drain_once()
+            except Exception as ex:
+                logging.warning(f'Replaying the clone journal failed, {self.pending} clones pending ({ex})')
+                continue
+
+            if not drained:
+                # Everything applied, or only hosts that are backing off
+                # are left. New records may be for another host.
+                now = time.monotonic()
+                timeout = min([self.IDLE_POLL] + [max(retry - now, 0.0) for retry, _ in self._backoff.values()])
+                self.journal.wait_for_append(appended, timeout)
+
+    @property
+    def pending(self) -> int:
+        return len(self.journal) - len(self._applied)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._drain_loop, name='journal-drain', daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        '''
+        Stops the drain, records still pending are replayed after the
+        next start.
+        '''
+        self._stop.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        self.journal.close()
+
+        for pool in self.pools.values():
+            pool.close()
+
+    def stats(self) -> dict:
+        stats = self.journal.stats()
+        stats.update(pending=self.pending, batches=self.batches, failures=self.failures,
+                     backing_off=sorted(host for host, (retry, _) in self._backoff.items() if retry > time.monotonic()))
+
+        return stats
+
+
+if __name__ == '__main__':
+    import argparse
+    import sqlite3
+    import tempfile
+
+    parser = argparse.ArgumentParser(description='Clone latency with a slow database, direct against write-behind')
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--db-latency', type=float, default=0.02, help='seconds added to every database commit')
+    args = parser.parse_args()
+
+    with open('a0.txt') as file:
+        a0 = [int(val) for val in file.readline().split(',')]
+    with open('a2.txt') as file:
+        a2 = [int(val) for val in file.readline().split(',')]
+
+    directory = tempfile.mkdtemp()
+    down = threading.Event()
+
+    class SlowConnection:
+        '''
+        SQLite stand-in for the sfp_info database whose commits take
+        db_latency seconds, and which fails while down is set.
+        '''
+
+        def __init__(self):
+            self._connection = sqlite3.connect(os.path.join(directory, 'sfp_info.db'), isolation_level=None,
+                                               check_same_thread=False)
+
+        def cursor(self):
+            if down.is_set():
+                raise ConnectionError('Database is down')
+            return self._connection.cursor()
+
+        def commit(self):
+            time.sleep(args.db_latency)
+            self._connection.commit()
+
+        def rollback(self):
+            self._connection.rollback()
+
+        def close(self):
+            self._connection.close()
+
+    setup = sqlite3.connect(os.path.join(directory, 'sfp_info.db'))
+    setup.execute("CREATE TABLE sfp (id INTEGER PRIMARY KEY, vendor_id TEXT, vendor_part_number TEXT, transceiver_type TEXT)")
+    for table in ('page_a0', 'page_a2'):
+        columns = ', '.join(f'`{i}` INTEGER' for i in range(256))
+        setup.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, {columns})")
+    setup.execute(_APPLIED_TABLE)
+    setup.commit()
+
+    # The stand-in has no information_schema
+    from modules.network.db_utility import _column_counts
+    _column_counts['sfp'] = 3
+
+    # Direct, one transaction per clone in the command loop
+    direct = SlowConnection()
+    start = time.perf_counter()
+    for _ in range(args.count):
+        replay_records(direct, [JournalRecord(uuid.uuid4().bytes, 0, 'db', bytes(a0), bytes(a2))], '?')
+    direct_time = (time.perf_counter() - start) / args.count
+
+    journal_file = os.path.join(directory, DEFAULT_JOURNAL_FILE)
+    store = WriteBehindCloneStore(CloneJournal(journal_file), lambda host: SlowConnection(), placeholder='?')
+    store.start()
+
+    # Half of the clones arrive while the database is down
+    down.set()
+    start = time.perf_counter()
+    for idx in range(args.count):
+        if idx == args.count // 2:
+            down.clear()
+        store.store('db', a0, a2)
+    journal_time = (time.perf_counter() - start) / args.count
+
+    while len(store.journal):
+        time.sleep(0.05)
+    store.close()
+
+    # Replaying records a second time, as after a crash before the
+    # position update, adds nothing
+    records = [JournalRecord(uuid.uuid4().bytes, 0, 'db', bytes(a0), bytes(a2))]
+    assert replay_records(direct, records, '?') == 1
+    assert replay_records(direct, records, '?') == 0
+
+    rows = direct._connection.execute("SELECT COUNT(*) FROM page_a0").fetchone()[0]
+    assert rows == 2 * args.count + 1, rows
+
+    # A host that can not be reached does not hold up the clones for
+    # other hosts behind it
+    def connect(host):
+        if host == 'unreachable':
+            raise ConnectionError(f'{host} is unreachable')
+        return SlowConnection()
+
+    blocked = WriteBehindCloneStore(CloneJournal(journal_file), connect, placeholder='?')
+    blocked.store('unreachable', a0, a2)
+    blocked.store('db', a0, a2)
+    blocked.start()
+
+    while blocked.pending > 1:
+        time.sleep(0.05)
+    blocked.close()
+
+    rows = direct._connection.execute("SELECT COUNT(*) FROM page_a0").fetchone()[0]
+    assert rows == 2 * args.count + 2, rows
+
+    print(f'Clone latency with {args.db_latency * 1000:.0f} ms commits: direct {direct_time * 1000:.2f} ms, '
+          f'write-behind {journal_time * 1000:.3f} ms')
+    print(f'Journal: {store.stats()}')
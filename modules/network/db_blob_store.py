@@ -0,0 +1,373 @@
+# Compact storage of cloned modules, an alternative to the 256 column
+# page_a0/page_a2 tables.
+#
+#   sfp_module  one row per module identity (vendor, part and serial
+#               number from page 0xA0)
+#   sfp_page    every distinct page once, as a 256 byte BLOB keyed by
+#               its SHA-256
+#   sfp_clone   one row per clone, linking a module to its two pages,
+#               with the live bytes 96-127 of page 0xA2
+#
+# Page 0xA2 is stored with its live bytes (A/D values, status and
+# flags, 96-127) zeroed, they change from one read to the next and
+# would make every clone's page distinct. The rest of the page
+# (thresholds, calibration, user EEPROM) stays the same for a module.
+# So cloning a module again writes one small sfp_clone row, the pages
+# cost a hash lookup (or nothing, for hashes this process already
+# stored).
+#
+# migrate_page_tables() copies the rows of the old page_a0/page_a2
+# tables over, pairing them by id. The last id copied is committed with
+# each batch in sfp_blob_migration, a migration that was interrupted
+# resumes after it.
+#
+# WriteBehindCloneStore (clone_journal.py) writes to these tables with
+# backend='blob', the asyncio dock with --clone-backend blob.
+
+import hashlib
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from modules.core.sfp import SFP
+
+# Statements that differ between MySQL and the SQLite stand-in
+_DIALECTS = {
+    'mysql': {
+        'auto_id': 'INTEGER PRIMARY KEY AUTO_INCREMENT',
+        'insert_ignore': 'INSERT IGNORE',
+    },
+    'sqlite': {
+        'auto_id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'insert_ignore': 'INSERT OR IGNORE',
+    },
+}
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS sfp_module (
+        id {auto_id},
+        vendor_name VARCHAR(16) NOT NULL,
+        part_number VARCHAR(16) NOT NULL,
+        serial_number VARCHAR(16) NOT NULL,
+        UNIQUE (vendor_name, part_number, serial_number)
+    )""",
+    """CREATE TABLE IF NOT EXISTS sfp_page (
+        sha256 BINARY(32) PRIMARY KEY,
+        data BLOB NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS sfp_clone (
+        id {auto_id},
+        module_id INTEGER NOT NULL REFERENCES sfp_module (id),
+        page_a0 BINARY(32) NOT NULL REFERENCES sfp_page (sha256),
+        page_a2 BINARY(32) NOT NULL REFERENCES sfp_page (sha256),
+        a2_live BINARY(32) NOT NULL,
+        cloned_at_ms BIGINT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS sfp_blob_migration (
+        source VARCHAR(16) PRIMARY KEY,
+        last_id BIGINT NOT NULL
+    )""",
+    "CREATE INDEX {index_if_not_exists}sfp_clone_module ON sfp_clone (module_id, cloned_at_ms)",
+]
+
+
+# Bytes of page 0xA2 stored with each clone instead of in its page
+A2_LIVE_START = 96
+A2_LIVE_END = 128
+
+def _split_a2(page_a2: bytes) -> Tuple[bytes, bytes]:
+    # Static page with the live bytes zeroed, and the live bytes
+    live = page_a2[A2_LIVE_START:A2_LIVE_END]
+    static = page_a2[:A2_LIVE_START] + bytes(len(live)) + page_a2[A2_LIVE_END:]
+
+    return static, live
+
+def _identity(page_a0: bytes) -> Tuple[str, str, str]:
+    def field(raw: bytes) -> str:
+        return raw.decode('latin-1').rstrip(' \x00')
+
+    return field(page_a0[20:36]), field(page_a0[40:56]), field(page_a0[68:84])
+
+
+class BlobCloneStore:
+
+    def __init__(self, connection, placeholder: str = '%s', dialect: str = 'mysql'):
+        '''
+        connection is a mysql.connector connection in autocommit mode
+        (see connect_to_database()), or a sqlite3 connection opened with
+        isolation_level=None and placeholder='?', dialect='sqlite'. It
+        may be None if every call is given a connection of the database.
+        '''
+        self.connection = connection
+        self.placeholder = placeholder
+        self.dialect = dialect
+        self._sql = _DIALECTS[dialect]
+
+        # Page hashes and module ids already in the database
+        self._known_pages: Set[bytes] = set()
+        self._module_ids: Dict[Tuple[str, str, str], int] = {}
+
+        # Pages written, and pages that were already stored
+        self.pages_written = 0
+        self.pages_deduplicated = 0
+
+    def create_schema(self, connection=None) -> None:
+        connection = connection or self.connection
+        cursor = connection.cursor()
+        # MySQL has no IF NOT EXISTS for indexes, a failing CREATE INDEX
+        # there means it already exists
+        index_if_not_exists = 'IF NOT EXISTS ' if self.dialect == 'sqlite' else ''
+
+        for statement in _SCHEMA:
+            try:
+                cursor.execute(statement.format(index_if_not_exists=index_if_not_exists, **self._sql))
+            except Exception:
+                if not statement.startswith('CREATE INDEX'):
+                    raise
+
+        cursor.execute(f"{self._sql['insert_ignore']} INTO sfp_blob_migration (source, last_id) "
+                       f"VALUES ({self.placeholder}, -1)", ('page_tables',))
+
+    def _store_page(self, cursor, page: bytes) -> bytes:
+        digest = hashlib.sha256(page).digest()
+
+        if digest in self._known_pages:
+            self.pages_deduplicated += 1
+            return digest
+
+        p = self.placeholder
+        cursor.execute(f"SELECT 1 FROM sfp_page WHERE sha256 = {p}", (digest,))
+
+        if cursor.fetchone() is None:
+            cursor.execute(f"{self._sql['insert_ignore']} INTO sfp_page (sha256, data) VALUES ({p}, {p})", (digest, page))
+            self.pages_written += 1
+        else:
+            self.pages_deduplicated += 1
+
+        self._known_pages.add(digest)
+
+        return digest
+
+    def _module_id(self, cursor, identity: Tuple[str, str, str]) -> int:
+        module_id = self._module_ids.get(identity)
+
+        if module_id is None:
+            p = self.placeholder
+            where = f"vendor_name = {p} AND part_number = {p} AND serial_number = {p}"
+            cursor.execute(f"SELECT id FROM sfp_module WHERE {where}", identity)
+            row = cursor.fetchone()
+
+            if row is None:
+                cursor.execute(f"INSERT INTO sfp_module (vendor_name, part_number, serial_number) VALUES ({p}, {p}, {p})", identity)
+                module_id = cursor.lastrowid
+            else:
+                module_id = row[0]
+
+            self._module_ids[identity] = module_id
+
+        return module_id
+
+    def store_clone_rows(self, cursor, page_a0: bytes, page_a2: bytes, cloned_at_ms: Optional[int] = None) -> int:
+        '''
+        Writes a clone with cursor, inside a transaction() the caller
+        runs. Returns the id of its sfp_clone row.
+        '''
+        static_a2, live_a2 = _split_a2(page_a2)
+        module_id = self._module_id(cursor, _identity(page_a0))
+        a0_hash = self._store_page(cursor, page_a0)
+        a2_hash = self._store_page(cursor, static_a2)
+
+        if cloned_at_ms is None:
+            cloned_at_ms = int(time.time() * 1000)
+
+        p = self.placeholder
+        cursor.execute(f"INSERT INTO sfp_clone (module_id, page_a0, page_a2, a2_live, cloned_at_ms) VALUES ({p}, {p}, {p}, {p}, {p})",
+                       (module_id, a0_hash, a2_hash, live_a2, cloned_at_ms))
+
+        return cursor.lastrowid
+
+    def transaction(self, work, connection=None):
+        '''
+        Runs work(cursor) in one transaction on connection (the store's
+        own by default) and returns its result. On error it is rolled
+        back and the exception raised.
+        '''
+        connection = connection or self.connection
+        cursor = connection.cursor()
+
+        # Ids and hashes cached during a rolled back transaction are not
+        # in the database
+        known_pages = set(self._known_pages)
+        module_ids = dict(self._module_ids)
+
+        try:
+            cursor.execute("BEGIN")
+            result = work(cursor)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            self._known_pages = known_pages
+            self._module_ids = module_ids
+            raise
+
+        return result
+
+    def store_clone(self, page_a0, page_a2, cloned_at_ms: Optional[int] = None) -> int:
+        '''
+        Stores a cloned module and returns the id of its sfp_clone row.
+        '''
+        page_a0 = bytes(page_a0)
+        page_a2 = bytes(page_a2)
+
+        if len(page_a0) != 256 or len(page_a2) != 256:
+            raise ValueError("Length of given memory is != 256")
+
+        return self.transaction(lambda cursor: self.store_clone_rows(cursor, page_a0, page_a2, cloned_at_ms))
+
+    def _load(self, where: str, args: tuple) -> Optional[SFP]:
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "SELECT a0.data, a2.data, c.a2_live FROM sfp_clone c "
+            "JOIN sfp_page a0 ON a0.sha256 = c.page_a0 "
+            "JOIN sfp_page a2 ON a2.sha256 = c.page_a2 "
+            f"WHERE {where}", args)
+        row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        # BLOBs come back as bytes (sqlite3) or bytearray (mysql.connector),
+        # SFP uses either without copying. Page 0xA2 gets its live bytes
+        # back in a copy.
+        page_a2 = bytearray(row[1])
+        page_a2[A2_LIVE_START:A2_LIVE_END] = row[2]
+
+        return SFP(row[0], page_a2)
+
+    def load_clone(self, clone_id: int) -> Optional[SFP]:
+        return self._load(f"c.id = {self.placeholder}", (clone_id,))
+
+    def latest_clone(self, vendor_name: str, part_number: str, serial_number: str) -> Optional[SFP]:
+        '''
+        Returns the most recent clone of a module, names are compared
+        without trailing spaces.
+        '''
+        p = self.placeholder
+        return self._load(
+            f"c.module_id = (SELECT id FROM sfp_module WHERE vendor_name = {p} AND part_number = {p} AND serial_number = {p}) "
+            "ORDER BY c.cloned_at_ms DESC, c.id DESC LIMIT 1",
+            (vendor_name, part_number, serial_number))
+
+    def migrate_page_tables(self, batch_size: int = 1000) -> int:
+        '''
+        Copies the rows of the page_a0 and page_a2 tables, pairing rows
+        with the same id, and returns the number of clones copied. Each
+        batch_size clones are committed together with the last id they
+        cover, running it again copies only rows after that id. The old
+        tables are left as they are. Needs create_schema().
+        '''
+        p = self.placeholder
+        cursor = self.connection.cursor()
+        cursor.execute(f"SELECT last_id FROM sfp_blob_migration WHERE source = {p}", ('page_tables',))
+        last_id = cursor.fetchone()[0]
+        copied = 0
+
+        # Read in id ranges, mysql.connector does not allow other queries
+        # while a result set is only partly fetched
+        while True:
+            cursor.execute(f"SELECT * FROM page_a0 WHERE id > {p} ORDER BY id LIMIT {int(batch_size)}", (last_id,))
+            a0_rows = cursor.fetchall()
+            if not a0_rows:
+                break
+
+            # First column is the id, then bytes 0-255
+            first_id = a0_rows[0][0]
+            last_id = a0_rows[-1][0]
+            cursor.execute(f"SELECT * FROM page_a2 WHERE id >= {p} AND id <= {p}", (first_id, last_id))
+            a2_pages = {row[0]: bytes(row[1:257]) for row in cursor.fetchall()}
+
+            clones = [(bytes(row[1:257]), a2_pages[row[0]]) for row in a0_rows if row[0] in a2_pages]
+
+            def copy(cursor):
+                for page_a0, page_a2 in clones:
+                    self.store_clone_rows(cursor, page_a0, page_a2, 0)
+
+                cursor.execute(f"UPDATE sfp_blob_migration SET last_id = {p} WHERE source = {p}",
+                               (last_id, 'page_tables'))
+
+            self.transaction(copy)
+            copied += len(clones)
+
+        return copied
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import sqlite3
+    import tempfile
+
+    parser = argparse.ArgumentParser(description='Migrate page_a0/page_a2 rows to the BLOB tables')
+    parser.add_argument('--host', help='MySQL host with the sfp_info database, SQLite demo if not given')
+    parser.add_argument('--count', type=int, default=2000, help='clones in the SQLite demo')
+    args = parser.parse_args()
+
+    if args.host:
+        from modules.network.db_utility import connect_to_database
+
+        store = BlobCloneStore(connect_to_database(args.host))
+        store.create_schema()
+        start = time.perf_counter()
+        copied = store.migrate_page_tables()
+        print(f'Migrated {copied} clones in {time.perf_counter() - start:.1f} s, '
+              f'{store.pages_written} distinct pages, {store.pages_deduplicated} duplicates')
+    else:
+        with open('a0.txt') as file:
+            a0 = bytes(int(val) for val in file.readline().split(','))
+        with open('a2.txt') as file:
+            a2 = bytes(int(val) for val in file.readline().split(','))
+
+        filename = os.path.join(tempfile.mkdtemp(), 'sfp_info.db')
+        connection = sqlite3.connect(filename, isolation_level=None)
+
+        # Old layout, filled the way insert_to_page_table() does
+        for table in ('page_a0', 'page_a2'):
+            columns = ', '.join(f'`{i}` INTEGER' for i in range(256))
+            connection.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, {columns})")
+
+        rows_a0 = [tuple(a0)] * args.count
+        # Live values change from clone to clone
+        rows_a2 = [tuple(a2[:96]) + (n & 0xFF,) + tuple(a2[97:]) for n in range(args.count)]
+        columns = ', '.join(f'`{i}`' for i in range(256))
+        values = ', '.join(['?'] * 256)
+
+        start = time.perf_counter()
+        connection.execute("BEGIN")
+        connection.executemany(f"INSERT INTO page_a0 ({columns}) VALUES ({values})", rows_a0)
+        connection.executemany(f"INSERT INTO page_a2 ({columns}) VALUES ({values})", rows_a2)
+        connection.execute("COMMIT")
+        old_time = time.perf_counter() - start
+        old_size = os.path.getsize(filename)
+
+        store = BlobCloneStore(connection, placeholder='?', dialect='sqlite')
+        store.create_schema()
+
+        start = time.perf_counter()
+        copied = store.migrate_page_tables()
+        migrate_time = time.perf_counter() - start
+
+        # Nothing is copied twice
+        assert store.migrate_page_tables() == 0
+
+        clone_id = store.store_clone(a0, a2)
+        sfp = store.load_clone(clone_id)
+        assert bytes(sfp.page_a0) == a0 and bytes(sfp.page_a2) == a2
+        assert store.latest_clone(*_identity(a0)).get_vendor_name() == SFP(a0, a2).get_vendor_name()
+
+        connection.execute("DROP TABLE page_a0")
+        connection.execute("DROP TABLE page_a2")
+        connection.execute("VACUUM")
+
+        print(f'{args.count} clones: column tables {old_size / 1024:.0f} KB, '
+              f'BLOB tables {os.path.getsize(filename) / 1024:.0f} KB')
+        print(f'Migrated {copied} clones in {migrate_time:.2f} s ({old_time:.2f} s to write the old rows), '
+              f'{store.pages_written} distinct pages, {store.pages_deduplicated} duplicates')
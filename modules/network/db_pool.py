@@ -0,0 +1,235 @@
+# Pool of database connections owned by the dock process.
+#
+# Connecting to MySQL for every CLONE_SFP_MEMORY costs a TCP connect,
+# authentication and the protocol handshake, and main.py never closed
+# those connections. DBConnectionPool keeps up to max_size connections
+# open and lends them out:
+#
+#   with pool.connection() as mydb:
+#       insert_cloned_memory_to_database(mydb.cursor(), a0_dump, a2_dump)
+#
+# A connection that sat idle longer than health_check_after is pinged
+# before it is lent out, and replaced if the ping fails. Connections
+# idle longer than idle_timeout are closed. When connecting fails the
+# pool backs off (doubling up to max_backoff) and fails fast until the
+# back off ran out, so a database outage does not stall every clone.
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Optional, Tuple
+
+
+class DBConnectionPool:
+
+    DEFAULT_MAX_SIZE = 4
+    DEFAULT_IDLE_TIMEOUT = 300.0
+    DEFAULT_HEALTH_CHECK_AFTER = 10.0
+    INITIAL_BACKOFF = 0.5
+    DEFAULT_MAX_BACKOFF = 30.0
+
+    def __init__(self, connect: Callable[[], object], max_size: int = DEFAULT_MAX_SIZE,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 health_check_after: float = DEFAULT_HEALTH_CHECK_AFTER,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF):
+        '''
+        connect() opens a new connection, e.g.
+        lambda: connect_to_database(host).
+        '''
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Condition()
+        self._idle: Deque[Tuple[object, float]] = deque()
+        self._size = 0
+        self._closed = False
+
+        self._backoff = 0.0
+        self._retry_at = 0.0
+
+        # Connections opened, reused, and dropped as broken or idle
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def _open(self):
+        now = time.monotonic()
+
+        if now < self._retry_at:
+            raise ConnectionError(f"Database unavailable, retrying in {self._retry_at - now:.1f} s")
+
+        try:
+            connection = self._connect()
+        except Exception:
+            self._backoff = min(max(2 * self._backoff, self.INITIAL_BACKOFF), self.max_backoff)
+            self._retry_at = time.monotonic() + self._backoff
+            raise
+
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self.opened += 1
+
+        return connection
+
+    @staticmethod
+    def _is_healthy(connection) -> bool:
+        try:
+            if hasattr(connection, 'ping'):
+                # mysql.connector, raises if the server went away
+                connection.ping(reconnect=False)
+            else:
+                connection.cursor().execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(connection) -> None:
+        try:
+            connection.close()
+        except Exception as ex:
+            logging.debug(ex)
+
+    def _evict_idle(self, now: float) -> list:
+        # Oldest idle connections are on the left
+        evicted = []
+
+        while self._idle and now - self._idle[0][1] >= self.idle_timeout:
+            evicted.append(self._idle.popleft()[0])
+            self._size -= 1
+
+        return evicted
+
+    def acquire(self, timeout: Optional[float] = None):
+        '''
+        Lends out a connection, waiting up to timeout seconds (forever
+        if None) while all max_size connections are in use. Give it
+        back with release().
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+
+                evicted = self._evict_idle(time.monotonic())
+
+                if self._idle:
+                    # Most recently used first, it is the least likely
+                    # to have been dropped by the server
+                    connection, last_used = self._idle.pop()
+                    reserved = False
+                elif self._size < self.max_size:
+                    connection, last_used = None, 0.0
+                    self._size += 1
+                    reserved = True
+                else:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("No database connection available")
+                    self._lock.wait(remaining)
+                    continue
+
+            # Slow work (closing, pinging, connecting) outside the lock
+            for old in evicted:
+                self.discarded += 1
+                self._close(old)
+
+            if not reserved:
+                if time.monotonic() - last_used < self.health_check_after or self._is_healthy(connection):
+                    self.reused += 1
+                    return connection
+
+                self.discarded += 1
+                self._close(connection)
+
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                    self._lock.notify()
+                raise
+
+    def release(self, connection, broken: bool = False) -> None:
+        '''
+        Gives a connection back. A broken connection (or any connection
+        after close()) is closed instead of being reused.
+        '''
+        with self._lock:
+            if broken or self._closed:
+                self._size -= 1
+                discard = True
+            else:
+                self._idle.append((connection, time.monotonic()))
+                discard = False
+
+            self._lock.notify()
+
+        if discard:
+            self.discarded += 1
+            self._close(connection)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        '''
+        Borrows a connection for a with block. If the block raises, the
+        connection is rolled back and, if it no longer answers, dropped.
+        '''
+        connection = self.acquire(timeout)
+
+        try:
+            yield connection
+        except Exception:
+            try:
+                connection.rollback()
+                broken = False
+            except Exception:
+                broken = True
+
+            self.release(connection, broken=broken or not self._is_healthy(connection))
+            raise
+        else:
+            self.release(connection)
+
+    def evict_idle(self) -> None:
+        '''
+        Closes connections idle longer than idle_timeout. Borrowing
+        does this as well, call it to trim an otherwise unused pool.
+        '''
+        with self._lock:
+            evicted = self._evict_idle(time.monotonic())
+
+        for connection in evicted:
+            self.discarded += 1
+            self._close(connection)
+
+    def close(self) -> None:
+        '''
+        Closes the idle connections, connections still lent out are
+        closed when they are released.
+        '''
+        with self._lock:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._lock.notify_all()
+
+        for connection in idle:
+            self._close(connection)
+
+    def stats(self) -> dict:
+        return {
+            'size': self._size,
+            'idle': len(self._idle),
+            'opened': self.opened,
+            'reused': self.reused,
+            'discarded': self.discarded,
+        }
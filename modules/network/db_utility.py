@@ -1,46 +1,85 @@
+import threading
+import time
 from enum import Enum
-from typing import List
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 import mysql.connector
 
 from modules.core.sfp import SFP
 
 
+# Credentials of the sfp_info database, which runs on the same
+# machine as the control server
+DB_USER = "connor"
+DB_PASSWORD = "cloudplug!@#@!"
+DB_NAME = "sfp_info"
+
 class TableID(Enum):
     PAGE_A0 = 1
     PAGE_A2 = 2
 
+def connect_to_database(host: str):
+    return mysql.connector.connect(
+        host=host,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        autocommit=True
+    )
+
+# Column counts of the tables, they only change with the schema so they
+# are looked up once per process
+_column_counts: Dict[str, int] = {}
+
 def _get_number_of_columns_in_table(cursor, table_name: str) -> int:
-    sql_statement = f"select count(*) as count from information_schema.columns where table_name=\'{table_name}\'"
-    cursor.execute(sql_statement)
-    result = cursor.fetchone()
+    columns_in_table = _column_counts.get(table_name)
+
+    if columns_in_table is None:
+        sql_statement = f"select count(*) as count from information_schema.columns where table_name=\'{table_name}\'"
+        cursor.execute(sql_statement)
+        result = cursor.fetchone()
 
-    columns_in_table = result[0] - 1
+        columns_in_table = result[0] - 1
+        _column_counts[table_name] = columns_in_table
 
     return columns_in_table
 
-def insert_cloned_memory_to_database(cursor, page_a0_memory: List[int], page_a2_memory: List[int]) -> None:
+def _page_table_name(table_id: TableID) -> str:
+    if table_id == TableID.PAGE_A0:
+        return "page_a0"
+    elif table_id == TableID.PAGE_A2:
+        return "page_a2"
 
+@lru_cache(maxsize=None)
+def _page_insert_statement(table_name: str, placeholder: str = '%s') -> str:
+    columns = ', '.join(f'`{i}`' for i in range(256))
+    values = ', '.join([placeholder] * 256)
 
-    if len(page_a0_memory) != 256 or len(page_a2_memory) != 256:
-        print("ERROR: Length of given memory is != 256")
-        return
+    return f'INSERT INTO {table_name} ({columns}) VALUES ({values})'
 
+@lru_cache(maxsize=None)
+def _sfp_insert_statement(placeholder: str = '%s') -> str:
+    return f"INSERT INTO sfp (vendor_id, vendor_part_number, transceiver_type) VALUES ({placeholder}, {placeholder}, {placeholder})"
+
+def _sfp_row(page_a0_memory: List[int], page_a2_memory: List[int]) -> Tuple[str, str, str]:
     # We can obtain identifying information from the page_a0 memory
-    
     sfp = SFP(page_a0_memory, page_a2_memory)
 
-    vendor_name = sfp.get_vendor_name()
-    vendor_part_number = sfp.get_vendor_part_number()
-    transceiver_type = sfp.get_transceiver_info()[0]
+    return sfp.get_vendor_name(), sfp.get_vendor_part_number(), sfp.get_transceiver_info()[0]
+
+def insert_cloned_memory_to_database(cursor, page_a0_memory: List[int], page_a2_memory: List[int]) -> None:
+
+
+    if len(page_a0_memory) != 256 or len(page_a2_memory) != 256:
+        print("ERROR: Length of given memory is != 256")
+        return
 
     table_name = "sfp"
     num_columns_in_table = _get_number_of_columns_in_table(cursor, table_name)
 
-    
-
-    sql_statement = f"INSERT INTO {table_name} (vendor_id, vendor_part_number, transceiver_type) VALUES (%s, %s, %s)"
-    vals_to_insert = tuple([vendor_name, vendor_part_number, transceiver_type])
+    sql_statement = _sfp_insert_statement()
+    vals_to_insert = _sfp_row(page_a0_memory, page_a2_memory)
 
     if len(vals_to_insert) != num_columns_in_table:
         print("ERROR: Too few values to insert to database ID table")
@@ -62,20 +101,202 @@ def insert_to_page_table(cursor, table_id: TableID, memory_page_values: List[int
     if len(memory_page_values) != 256:
         print(f"ERROR: Given {len(memory_page_values)} values but expected 256 values")
 
-    if table_id == TableID.PAGE_A0:
-        table_name = "page_a0"
-    elif table_id == TableID.PAGE_A2:
-        table_name = "page_a2"
-
-    sql_statement = f'INSERT INTO {table_name} ('
-    for i in range(255):
-        sql_statement += f"`{i}`, "
-    sql_statement += '`255`) VALUES ('
-    for i in range(255):
-        sql_statement += "%s, "
-    sql_statement += "%s)"
-
+    sql_statement = _page_insert_statement(_page_table_name(table_id))
     vals_to_insert = tuple(memory_page_values)
 
     cursor.execute(sql_statement, vals_to_insert)
 
+
+def insert_clone_rows(cursor, sfp_rows: List[Tuple[str, str, str]], a0_rows: List[tuple],
+                      a2_rows: List[tuple], placeholder: str = '%s') -> None:
+    '''
+    Inserts many clones with one executemany() per table. sfp_rows are
+    _sfp_row() tuples, the page rows hold 256 values each. Transactions
+    are up to the caller. Raises before inserting anything if the sfp
+    table does not have the expected columns, so no clone is ever
+    inserted without its identity row.
+    '''
+    if _get_number_of_columns_in_table(cursor, "sfp") != 3:
+        raise RuntimeError("sfp table does not have the 3 columns of the ID row")
+
+    cursor.executemany(_sfp_insert_statement(placeholder), sfp_rows)
+    cursor.executemany(_page_insert_statement("page_a0", placeholder), a0_rows)
+    cursor.executemany(_page_insert_statement("page_a2", placeholder), a2_rows)
+
+
+class BatchedCloneInserter:
+    '''
+    Queues cloned memory dumps and inserts them into the sfp, page_a0
+    and page_a2 tables in batches, each batch with one executemany() per
+    table inside a single transaction. A batch is flushed once it holds
+    batch_size dumps, or by a timer flush_interval seconds after its
+    first dump was queued. close() flushes what is left.
+
+    placeholder is the parameter marker of the database driver, '%s'
+    for mysql.connector and '?' for sqlite3. The connection is used
+    from the timer thread too, always under the inserter's lock, so a
+    sqlite3 connection must be opened with check_same_thread=False.
+    '''
+
+    DEFAULT_BATCH_SIZE = 100
+    DEFAULT_FLUSH_INTERVAL = 1.0
+
+    def __init__(self, connection, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, placeholder: str = '%s'):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.placeholder = placeholder
+
+        self._lock = threading.RLock()
+        self._sfp_rows = []
+        self._a0_rows = []
+        self._a2_rows = []
+        self._timer: Optional[threading.Timer] = None
+
+        # Dumps inserted, batches committed and timer flushes that failed
+        self.inserted = 0
+        self.batches = 0
+        self.failures = 0
+
+    def __len__(self) -> int:
+        return len(self._sfp_rows)
+
+    def add(self, page_a0_memory: List[int], page_a2_memory: List[int]) -> None:
+        if len(page_a0_memory) != 256 or len(page_a2_memory) != 256:
+            raise ValueError("Length of given memory is != 256")
+
+        sfp_row = _sfp_row(page_a0_memory, page_a2_memory)
+
+        with self._lock:
+            self._sfp_rows.append(sfp_row)
+            self._a0_rows.append(tuple(page_a0_memory))
+            self._a2_rows.append(tuple(page_a2_memory))
+
+            if len(self._sfp_rows) >= self.batch_size:
+                self.flush()
+            elif self._timer is None:
+                self._start_timer()
+
+    def _start_timer(self) -> None:
+        self._timer = threading.Timer(self.flush_interval, self._flush_due)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_due(self) -> None:
+        with self._lock:
+            self._timer = None
+
+            try:
+                self.flush()
+            except Exception as ex:
+                # The dumps stay queued, try again after another interval
+                self.failures += 1
+                print(f"ERROR: Flushing {len(self)} queued clones failed, retrying ({ex})")
+                self._start_timer()
+
+    def flush(self) -> int:
+        '''
+        Inserts every queued dump in one transaction and returns how
+        many were inserted. On error the transaction is rolled back, the
+        dumps stay queued and the exception is raised.
+        '''
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            if not self._sfp_rows:
+                return 0
+
+            cursor = self.connection.cursor()
+
+            try:
+                cursor.execute("BEGIN")
+                insert_clone_rows(cursor, self._sfp_rows, self._a0_rows, self._a2_rows, self.placeholder)
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+
+            count = len(self._sfp_rows)
+            self._sfp_rows = []
+            self._a0_rows = []
+            self._a2_rows = []
+
+            self.inserted += count
+            self.batches += 1
+
+            return count
+
+    def close(self) -> None:
+        self.flush()
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import sqlite3
+    import tempfile
+
+    parser = argparse.ArgumentParser(description='Clone insert throughput, per row against batched')
+    parser.add_argument('--host', help='MySQL host with the sfp_info database, SQLite stand-in if not given')
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=BatchedCloneInserter.DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    with open('a0.txt') as file:
+        a0 = [int(val) for val in file.readline().split(',')]
+    with open('a2.txt') as file:
+        a2 = [int(val) for val in file.readline().split(',')]
+
+    def connect():
+        if args.host:
+            return connect_to_database(args.host), '%s'
+
+        # SQLite stand-in with the same tables, in autocommit mode like
+        # connect_to_database(). It has no information_schema, so the
+        # column count is filled in up front
+        connection = sqlite3.connect(os.path.join(tempfile.mkdtemp(), 'sfp_info.db'),
+                                     isolation_level=None, check_same_thread=False)
+        connection.execute("CREATE TABLE sfp (id INTEGER PRIMARY KEY, vendor_id TEXT, vendor_part_number TEXT, transceiver_type TEXT)")
+        for table in ('page_a0', 'page_a2'):
+            columns = ', '.join(f'`{i}` INTEGER' for i in range(256))
+            connection.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, {columns})")
+        _column_counts['sfp'] = 3
+
+        return connection, '?'
+
+    connection, placeholder = connect()
+
+    # One clone at a time, each committed on its own as main.py does
+    if placeholder == '%s':
+        start = time.perf_counter()
+        for _ in range(args.count):
+            insert_cloned_memory_to_database(connection.cursor(), a0, a2)
+        per_row = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        for _ in range(args.count):
+            cursor = connection.cursor()
+            cursor.execute(_sfp_insert_statement('?'), _sfp_row(a0, a2))
+            cursor.execute(_page_insert_statement('page_a0', '?'), tuple(a0))
+            cursor.execute(_page_insert_statement('page_a2', '?'), tuple(a2))
+        per_row = time.perf_counter() - start
+
+    inserter = BatchedCloneInserter(connection, batch_size=args.batch_size, placeholder=placeholder)
+    start = time.perf_counter()
+    for _ in range(args.count):
+        inserter.add(a0, a2)
+    inserter.close()
+    batched = time.perf_counter() - start
+
+    # A part batch goes in from the timer thread
+    inserter.add(a0, a2)
+    time.sleep(inserter.flush_interval + 0.5)
+    assert len(inserter) == 0 and inserter.failures == 0
+
+    print(f'{args.count} clones: per row {args.count / per_row:.0f}/s, '
+          f'batched ({args.batch_size} per transaction) {args.count / batched:.0f}/s, '
+          f'{per_row / batched:.1f}x')
+
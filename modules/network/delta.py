@@ -0,0 +1,231 @@
+# Delta-encoded register frames for telemetry streams and
+# REAL_TIME_REFRESH_DELTA responses.
+#
+# Both ends agree on an ordered register list (the one in the subscribe
+# or refresh request). Every frame carries a sequence number. A keyframe
+# carries every value. A delta frame carries a bitmap with one bit per
+# register (set = changed since the previous frame, bit 0 of the first
+# byte is register 0) followed by the new values of the changed
+# registers only. A keyframe is sent every keyframe_interval frames,
+# and whenever a delta would not be smaller, so a decoder that lost
+# track resyncs quickly.
+#
+# Delta frames are variable length, unlike every other frame:
+#
+#   untagged:   !H H H B  ...   (code, frame length, sequence, flags)
+#   tagged:     !H H H H B ...  (code | TAGGED_FLAG, correlation id, frame length, sequence, flags)
+#
+# A client that asked for delta frames must read the code (and id) and
+# frame length before reading the rest, read_frame() does this for
+# asyncio clients.
+
+import asyncio
+import struct
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from modules.network.codec import CODE_HEADER, TAGGED_FLAG, TAGGED_HEADER, peek_code
+from modules.network.message import MESSAGE_BYTES, MessageCode, MeasurementMessage
+
+DELTA_HEADER = struct.Struct('!HHHB')
+TAGGED_DELTA_HEADER = struct.Struct('!HHHHB')
+
+# Frame length and the rest of the header following the (tagged) code
+DELTA_BODY = struct.Struct('!HHB')
+
+DELTA_KEYFRAME = 0x01
+
+# Codes whose frames are delta encoded and length prefixed
+DELTA_CODES = frozenset([MessageCode.TELEMETRY_DELTA])
+
+
+class DeltaEncoder:
+
+    DEFAULT_KEYFRAME_INTERVAL = 32
+
+    def __init__(self, register_count: int, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+                 code: MessageCode = MessageCode.TELEMETRY_DELTA):
+        if register_count > MESSAGE_BYTES - TAGGED_DELTA_HEADER.size:
+            raise ValueError("Too many registers for a delta frame")
+
+        self.register_count = register_count
+        self.keyframe_interval = keyframe_interval
+        self.code = code
+
+        self.sequence = 0
+        self._previous: Optional[List[int]] = None
+        self._since_keyframe = 0
+
+    def force_keyframe(self) -> None:
+        self._previous = None
+
+    def encode(self, values: Sequence[int], correlation_id: Optional[int] = None) -> bytes:
+        if len(values) != self.register_count:
+            raise ValueError(f"Expected {self.register_count} values, got {len(values)}")
+
+        values = list(values)
+        previous = self._previous
+        payload = None
+        flags = 0
+
+        if previous is not None and self._since_keyframe < self.keyframe_interval:
+            bitmap = bytearray((self.register_count + 7) // 8)
+            changed = []
+
+            for idx, (old, new) in enumerate(zip(previous, values)):
+                if old != new:
+                    bitmap[idx >> 3] |= 1 << (idx & 7)
+                    changed.append(new)
+
+            # Fall back to a keyframe when it is no bigger
+            if len(bitmap) + len(changed) < self.register_count:
+                payload = bytes(bitmap) + bytes(changed)
+                self._since_keyframe += 1
+
+        if payload is None:
+            payload = bytes(values)
+            flags = DELTA_KEYFRAME
+            self._since_keyframe = 0
+
+        self._previous = values
+        sequence = self.sequence
+        self.sequence = (self.sequence + 1) & 0xFFFF
+
+        if correlation_id is None:
+            length = DELTA_HEADER.size + len(payload)
+            header = DELTA_HEADER.pack(self.code.value, length, sequence, flags)
+        else:
+            length = TAGGED_DELTA_HEADER.size + len(payload)
+            header = TAGGED_DELTA_HEADER.pack(self.code.value | TAGGED_FLAG, correlation_id, length, sequence, flags)
+
+        return header + payload
+
+
+class DeltaDecoder:
+
+    def __init__(self, register_count: int):
+        self.register_count = register_count
+        self.values: Optional[List[int]] = None
+        self._next_sequence: Optional[int] = None
+
+        # Delta frames that arrived while out of sync
+        self.skipped = 0
+
+    def decode(self, frame: bytes) -> Optional[List[int]]:
+        '''
+        Applies a delta frame and returns the full register values, or
+        None if the decoder is out of sync and waiting for a keyframe.
+        '''
+        view = memoryview(frame)
+        code_int, = CODE_HEADER.unpack_from(view)
+        start = TAGGED_HEADER.size if code_int & TAGGED_FLAG else CODE_HEADER.size
+
+        length, sequence, flags = DELTA_BODY.unpack_from(view, start)
+        payload = view[start + DELTA_BODY.size:length]
+
+        if flags & DELTA_KEYFRAME:
+            if len(payload) != self.register_count:
+                raise ValueError(f"Keyframe holds {len(payload)} values, expected {self.register_count}")
+
+            self.values = list(payload)
+
+        elif self.values is None or sequence != self._next_sequence:
+            self.values = None
+            self.skipped += 1
+            return None
+
+        else:
+            bitmap_len = (self.register_count + 7) // 8
+            bitmap = payload[:bitmap_len]
+            changed = iter(payload[bitmap_len:])
+
+            for idx in range(self.register_count):
+                if bitmap[idx >> 3] & (1 << (idx & 7)):
+                    self.values[idx] = next(changed)
+
+        self._next_sequence = (sequence + 1) & 0xFFFF
+
+        return list(self.values)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    '''
+    Reads one frame from a connection that may carry delta frames in
+    between the usual 256 byte frames.
+    '''
+    head = await reader.readexactly(TAGGED_HEADER.size)
+    code_int, = CODE_HEADER.unpack_from(head)
+
+    if peek_code(head) not in DELTA_CODES:
+        return head + await reader.readexactly(MESSAGE_BYTES - len(head))
+
+    if not code_int & TAGGED_FLAG:
+        # The 2 bytes after the code were already the frame length
+        length, = CODE_HEADER.unpack_from(head, CODE_HEADER.size)
+        return head + await reader.readexactly(length - len(head))
+
+    length_bytes = await reader.readexactly(CODE_HEADER.size)
+    length, = CODE_HEADER.unpack(length_bytes)
+
+    return head + length_bytes + await reader.readexactly(length - len(head) - len(length_bytes))
+
+
+def measure_savings(trace: Iterable[Sequence[int]], keyframe_interval: int = DeltaEncoder.DEFAULT_KEYFRAME_INTERVAL) -> Tuple[int, int]:
+    '''
+    Returns the bytes on the wire needed to send every sample of the
+    trace as full 256 byte measurement frames and as delta frames.
+    '''
+    encoder = None
+    full_bytes = 0
+    delta_bytes = 0
+
+    for sample in trace:
+        if encoder is None:
+            encoder = DeltaEncoder(len(sample), keyframe_interval)
+
+        full_bytes += len(MeasurementMessage(MessageCode.TELEMETRY_SAMPLE, list(sample)).to_network_message())
+        delta_bytes += len(encoder.encode(sample))
+
+    return full_bytes, delta_bytes
+
+
+def _load_trace(filename: str, registers: Sequence[int]) -> List[List[int]]:
+    # One comma separated page dump per line, the a0.txt/a2.txt format
+    trace = []
+
+    with open(filename) as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                page = [int(val) for val in line.split(',')]
+                trace.append([page[reg] for reg in registers])
+
+    return trace
+
+
+if __name__ == '__main__':
+    import random
+    import sys
+
+    # Live A/D, status and flag bytes of page 0xA2
+    registers = list(range(96, 119 + 1))
+
+    if len(sys.argv) > 1:
+        traces = [(filename, _load_trace(filename, registers)) for filename in sys.argv[1:]]
+    else:
+        # No recording given, jitter the low bytes of the A/D values
+        # of a2.txt the way a seated module does between samples
+        base = _load_trace('a2.txt', registers)[0]
+        trace = []
+
+        for _ in range(1000):
+            sample = list(base)
+            for lsb in range(1, 10, 2):
+                sample[lsb] = (base[lsb] + random.randint(-2, 2)) & 0xFF
+            trace.append(sample)
+
+        traces = [('a2.txt (synthetic jitter)', trace)]
+
+    for name, trace in traces:
+        full_bytes, delta_bytes = measure_savings(trace)
+        print(f'{name}: {len(trace)} samples, full {full_bytes} B, delta {delta_bytes} B, '
+              f'{100 * (1 - delta_bytes / full_bytes):.1f}% saved')
@@ -0,0 +1,110 @@
+# Command handling shared by the blocking loop in main.py and the
+# asyncio docking station in async_dock.py. Each helper takes an
+# already decoded command and returns the frame to send back, so the
+# callers only decide where (and on which thread) the work runs.
+
+import logging
+from typing import List, Optional, Tuple
+
+from modules.network.codec import fits_tagged_frame, tag_frame
+from modules.network.message import MeasurementMessage, Message, MessageCode, ReadRegisterMessage
+
+# Register read commands and the code of their response
+REGISTER_READ_ACKS = {
+    MessageCode.REAL_TIME_REFRESH:  MessageCode.REAL_TIME_REFRESH_ACK,
+    MessageCode.DIAGNOSTIC_INIT_A0: MessageCode.DIAGNOSTIC_INIT_A0_ACK,
+    MessageCode.DIAGNOSTIC_INIT_A2: MessageCode.DIAGNOSTIC_INIT_A2_ACK,
+}
+
+
+def tagged_response(frame: bytes, correlation_id: Optional[int]) -> bytes:
+    '''
+    Tags a response with the correlation id of its request. A response
+    with no room for the id is answered with an I2C_ERROR frame instead,
+    so a tagged request always gets a response.
+    '''
+    if correlation_id is not None and not fits_tagged_frame(frame):
+        logging.debug(f'Response to request {correlation_id} is too long to be tagged')
+        frame = Message(MessageCode.I2C_ERROR, "Response too long for a tagged frame").to_network_message()
+
+    return tag_frame(frame, correlation_id)
+
+
+def identify_response() -> bytes:
+    return Message(MessageCode.DOCK_DISCOVER_ACK, "Docking Station").to_network_message()
+
+
+def clone_success_response() -> bytes:
+    return Message(MessageCode.CLONE_SFP_MEMORY_SUCCESS, "Successfully cloned SFP memory").to_network_message()
+
+
+def clone_error_response() -> bytes:
+    return Message(MessageCode.CLONE_SFP_MEMORY_ERROR, "Error communicating with SFP").to_network_message()
+
+
+def i2c_error_response() -> bytes:
+    return Message(MessageCode.I2C_ERROR, "Remote I/O error when reading SFP").to_network_message()
+
+
+def clone_sfp_memory(sfp_bus) -> Tuple[List[int], List[int]]:
+    '''
+    Dumps pages 0xA0 and 0xA2. Raises if the SFP can not be read.
+    '''
+    logging.debug('Trying to read SFP memory!')
+
+    a0_dump = sfp_bus.dumpA0()
+    logging.debug(f'Dumped page 0xA0 at {sfp_bus.last_dump_bytes_per_sec:.0f} B/s (bulk={sfp_bus.last_dump_bulk})')
+    a2_dump = sfp_bus.dumpA2()
+    logging.debug(f'Dumped page 0xA2 at {sfp_bus.last_dump_bytes_per_sec:.0f} B/s (bulk={sfp_bus.last_dump_bulk})')
+
+    if hasattr(sfp_bus, 'stats'):
+        logging.debug(f'EEPROM cache: {sfp_bus.stats()}')
+
+    return a0_dump, a2_dump
+
+
+def register_read_ack(cmd: ReadRegisterMessage, response_vals: List[int]) -> bytes:
+    '''
+    Builds the ACK frame for a register read command from the values
+    that were read.
+    '''
+    msg_response = ReadRegisterMessage(REGISTER_READ_ACKS[cmd.code], "", cmd.page_number, response_vals)
+
+    return msg_response.to_network_message()
+
+
+def ddm_flags_ack(flag_values: List[int]) -> bytes:
+    '''
+    Builds the READ_DDM_FLAGS_ACK frame, a measurement frame carrying
+    bytes 110-117 of page 0xA2.
+    '''
+    return MeasurementMessage(MessageCode.READ_DDM_FLAGS_ACK, list(flag_values)).to_network_message()
+
+
+def read_registers_response(sfp_bus, cmd: ReadRegisterMessage) -> bytes:
+    '''
+    Reads the registers requested by a REAL_TIME_REFRESH or
+    DIAGNOSTIC_INIT_A0/A2 command and returns the ACK frame, or an
+    I2C_ERROR frame if the SFP could not be read.
+    '''
+    try:
+        response_vals = sfp_bus.read_registers_from_page(cmd.register_numbers, cmd.page_number)
+    except Exception as ex:
+        logging.debug(ex)
+        return i2c_error_response()
+
+    return register_read_ack(cmd, response_vals)
+
+
+def read_ddm_flags_response(sfp_bus) -> bytes:
+    '''
+    Reads the flags for a READ_DDM_FLAGS command and returns the ACK
+    frame, or an I2C_ERROR frame if the SFP could not be read.
+    '''
+    try:
+        flag_values = sfp_bus.read_ddm_flags()
+    except Exception as ex:
+        logging.debug(ex)
+        return i2c_error_response()
+
+    return ddm_flags_ack(flag_values)
@@ -0,0 +1,280 @@
+# Fast status polling of the asyncio dock, built on the alarm and
+# warning flags the module computes itself (sff8472_flags.py).
+#
+# While anyone is subscribed, FlagPoller reads page 0xA2 bytes 110-117
+# in one block read every interval_ms. Only when the decoded flags
+# change does it read the full real time block, bytes 96-117, and push
+# a DDM_FLAGS_CHANGED frame to every subscriber. The first poll after
+# polling starts always counts as a change.
+#
+# SUBSCRIBE_DDM_FLAGS is answered with SUBSCRIBE_DDM_FLAGS_ACK and, if
+# the flags were already polled, the latest DDM_FLAGS_CHANGED as a
+# snapshot. Every frame is tagged with the subscribe request's
+# correlation id if it had one:
+#
+#   !H Q B B nB pad     (code, timestamp ms, first register, n, values)
+#
+# The values are bytes 96-117 (first register 96), just the flag block
+# (110) if the full read failed, or nothing (n = 0) if the module could
+# not be read at all, e.g. because it was pulled.
+
+import asyncio
+import logging
+import struct
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from modules.core.sff8472_flags import FLAG_LENGTH, FLAG_START, decode_flags
+from modules.network.codec import CODE_HEADER, TAGGED_FLAG, TAGGED_HEADER, Buffer, peek_code, tag_frame
+from modules.network.message import MESSAGE_BYTES, MessageCode
+
+FLAGS_CHANGED_BODY = struct.Struct('!QBB')
+
+# Registers read when the flags change: the A/D words, the optional
+# laser temperature/TEC words and the flag block
+DDM_REGISTERS = list(range(96, FLAG_START + FLAG_LENGTH))
+
+# Events queued for subscribers before new ones are dropped
+MAX_QUEUED_EVENTS = 64
+
+
+class FlagEvent(NamedTuple):
+    timestamp_ms: int
+    first_register: int
+    values: Tuple[int, ...]
+
+    @property
+    def flags(self) -> Optional[int]:
+        '''
+        Decoded flags, None if the module could not be read.
+        '''
+        if len(self.values) < FLAG_LENGTH:
+            return None
+
+        return decode_flags(self.values[-FLAG_LENGTH:])
+
+
+def encode_flags_changed(event: FlagEvent, correlation_id: Optional[int] = None) -> bytes:
+    frame = bytearray(MESSAGE_BYTES)
+    CODE_HEADER.pack_into(frame, 0, MessageCode.DDM_FLAGS_CHANGED.value)
+    FLAGS_CHANGED_BODY.pack_into(frame, CODE_HEADER.size, event.timestamp_ms, event.first_register, len(event.values))
+
+    start = CODE_HEADER.size + FLAGS_CHANGED_BODY.size
+    frame[start:start + len(event.values)] = bytes(event.values)
+
+    return tag_frame(bytes(frame), correlation_id)
+
+
+def decode_flags_changed(raw_msg: Buffer) -> Tuple[Optional[int], FlagEvent]:
+    '''
+    Decodes a DDM_FLAGS_CHANGED frame into its correlation id (None if
+    untagged) and the event.
+    '''
+    frame = memoryview(raw_msg)
+
+    if peek_code(frame) != MessageCode.DDM_FLAGS_CHANGED:
+        raise ValueError("Not a DDM_FLAGS_CHANGED frame")
+
+    code_int, correlation_id = TAGGED_HEADER.unpack_from(frame)
+
+    if code_int & TAGGED_FLAG:
+        start = TAGGED_HEADER.size
+    else:
+        start = CODE_HEADER.size
+        correlation_id = None
+
+    timestamp_ms, first_register, count = FLAGS_CHANGED_BODY.unpack_from(frame, start)
+    start += FLAGS_CHANGED_BODY.size
+
+    if start + count > MESSAGE_BYTES:
+        raise ValueError(f"Flags frame claims {count} values, they do not fit")
+
+    return correlation_id, FlagEvent(timestamp_ms, first_register, tuple(frame[start:start + count]))
+
+
+class FlagPoller:
+
+    DEFAULT_INTERVAL_MS = 20
+
+    def __init__(self, read_flags: Callable[[], Awaitable[List[int]]],
+                 read_ddm: Callable[[], Awaitable[List[int]]],
+                 interval_ms: int = DEFAULT_INTERVAL_MS):
+        '''
+        read_flags() returns bytes 110-117 of page 0xA2, read_ddm()
+        returns DDM_REGISTERS. Both must go to the module, not a cache.
+        '''
+        self.read_flags = read_flags
+        self.read_ddm = read_ddm
+        self.interval_ms = interval_ms
+
+        # Keyed by (connection, correlation id) like AlarmMonitor
+        self.subscribers: Dict[Tuple[int, Optional[int]], Tuple[Callable[[bytes], Awaitable[None]], Optional[int]]] = {}
+
+        # Flag polls, full reads they escalated to, events lost to a
+        # full queue
+        self.polls = 0
+        self.escalations = 0
+        self.dropped = 0
+
+        self.last_event: Optional[FlagEvent] = None
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._sender: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        '''
+        Starts polling, a no-op while it runs.
+        '''
+        if self._poller is None:
+            self._queue = asyncio.Queue(MAX_QUEUED_EVENTS)
+            self._sender = asyncio.ensure_future(self._send_events())
+            self._poller = asyncio.ensure_future(self._poll())
+
+    def stop(self) -> None:
+        for task in (self._poller, self._sender):
+            if task is not None:
+                task.cancel()
+
+        self._poller = None
+        self._sender = None
+        self.last_event = None
+
+    def subscribe(self, client_id: int, send: Callable[[bytes], Awaitable[None]],
+                  correlation_id: Optional[int]) -> Optional[bytes]:
+        '''
+        Adds a subscription, starting the polling if it is the first.
+        Returns the snapshot frame to send after the ACK, None if the
+        first poll is still to come (it is pushed to every subscriber).
+        '''
+        self.subscribers[(client_id, correlation_id)] = (send, correlation_id)
+        self.start()
+
+        if self.last_event is None:
+            return None
+
+        return encode_flags_changed(self.last_event, correlation_id)
+
+    def unsubscribe(self, client_id: int, correlation_id: Optional[int] = None) -> None:
+        '''
+        Removes a subscription, or every subscription of the connection
+        if correlation_id is None. Polling stops with the last one.
+        '''
+        for key in list(self.subscribers):
+            if key[0] == client_id and (correlation_id is None or key[1] == correlation_id):
+                del self.subscribers[key]
+
+        if not self.subscribers:
+            self.stop()
+
+    async def _escalate(self, flag_values: List[int]) -> Tuple[int, Tuple[int, ...]]:
+        try:
+            values = await self.read_ddm()
+        except Exception as ex:
+            logging.debug(f'Flag poller: {ex}')
+            return FLAG_START, tuple(flag_values)
+
+        self.escalations += 1
+
+        return DDM_REGISTERS[0], tuple(values)
+
+    async def _poll(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = self.interval_ms / 1000
+        next_poll = loop.time()
+        flags = -1
+
+        while True:
+            timestamp_ms = int(time.time() * 1000)
+
+            try:
+                flag_values = await self.read_flags()
+            except Exception as ex:
+                # No module seated or a bus error, keep trying
+                if flags is not None:
+                    logging.debug(f'Flag poller: {ex}')
+                new_flags = None
+            else:
+                new_flags = decode_flags(flag_values)
+
+            self.polls += 1
+
+            if new_flags != flags:
+                flags = new_flags
+
+                if flags is None:
+                    first_register, values = FLAG_START, ()
+                else:
+                    first_register, values = await self._escalate(flag_values)
+
+                self.last_event = FlagEvent(timestamp_ms, first_register, values)
+
+                try:
+                    self._queue.put_nowait(self.last_event)
+                except asyncio.QueueFull:
+                    self.dropped += 1
+
+            now = loop.time()
+
+            # Fixed rate, a slow read does not push back later polls
+            next_poll += interval
+            if next_poll < now:
+                next_poll = now
+
+            await asyncio.sleep(next_poll - now)
+
+    async def _send_events(self) -> None:
+        while True:
+            event = await self._queue.get()
+
+            for key, (send, correlation_id) in list(self.subscribers.items()):
+                try:
+                    await send(encode_flags_changed(event, correlation_id))
+                except Exception as ex:
+                    logging.debug(f'Dropping flag subscriber {key}: {ex!r}')
+                    self.subscribers.pop(key, None)
+
+
+if __name__ == '__main__':
+    from modules.core.sff8472_flags import flag_names
+
+    async def demo():
+        page = [0] * 256
+        reads = {'flags': 0, 'ddm': 0}
+
+        async def read_flags():
+            reads['flags'] += 1
+            return page[FLAG_START:FLAG_START + FLAG_LENGTH]
+
+        async def read_ddm():
+            reads['ddm'] += 1
+            return [page[reg] for reg in DDM_REGISTERS]
+
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        poller = FlagPoller(read_flags, read_ddm, interval_ms=5)
+        poller.subscribe(1, send, 9)
+        await asyncio.sleep(0.2)
+
+        # Temperature high alarm and RX LOS, then both clear
+        page[112] |= 0x80
+        page[110] |= 0x02
+        await asyncio.sleep(0.2)
+        page[112] = page[110] = 0
+        await asyncio.sleep(0.2)
+        poller.unsubscribe(1)
+        await asyncio.sleep(0)
+
+        for frame in frames:
+            correlation_id, event = decode_flags_changed(frame)
+            assert correlation_id == 9 and event.first_register == DDM_REGISTERS[0]
+            print(f'{event.timestamp_ms}: {flag_names(event.flags) or "clear"}, {len(event.values)} registers')
+
+        assert len(frames) == 3
+        print(f'{poller.polls} flag polls of {FLAG_LENGTH} bytes, {reads["ddm"]} full reads of '
+              f'{len(DDM_REGISTERS)} bytes')
+
+    asyncio.run(demo())
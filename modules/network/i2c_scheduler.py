@@ -0,0 +1,166 @@
+# Fair access to the single SFP I2C bus for many asyncio clients.
+#
+# Every client gets its own FIFO of pending bus jobs and a single worker
+# serves the clients round robin, one job each, so a client queueing up
+# a burst of reads can not starve the others. Jobs run one at a time on
+# a dedicated thread, which is also what keeps the bus single-threaded.
+#
+# Register reads are shared between clients: identical reads that are
+# already queued or running are joined instead of queued again, and a
+# result younger than share_window seconds is handed out directly.
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Hashable, List, Tuple
+
+
+class FairI2CScheduler:
+
+    # Seconds a register read result is shared with other clients
+    DEFAULT_SHARE_WINDOW = 0.1
+
+    def __init__(self, sfp_bus, share_window: float = DEFAULT_SHARE_WINDOW):
+        self.sfp_bus = sfp_bus
+        self.share_window = share_window
+
+        # One worker, so only one thread ever talks to the I2C bus
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='i2c')
+
+        self._queues: Dict[Hashable, Deque] = {}
+        self._ready: Deque[Hashable] = deque()
+        self._wakeup = None
+        self._worker = None
+
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._recent: Dict[Tuple, Tuple[float, List[int]]] = {}
+
+        # Register reads answered from another client's read
+        self.shared_reads = 0
+        self.bus_reads = 0
+
+    def start(self) -> None:
+        # Created here so they belong to the running event loop
+        if self._worker is None:
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.ensure_future(self._run())
+
+    def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+        self.executor.shutdown(wait=True)
+
+    def submit(self, client_id: Hashable, func, *args) -> asyncio.Future:
+        '''
+        Queues func(*args) to run on the I2C thread on behalf of
+        client_id. Returns a future for its result, cancelling the
+        future drops the job if it has not started yet.
+        '''
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(client_id)
+
+        if queue is None:
+            queue = self._queues[client_id] = deque()
+
+        if not queue:
+            self._ready.append(client_id)
+
+        queue.append((func, args, future))
+        self._wakeup.set()
+
+        return future
+
+    async def read_registers(self, client_id: Hashable, registers, page_num: int, fresh: bool = False) -> List[int]:
+        '''
+        Reads registers on behalf of client_id. A fresh read is never
+        answered from an older result or an EEPROM cache's live
+        registers, it only joins fresh reads already queued or running.
+        '''
+        key = (page_num, tuple(registers), fresh)
+
+        recent = self._recent.get(key)
+        if recent is not None and time.monotonic() - recent[0] < self.share_window:
+            self.shared_reads += 1
+            return recent[1]
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.shared_reads += 1
+            return await asyncio.shield(future)
+
+        if fresh:
+            # A plain SFP_I2C_Bus always reads the bus
+            read = getattr(self.sfp_bus, 'read_fresh', self.sfp_bus.read_registers_from_page)
+        else:
+            read = self.sfp_bus.read_registers_from_page
+
+        future = self.submit(client_id, read, key[1], page_num)
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._finish_read(key, done))
+
+        # Shielded, a client that disconnects must not cancel a read
+        # other clients have joined
+        return await asyncio.shield(future)
+
+    def _finish_read(self, key: Tuple, future: asyncio.Future) -> None:
+        del self._inflight[key]
+
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        now = time.monotonic()
+        self.bus_reads += 1
+
+        if not key[2]:
+            self._recent[key] = (now, future.result())
+
+        # Forget results nobody can use anymore
+        for old_key in [k for k, (t, _) in self._recent.items() if now - t >= self.share_window]:
+            del self._recent[old_key]
+
+    def _next_job(self):
+        while self._ready:
+            client_id = self._ready.popleft()
+            queue = self._queues.get(client_id)
+
+            if not queue:
+                continue
+
+            job = queue.popleft()
+
+            # Back of the line if the client has more work queued
+            if queue:
+                self._ready.append(client_id)
+            else:
+                del self._queues[client_id]
+
+            return job
+
+        return None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            job = self._next_job()
+
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            func, args, future = job
+            if future.cancelled():
+                continue
+
+            try:
+                result = await loop.run_in_executor(self.executor, func, *args)
+            except Exception as ex:
+                if not future.cancelled():
+                    future.set_exception(ex)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
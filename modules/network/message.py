@@ -21,7 +21,28 @@ class MessageCode(Enum):
     DIAGNOSTIC_INIT_A2_ACK      = 130
     REAL_TIME_REFRESH           = 131
     REAL_TIME_REFRESH_ACK       = 132
+    SUBSCRIBE_TELEMETRY         = 133
+    SUBSCRIBE_TELEMETRY_ACK     = 134
+    UNSUBSCRIBE_TELEMETRY       = 135
+    UNSUBSCRIBE_TELEMETRY_ACK   = 136
+    TELEMETRY_SAMPLE            = 137
+    REAL_TIME_REFRESH_DELTA     = 138
+    TELEMETRY_DELTA             = 139
+    TELEMETRY_QUERY             = 140
+    TELEMETRY_QUERY_RESULT      = 141
+    SUBSCRIBE_ALARMS            = 142
+    SUBSCRIBE_ALARMS_ACK        = 143
+    UNSUBSCRIBE_ALARMS          = 144
+    UNSUBSCRIBE_ALARMS_ACK      = 145
+    ALARM_EVENT                 = 146
+    READ_DDM_FLAGS              = 147
+    READ_DDM_FLAGS_ACK          = 148
+    SUBSCRIBE_DDM_FLAGS         = 149
     I2C_ERROR                   = 150
+    SUBSCRIBE_DDM_FLAGS_ACK     = 151
+    UNSUBSCRIBE_DDM_FLAGS       = 152
+    UNSUBSCRIBE_DDM_FLAGS_ACK   = 153
+    DDM_FLAGS_CHANGED           = 154
 
     # Cloudplug Codes
     CLOUDPLUG_DISCOVER_ACK = 200
@@ -48,6 +69,37 @@ class ReadRegisterMessage(Message):
         
         return struct.pack(format_str, self.code.value, self.page_number, num_registers_to_request, *self.register_numbers)
 
+# SubscribeMessage flag, drop new samples while the connection is
+# congested instead of replacing the unsent sample with the newest one
+SUBSCRIBE_DROP_SAMPLES = 0x0001
+
+# SubscribeMessage flag, stream TELEMETRY_DELTA frames (see delta.py)
+# instead of full TELEMETRY_SAMPLE frames
+SUBSCRIBE_DELTA_FRAMES = 0x0002
+
+@dataclass
+class SubscribeMessage(ReadRegisterMessage):
+    interval_ms: int
+    flags:       int = 0
+
+    def to_network_message(self) -> bytes:
+        num_registers_to_request = len(self.register_numbers)
+        format_str = f"!HHHHH{num_registers_to_request}B{MESSAGE_BYTES - 5 * SIZEOF_H - num_registers_to_request}x"
+
+        return struct.pack(format_str, self.code.value, self.page_number, self.interval_ms, self.flags,
+                           num_registers_to_request, *self.register_numbers)
+
+@dataclass
+class TelemetryQueryMessage(Message):
+    tier:        int
+    since_ms:    int
+    until_ms:    int
+    max_records: int = 0
+
+    def to_network_message(self) -> bytes:
+        return struct.pack(f"!HBxQQH{MESSAGE_BYTES - 22}x", self.code.value, self.tier,
+                           self.since_ms, self.until_ms, self.max_records)
+
 def bytesToReadRegisterMessage(raw_msg: bytes):
     code, page_num, arr_len, *garbage = struct.unpack(f"!HHH{MESSAGE_BYTES - 3 * SIZEOF_H}x", raw_msg)
     format_str = f"!HHH{arr_len}B{MESSAGE_BYTES - 3 * SIZEOF_H - arr_len}x"
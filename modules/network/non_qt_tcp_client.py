@@ -17,7 +17,7 @@ class TCPSocketState(Enum):
     CONNECTED = 1
 
 class TCPSocket:
-    def __init__(self, sock=None):
+    def __init__(self, sock=None, reuse_buffer=False):
         if sock is None:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         else:
@@ -25,31 +25,44 @@ class TCPSocket:
 
         self.state: TCPSocketState = TCPSocketState.DISCONNECTED
 
+        # With reuse_buffer set, myreceive() fills one preallocated
+        # buffer with recv_into and returns a memoryview over it. The
+        # view (and anything decoded from it without copying) is only
+        # valid until the next call to myreceive().
+        self.reuse_buffer = reuse_buffer
+        self._recv_view = memoryview(bytearray(MSGLEN))
+
     def connect(self, host, port):
         host_port_tuple = (host, port)
         self.sock.connect(host_port_tuple)
         self.state = TCPSocketState.CONNECTED
     
     def mysend(self, msg: bytes):
-        totalsent = 0
-
-        while totalsent < MSGLEN:
-            sent = self.sock.send(msg[totalsent:])
-            if sent == 0:
-                raise RuntimeError("Socket connection broken")
-            totalsent += sent
+        # sendall() loops over partial sends itself, without copying
+        # the rest of a memoryview. A broken connection is still
+        # reported as RuntimeError, which the caller handles
+        try:
+            self.sock.sendall(memoryview(msg))
+        except OSError as ex:
+            raise RuntimeError("Socket connection broken") from ex
 
     def myreceive(self):
-        chunks = []
+        if self.reuse_buffer:
+            view = self._recv_view
+        else:
+            view = memoryview(bytearray(MSGLEN))
+
         bytes_recd = 0
         while bytes_recd < MSGLEN:
-            chunk = self.sock.recv(min(MSGLEN - bytes_recd, 2048))
-            if chunk == b'':
+            nbytes = self.sock.recv_into(view[bytes_recd:], MSGLEN - bytes_recd)
+            if nbytes == 0:
                 raise RuntimeError("Socket connection broken")
-            chunks.append(chunk)
-            bytes_recd += len(chunk)
-        
-        return b''.join(chunks)
+            bytes_recd += nbytes
+
+        if self.reuse_buffer:
+            return view
+
+        return bytes(view)
 
     def handle_server_disconnect(self):
         # If connection is lost, change the state of the
@@ -0,0 +1,233 @@
+# On-dock recording of the real time DDM values for the asyncio dock.
+#
+# TelemetryRecorder samples page 0xA2 bytes 96-105 at a fixed interval
+# into a TelemetryRing (telemetry_ring.py), which keeps the raw words
+# and 1 s/1 m/1 h rollups in a fixed size memory mapped file. The ring
+# is msync'ed every flush_interval seconds rather than on every sample,
+# to spare the SD card. Listeners (the alarm monitor) get every sample
+# as well, or None when the module could not be read, also while
+# recording to a file is off.
+#
+# A TELEMETRY_QUERY (tier, since_ms, until_ms, max records) is answered
+# with TELEMETRY_QUERY_RESULT frames, tagged like the query if it was:
+#
+#   !H B B H n*record pad   (code, tier, flags, n, records)
+#
+# QUERY_LAST is set in the flags of the last frame of a result, a query
+# matching nothing gets one empty frame. Records are the ring records in
+# network byte order, RESULT_RECORDS[tier] unpacks them.
+
+import asyncio
+import logging
+import struct
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from modules.core.telemetry_ring import LIVE_REGISTERS, ROLLUP, SAMPLE, TelemetryRing, words_from_registers
+from modules.network.codec import CODE_HEADER, TAGGED_FLAG, TAGGED_HEADER, Buffer, peek_code, tag_frame
+from modules.network.message import MESSAGE_BYTES, MessageCode, TelemetryQueryMessage
+
+DEFAULT_TELEMETRY_FILE = 'telemetry.bin'
+
+# I2C address of page 0xA2, SFP_I2C_Bus.DDM_ADDR
+DDM_ADDR = 0x51
+
+RESULT_BODY = struct.Struct('!BBH')
+
+QUERY_LAST = 0x01
+
+# Record layouts on the wire, by tier
+RESULT_RECORDS = [struct.Struct('!' + SAMPLE.format[1:])] + [struct.Struct('!' + ROLLUP.format[1:])] * 3
+
+# Records one query may return, bigger queries are cut off
+MAX_QUERY_RECORDS = 3600
+
+
+def _records_per_frame(record: struct.Struct) -> int:
+    # Room left in a tagged frame, so every result frame can be tagged
+    return (MESSAGE_BYTES - TAGGED_HEADER.size - RESULT_BODY.size) // record.size
+
+
+def query_result_frames(ring: Optional[TelemetryRing], query: TelemetryQueryMessage,
+                        correlation_id: Optional[int] = None) -> List[bytes]:
+    '''
+    Runs a TELEMETRY_QUERY against the ring and returns the result
+    frames. Without a ring, or for an unknown tier, the result is empty.
+    '''
+    max_records = min(query.max_records or MAX_QUERY_RECORDS, MAX_QUERY_RECORDS)
+
+    if ring is None or not 0 <= query.tier < len(RESULT_RECORDS):
+        records = []
+    else:
+        records = ring.query(query.tier, query.since_ms, query.until_ms, max_records)
+
+    record = RESULT_RECORDS[query.tier] if records else None
+    per_frame = _records_per_frame(record) if records else 1
+    frames = []
+
+    for start in range(0, max(len(records), 1), per_frame):
+        chunk = records[start:start + per_frame]
+        flags = QUERY_LAST if start + per_frame >= len(records) else 0
+
+        frame = bytearray(MESSAGE_BYTES)
+        CODE_HEADER.pack_into(frame, 0, MessageCode.TELEMETRY_QUERY_RESULT.value)
+        RESULT_BODY.pack_into(frame, CODE_HEADER.size, query.tier, flags, len(chunk))
+
+        offset = CODE_HEADER.size + RESULT_BODY.size
+        for values in chunk:
+            record.pack_into(frame, offset, *values)
+            offset += record.size
+
+        frames.append(tag_frame(bytes(frame), correlation_id))
+
+    return frames
+
+
+def decode_query_result(raw_msg: Buffer) -> Tuple[Optional[int], int, bool, List[tuple]]:
+    '''
+    Decodes a TELEMETRY_QUERY_RESULT frame. Returns the correlation id
+    (None if untagged), the tier, whether it is the last frame of the
+    result, and the records.
+    '''
+    frame = memoryview(raw_msg)
+
+    if peek_code(frame) != MessageCode.TELEMETRY_QUERY_RESULT:
+        raise ValueError("Not a TELEMETRY_QUERY_RESULT frame")
+
+    code_int, correlation_id = TAGGED_HEADER.unpack_from(frame)
+
+    if code_int & TAGGED_FLAG:
+        start = TAGGED_HEADER.size
+    else:
+        start = CODE_HEADER.size
+        correlation_id = None
+
+    tier, flags, count = RESULT_BODY.unpack_from(frame, start)
+    start += RESULT_BODY.size
+
+    if tier >= len(RESULT_RECORDS):
+        raise ValueError(f"No telemetry tier {tier}")
+
+    record = RESULT_RECORDS[tier]
+
+    if start + count * record.size > MESSAGE_BYTES:
+        raise ValueError(f"Result frame claims {count} records, they do not fit")
+
+    records = [record.unpack_from(frame, start + idx * record.size) for idx in range(count)]
+
+    return correlation_id, tier, bool(flags & QUERY_LAST), records
+
+
+class TelemetryRecorder:
+
+    DEFAULT_INTERVAL_MS = 100
+    DEFAULT_FLUSH_INTERVAL = 60.0
+
+    def __init__(self, ring: Optional[TelemetryRing], read: Callable[[List[int], int], Awaitable[List[int]]],
+                 interval_ms: int = DEFAULT_INTERVAL_MS, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        '''
+        read(registers, page) returns the current register values.
+        Without a ring samples only go to the listeners.
+        '''
+        self.ring = ring
+        self.read = read
+        self.interval_ms = interval_ms
+        self.flush_interval = flush_interval
+
+        # Samples recorded, and samples the module could not be read for
+        self.recorded = 0
+        self.failed = 0
+
+        # listener(timestamp_ms, words), words is None for failed reads
+        self.listeners: List[Callable[[int, Optional[Tuple[int, ...]]], None]] = []
+
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._record())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        if self.ring is not None:
+            self.ring.flush()
+
+    async def _record(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = self.interval_ms / 1000
+        next_sample = loop.time()
+        next_flush = next_sample + self.flush_interval
+
+        while True:
+            timestamp_ms = int(time.time() * 1000)
+
+            try:
+                values = await self.read(LIVE_REGISTERS, DDM_ADDR)
+            except Exception as ex:
+                # No module seated or a bus error, keep trying
+                if not self.failed % 600:
+                    logging.debug(f'Telemetry recorder: {ex}')
+                self.failed += 1
+                words = None
+            else:
+                words = words_from_registers(values)
+
+                if self.ring is not None:
+                    self.ring.append(timestamp_ms, words)
+                    self.recorded += 1
+
+            for listener in self.listeners:
+                listener(timestamp_ms, words)
+
+            now = loop.time()
+
+            if self.ring is not None and now >= next_flush:
+                await loop.run_in_executor(None, self.ring.flush)
+                next_flush = now + self.flush_interval
+
+            # Fixed rate, a slow read does not push back later samples
+            next_sample += interval
+            if next_sample < now:
+                next_sample = now
+
+            await asyncio.sleep(next_sample - now)
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    from modules.core.telemetry_ring import TIER_1S, TIER_RAW
+
+    async def demo():
+        ring = TelemetryRing(os.path.join(tempfile.mkdtemp(), DEFAULT_TELEMETRY_FILE))
+        counter = iter(range(10 ** 9))
+
+        async def read(registers, page):
+            value = next(counter)
+            return [0x19, value & 0xFF, 0x80, 0x00, 0x0B, 0xB8, 0x13, 0x88, 0x0F, 0xA0]
+
+        recorder = TelemetryRecorder(ring, read, interval_ms=10)
+        recorder.start()
+        await asyncio.sleep(2.2)
+        recorder.stop()
+
+        for tier in (TIER_RAW, TIER_1S):
+            query = TelemetryQueryMessage(MessageCode.TELEMETRY_QUERY, "", tier, 0, 2 ** 64 - 1, 0)
+            frames = query_result_frames(ring, query, correlation_id=7)
+            records = []
+            for frame in frames:
+                correlation_id, _, last, chunk = decode_query_result(frame)
+                assert correlation_id == 7 and last == (frame is frames[-1])
+                records += chunk
+
+            assert records == ring.query(tier)
+            print(f'Tier {tier}: {len(records)} records in {len(frames)} frames, first {records[0]}')
+
+        print(f'Recorded {recorder.recorded} samples, store is {ring.size / 1e6:.1f} MB')
+        ring.close()
+
+    asyncio.run(demo())
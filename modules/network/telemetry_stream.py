@@ -0,0 +1,128 @@
+# Server-push streaming of live DDM registers for the asyncio dock.
+#
+# A SUBSCRIBE_TELEMETRY command starts a TelemetrySubscription, which
+# samples a register set at a fixed interval and pushes each sample as
+# a TELEMETRY_SAMPLE measurement frame (tagged with the subscribe
+# request's correlation id, if it had one) until UNSUBSCRIBE_TELEMETRY
+# or the connection drops.
+#
+# Sampling and sending are separate tasks joined by a one sample
+# mailbox. The sender waits for the socket to drain, so when the
+# connection falls behind only one unsent sample is ever held: the
+# newest sample replaces it by default, with SUBSCRIBE_DROP_SAMPLES the
+# new samples are dropped instead.
+#
+# With SUBSCRIBE_DELTA_FRAMES samples go out as TELEMETRY_DELTA frames.
+# They are encoded by the sender, so samples lost in the mailbox never
+# break the delta chain.
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from modules.network.codec import tag_frame
+from modules.network.delta import DeltaEncoder
+from modules.network.message import MeasurementMessage, MessageCode, SUBSCRIBE_DELTA_FRAMES, SUBSCRIBE_DROP_SAMPLES
+
+
+class TelemetrySubscription:
+
+    # Fastest sampling interval a client may ask for
+    MIN_INTERVAL_MS = 50
+
+    # Slowest sampling interval, anything longer is clamped
+    MAX_INTERVAL_MS = 60000
+
+    def __init__(self, read: Callable[[List[int], int], Awaitable[List[int]]],
+                 send: Callable[[bytes], Awaitable[None]], page_number: int,
+                 register_numbers: List[int], interval_ms: int, flags: int = 0,
+                 correlation_id: Optional[int] = None):
+        '''
+        read(registers, page) returns the current register values,
+        send(frame) writes a frame to the subscriber and waits for the
+        connection to drain.
+        '''
+        self.read = read
+        self.send = send
+        self.page_number = page_number
+        self.register_numbers = list(register_numbers)
+        self.interval_ms = min(max(interval_ms, self.MIN_INTERVAL_MS), self.MAX_INTERVAL_MS)
+        self.drop_samples = bool(flags & SUBSCRIBE_DROP_SAMPLES)
+        self.correlation_id = correlation_id
+
+        self.delta_encoder: Optional[DeltaEncoder] = None
+        if flags & SUBSCRIBE_DELTA_FRAMES:
+            self.delta_encoder = DeltaEncoder(len(self.register_numbers))
+
+        # Samples pushed, and samples lost to a congested connection
+        self.sent = 0
+        self.dropped = 0
+        self.merged = 0
+
+        self._pending: Optional[List[int]] = None
+        self._has_pending: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._has_pending = asyncio.Event()
+        self._tasks = [
+            asyncio.ensure_future(self._sample()),
+            asyncio.ensure_future(self._send()),
+        ]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+        self._tasks = []
+
+    def _post(self, values: List[int]) -> None:
+        if self._pending is not None:
+            if self.drop_samples:
+                self.dropped += 1
+                return
+
+            self.merged += 1
+
+        self._pending = values
+        self._has_pending.set()
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = self.interval_ms / 1000
+        next_sample = loop.time()
+
+        while True:
+            try:
+                values = await self.read(self.register_numbers, self.page_number)
+            except Exception as ex:
+                # Keep the subscription alive, the module may be
+                # reseated or the bus may recover
+                logging.debug(ex)
+            else:
+                self._post(values)
+
+            # Fixed rate, a slow read does not push back later samples
+            next_sample += interval
+            now = loop.time()
+            if next_sample < now:
+                next_sample = now
+
+            await asyncio.sleep(next_sample - now)
+
+    async def _send(self) -> None:
+        while True:
+            await self._has_pending.wait()
+
+            values = self._pending
+            self._pending = None
+            self._has_pending.clear()
+
+            if self.delta_encoder is not None:
+                frame = self.delta_encoder.encode(values, self.correlation_id)
+            else:
+                msg = MeasurementMessage(MessageCode.TELEMETRY_SAMPLE, values)
+                frame = tag_frame(msg.to_network_message(), self.correlation_id)
+
+            await self.send(frame)
+            self.sent += 1